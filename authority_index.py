@@ -0,0 +1,107 @@
+"""
+authority_index.py - Offline domain-authority lookup for reference scoring
+
+Tiers come from AUTHORITY_TIERS_PATH (authority_tiers.json), e.g.
+
+    {"default_score": 1,
+     "tiers": [{"name": "research", "score": 3, "domains": ["arxiv.org", "nature.com"]},
+               {"name": "official suffixes", "score": 2, "domains": ["gov.in", "edu"]}]}
+
+Entries are stored in a trie keyed by reversed host labels, so a lookup walks
+at most one node per label of the URL's host: "export.arxiv.org" matches the
+"arxiv.org" entry, "rbi.gov.in" the "gov.in" suffix, and the most specific
+entry wins. Unlike a substring scan, "signature.com" does not match "nature.com".
+
+Registered domains are split off with tldextract's bundled public suffix
+snapshot and never fetch the list over the network.
+"""
+
+import json
+import threading
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlparse
+import tldextract
+from config import AUTHORITY_TIERS_PATH, AUTHORITY_CACHE_SIZE
+from tracing import get_logger
+
+logger = get_logger(__name__)
+
+# No suffix list URLs and no disk cache: the snapshot shipped with tldextract is used as-is
+_extractor = tldextract.TLDExtract(cache_dir=None, suffix_list_urls=())
+
+_SCORE = None  # trie key holding the score of the entry that ends at a node
+
+class AuthorityIndex:
+    def __init__(self, domain_scores: Dict[str, int], default_score: int = 1):
+        self.default_score = default_score
+        self.root: dict = {}
+        for domain, score in domain_scores.items():
+            node = self.root
+            for label in reversed(domain.lower().strip(".").split(".")):
+                node = node.setdefault(label, {})
+            node[_SCORE] = max(score, node.get(_SCORE, score))
+        self.size = len(domain_scores)
+
+    @classmethod
+    def from_file(cls, path: str = AUTHORITY_TIERS_PATH) -> "AuthorityIndex":
+        """Build the index from a tiers file; a domain listed in several tiers keeps its highest score."""
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        domain_scores: Dict[str, int] = {}
+        for tier in data.get("tiers", []):
+            score = int(tier["score"])
+            for domain in tier.get("domains", []):
+                domain_scores[domain] = max(score, domain_scores.get(domain, score))
+        return cls(domain_scores, int(data.get("default_score", 1)))
+
+    def lookup(self, host: str) -> Optional[int]:
+        """Score of the most specific entry that host equals or is a subdomain of."""
+        node = self.root
+        best = None
+        for label in reversed(host.split(".")):
+            node = node.get(label)
+            if node is None:
+                break
+            best = node.get(_SCORE, best)
+        return best
+
+    def score(self, host: str) -> int:
+        found = self.lookup(host.lower().strip("."))
+        return self.default_score if found is None else found
+
+_index: Optional[AuthorityIndex] = None
+_index_lock = threading.Lock()
+
+def get_authority_index() -> AuthorityIndex:
+    """Load the tiers file on first use; a missing or broken file scores every domain as default."""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                try:
+                    _index = AuthorityIndex.from_file()
+                    logger.debug("Authority index loaded: %s entries from '%s'", _index.size, AUTHORITY_TIERS_PATH)
+                except (OSError, ValueError, KeyError, TypeError) as e:
+                    logger.warning(f"Authority tiers unavailable ({e}); every domain gets the default score")
+                    _index = AuthorityIndex({})
+    return _index
+
+def registered_domain(url: str) -> str:
+    """Registered domain (e.g. 'bbc.co.uk') of a URL or host, using the bundled suffix list."""
+    try:
+        ext = _extractor(url)
+        if ext.domain and ext.suffix:
+            return f"{ext.domain}.{ext.suffix}".lower()
+        return ext.domain.lower() if ext.domain else ""
+    except Exception:
+        return ""
+
+@lru_cache(maxsize=AUTHORITY_CACHE_SIZE)
+def authority_for_url(url: str) -> Tuple[str, int]:
+    """(registered domain, authority score) for a URL, scored on its full host."""
+    try:
+        host = urlparse(url).hostname or ""
+    except ValueError:
+        host = ""
+    return registered_domain(url), get_authority_index().score(host or registered_domain(url))
@@ -0,0 +1,133 @@
+"""
+batch_runner.py - Run many debate topics concurrently in one process
+
+Reads a JSONL file with one topic per line, e.g.
+
+    {"id": "growth", "topic": "BJP vs Congress: which had better economic policies?", "rounds": 2}
+    {"topic": "React vs Vue for a small dashboard?", "transcript": "react_vs_vue.md"}
+
+and runs the debates under a concurrency limit. The embedder, evidence index,
+HTTP sessions and on-disk caches are shared by every debate; each debate gets
+its own DebateEngine, so history and agent memory stay isolated. Results are
+appended to the output JSONL as soon as each debate finishes.
+
+    python batch_runner.py topics.jsonl --out results.jsonl --concurrency 4
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import time
+from typing import Dict, List
+from tracing import get_logger
+
+logger = get_logger(__name__)
+
+def load_topics(path: str, default_rounds: int) -> List[Dict]:
+    """Parse the topics file, filling in ids and default settings."""
+    topics = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError as e:
+                logger.warning(f"Skipping line {line_no} of {path}: {e}")
+                continue
+            if not isinstance(entry, dict) or not isinstance(entry.get("topic"), str) or not entry["topic"].strip():
+                logger.warning(f"Skipping line {line_no} of {path}: no topic")
+                continue
+            try:
+                rounds = int(entry.get("rounds", default_rounds))
+            except (TypeError, ValueError) as e:
+                logger.warning(f"Skipping line {line_no} of {path}: invalid rounds: {e}")
+                continue
+            topics.append({
+                "id": str(entry.get("id", line_no)),
+                "line": line_no,
+                "topic": entry["topic"].strip(),
+                "rounds": rounds,
+                "transcript": entry.get("transcript"),
+            })
+    return topics
+
+async def run_batch(topics: List[Dict], out_path: str, concurrency: int, resume: bool = False) -> dict:
+    from debate_engine import DebateEngine
+    from evidence_index import EvidenceIndex
+    from evidence_retriever import LazyEmbeddings
+    from output_formatter import format_and_save_transcript, serialize_history
+    from llm_calls import close_provider_sessions
+    from web_loader import close_http_session
+
+    # One model and one index for the whole batch; the first debate to need it loads it
+    embedder = LazyEmbeddings()
+    evidence_index = EvidenceIndex(embedder)
+
+    limit = asyncio.Semaphore(concurrency)
+    summary = {"debates": len(topics), "completed": 0, "failed": 0}
+    out = open(out_path, "a", encoding="utf-8")
+
+    def write_result(result: dict):
+        out.write(json.dumps(result, ensure_ascii=False) + "\n")
+        out.flush()
+
+    async def one_debate(entry: Dict):
+        async with limit:
+            logger.debug("Batch: starting '%s' (%s rounds)", entry["id"], entry["rounds"])
+            engine = DebateEngine(rounds=entry["rounds"], embedder=embedder, evidence_index=evidence_index,
+                                  resume=resume, checkpoint_key=f"batch line {entry['line']}")
+            start = time.perf_counter()
+            result = {"id": entry["id"], "topic": entry["topic"], "rounds": entry["rounds"]}
+            try:
+                final_answer, history = await engine.run_debate(entry["topic"])
+                result.update({"status": "ok", "final_answer": final_answer, "history": serialize_history(history)})
+                summary["completed"] += 1
+            except Exception as e:
+                logger.error(f"Batch: debate '{entry['id']}' failed: {e}")
+                result.update({"status": "error", "error": str(e), "history": serialize_history(engine.history)})
+                summary["failed"] += 1
+                final_answer, history = f"[Error] Debate failed: {e}", engine.history
+            result["elapsed_seconds"] = round(time.perf_counter() - start, 3)
+            result["call_metrics"] = {name: agent.call_metrics for name, agent in engine.agents.items()}
+            if entry["transcript"]:
+                try:
+                    format_and_save_transcript(entry["topic"], history, final_answer, filename=entry["transcript"],
+                                               call_metrics=result["call_metrics"])
+                except Exception as e:
+                    logger.warning(f"Batch: transcript for '{entry['id']}' failed: {e}")
+            write_result(result)
+            logger.debug("Batch: finished '%s' in %.1fs", entry["id"], result["elapsed_seconds"])
+
+    wall_start = time.perf_counter()
+    try:
+        await asyncio.gather(*(one_debate(entry) for entry in topics))
+    finally:
+        summary["wall_seconds"] = time.perf_counter() - wall_start
+        out.close()
+        await close_provider_sessions()
+        await close_http_session()
+    return summary
+
+def main():
+    parser = argparse.ArgumentParser(description="Run debates for every topic in a JSONL file")
+    parser.add_argument("topics", help="JSONL file with one {\"topic\": ..., \"rounds\": ...} object per line")
+    parser.add_argument("--out", default="debate_results.jsonl", help="JSONL file results are appended to")
+    parser.add_argument("--concurrency", type=int, default=4, help="debates in flight at once")
+    parser.add_argument("--rounds", type=int, default=1, help="default critique/refinement rounds per topic")
+    parser.add_argument("--resume", action="store_true", help="skip stages checkpointed by an interrupted earlier run")
+    args = parser.parse_args()
+
+    topics = load_topics(args.topics, args.rounds)
+    if not topics:
+        print("No topics found. Exiting.")
+        return
+    summary = asyncio.run(run_batch(topics, args.out, max(1, args.concurrency), args.resume))
+    print(f"\nBatch finished: {summary['completed']}/{summary['debates']} completed, "
+          f"{summary['failed']} failed in {summary['wall_seconds']:.1f}s")
+    print(f"Results appended to '{os.path.abspath(args.out)}'")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+checkpoint.py - Stage-level checkpoints so an interrupted debate can be resumed
+
+After every stage task (one agent, one stage) that succeeded on clean inputs,
+DebateEngine writes the debate history, each agent's memory, prompt context
+and call metrics, and the keys of the completed tasks to
+CHECKPOINT_DIR/<id>/state.json. When the evidence index is not persisted on
+its own (EVIDENCE_INDEX_DIR=""), a snapshot of it is kept next to the state. The id is derived from the question, round count and an optional key, so
+running the same debate again with resume=True skips the finished tasks.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+from typing import Optional
+from tracing import get_logger
+
+logger = get_logger(__name__)
+
+STATE_FILE = "state.json"
+EVIDENCE_DIR = "evidence"
+CHECKPOINT_FORMAT = 3  # 3: history as DebateHistory.to_state(), references written once
+
+def checkpoint_id(question: str, rounds: int, key: str = "") -> str:
+    """Id of a debate's checkpoint; key tells apart runs of the same debate, e.g. batch file lines."""
+    normalized = " ".join(question.split()).lower()
+    suffix = f"\n{key}" if key else ""
+    return hashlib.sha256(f"{rounds}\n{normalized}{suffix}".encode("utf-8")).hexdigest()[:16]
+
+class DebateCheckpoint:
+    def __init__(self, root: str, question: str, rounds: int, key: str = ""):
+        self.question = question
+        self.rounds = rounds
+        self.path = os.path.join(root, checkpoint_id(question, rounds, key))
+
+    @property
+    def state_path(self) -> str:
+        return os.path.join(self.path, STATE_FILE)
+
+    @property
+    def evidence_path(self) -> str:
+        return os.path.join(self.path, EVIDENCE_DIR)
+
+    def load(self) -> Optional[dict]:
+        """Return the saved state, or None if there is none or it belongs to another debate."""
+        if not os.path.exists(self.state_path):
+            return None
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Unreadable checkpoint '{self.state_path}': {e}")
+            return None
+        if state.get("format") != CHECKPOINT_FORMAT or state.get("question") != self.question \
+                or state.get("rounds") != self.rounds:
+            logger.warning(f"Checkpoint '{self.state_path}' does not match this debate, ignoring it")
+            return None
+        return state
+
+    def save(self, state: dict):
+        """Write the state to a temporary file, fsync it and move it into place."""
+        os.makedirs(self.path, exist_ok=True)
+        state = {"format": CHECKPOINT_FORMAT, "question": self.question, "rounds": self.rounds, **state}
+        tmp = f"{self.state_path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(state, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.state_path)
+
+    def clear(self):
+        """Remove the saved state and evidence snapshot before a fresh run."""
+        shutil.rmtree(self.path, ignore_errors=True)
@@ -12,19 +12,149 @@ load_dotenv()
 GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
 DEEPSEEK_API_KEY = os.getenv('DEEPSEEK_API_KEY')
 
-GEMINI_URL = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent?key={GEMINI_API_KEY}"
-DEEPSEEK_URL = "https://openrouter.ai/api/v1/chat/completions"
+GEMINI_MODEL = "gemini-2.0-flash"
+GEMINI_API_BASE = os.getenv('GEMINI_API_BASE', 'https://generativelanguage.googleapis.com')
+GEMINI_URL = f"{GEMINI_API_BASE}/v1beta/models/{GEMINI_MODEL}:generateContent?key={GEMINI_API_KEY}"
+GEMINI_STREAM_URL = f"{GEMINI_API_BASE}/v1beta/models/{GEMINI_MODEL}:streamGenerateContent?alt=sse&key={GEMINI_API_KEY}"
+DEEPSEEK_URL = os.getenv('DEEPSEEK_URL', "https://openrouter.ai/api/v1/chat/completions")
 DEEPSEEK_MODEL = "deepseek/deepseek-r1:free"
 
+# Logging and tracing: LOG_LEVEL is DEBUG, INFO, WARNING, ERROR or OFF; TRACING=1
+# records per-stage spans to TRACE_DIR (see tracing.py), otherwise spans are no-ops
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+TRACING_ENABLED = os.getenv('TRACING', '0') == '1'
+TRACE_DIR = os.getenv('TRACE_DIR', 'traces')
+
+# Stream tokens from the providers as they are generated
+LLM_STREAMING = os.getenv('LLM_STREAMING', '0') == '1'
+
 # Timeouts
 HTTP_TIMEOUT = 12
 LLM_TIMEOUT = 25
 
-# High-authority domains for reference scoring
-HIGH_AUTHORITY_DOMAINS = {
-    "arxiv.org", "ieeexplore.ieee.org", "acm.org", "springer.com",
-    "nature.com", "sciencedirect.com", "researchgate.net",
-    "wikipedia.org", "github.com", "medium.com", "geeksforgeeks.org",
-    "stackoverflow.com", "cplusplus.com", "pmindia.gov.in", "mea.gov.in",
-    "indiabudget.gov.in", "prsindia.org", "worldbank.org"
-}
\ No newline at end of file
+# Provider connection pools
+LLM_MAX_CONNECTIONS = int(os.getenv('LLM_MAX_CONNECTIONS', '20'))
+LLM_MAX_CONNECTIONS_PER_HOST = int(os.getenv('LLM_MAX_CONNECTIONS_PER_HOST', '10'))
+LLM_KEEPALIVE_TIMEOUT = 60
+
+# Provider rate limits per API key in requests per minute (0 = unlimited),
+# retries with backoff and circuit breaker (see provider_resilience.py)
+GEMINI_REQUESTS_PER_MINUTE = float(os.getenv('GEMINI_REQUESTS_PER_MINUTE', '15'))
+DEEPSEEK_REQUESTS_PER_MINUTE = float(os.getenv('DEEPSEEK_REQUESTS_PER_MINUTE', '20'))
+LLM_RATE_BURST = int(os.getenv('LLM_RATE_BURST', '4'))
+LLM_MAX_RETRIES = int(os.getenv('LLM_MAX_RETRIES', '4'))
+LLM_BACKOFF_BASE = 0.5
+LLM_BACKOFF_MAX = 20.0
+LLM_RETRY_AFTER_MAX = 60.0
+CIRCUIT_FAILURE_THRESHOLD = 5
+CIRCUIT_RESET_TIMEOUT = 30.0
+
+# Prompt context budgets in estimated input tokens per stage (see context_builder.py).
+# Evidence and quoted opponent text get fixed shares; debate history gets what is left.
+CONTEXT_STAGE_BUDGETS = {
+    "initial_suggestion": 800,
+    "critique": 1600,
+    "refinement": 2000,
+    "finalization": 2400,
+}
+CONTEXT_EVIDENCE_SHARE = 0.3
+CONTEXT_QUOTE_SHARE = 0.35
+CONTEXT_RECENT_TURNS = 2  # newest turns kept word for word; older ones are summarized
+CONTEXT_SUMMARY_TOKENS = 300
+CONTEXT_TURN_SUMMARY_TOKENS = 60
+
+# Reference verification limits
+VERIFY_MAX_CONCURRENCY = 8
+VERIFY_PER_HOST_LIMIT = 2
+VERIFY_BATCH_DEADLINE = 20
+MAX_REFERENCES_PER_RESPONSE = 6
+
+# Evidence page loading
+LOADER_MAX_BYTES = 2 * 1024 * 1024
+LOADER_MAX_CONCURRENCY = 8
+LOADER_PER_HOST_LIMIT = 2
+LOADER_ALLOWED_CONTENT_TYPES = ("text/html", "text/plain", "application/xhtml+xml", "application/xml", "text/xml")
+LOADER_MAX_TEXT_CHARS = 20000  # extracted main text kept per page, cut at a paragraph or word boundary
+
+# Persistent evidence index (set EVIDENCE_INDEX_DIR to "" to keep it in memory only)
+EVIDENCE_INDEX_DIR = os.getenv('EVIDENCE_INDEX_DIR', '.cache/evidence_index')
+EVIDENCE_SOURCE_TTL = 3 * 24 * 3600
+EVIDENCE_MAX_SOURCE_AGE = 30 * 24 * 3600
+
+# Evidence retrieval: dense (FAISS over MiniLM embeddings), lexical (BM25, no embedding model)
+# or hybrid (both, merged by reciprocal-rank fusion)
+RETRIEVAL_MODE = os.getenv('RETRIEVAL_MODE', 'dense')
+BM25_K1 = 1.5
+BM25_B = 0.75
+RRF_K = 60
+HYBRID_CANDIDATES_PER_K = 4  # each ranker contributes k * this many candidates to the fusion
+
+# Load the embedder in a background thread while the first LLM round runs
+EMBEDDER_BACKGROUND_WARMUP = os.getenv('EMBEDDER_BACKGROUND_WARMUP', '1') == '1'
+
+# Embedding model and inference backend: torch, torch-int8 (dynamic int8 quantization),
+# onnx or onnx-int8 (ONNX Runtime; needs sentence-transformers[onnx]), see embedding_backends.py
+EMBEDDING_MODEL = os.getenv('EMBEDDING_MODEL', 'sentence-transformers/all-MiniLM-L6-v2')
+EMBEDDING_BACKEND = os.getenv('EMBEDDING_BACKEND', 'torch')
+EMBEDDING_ONNX_INT8_FILE = os.getenv('EMBEDDING_ONNX_INT8_FILE', 'onnx/model_quint8_avx2.onnx')
+EMBEDDING_BATCH_SIZE = int(os.getenv('EMBEDDING_BATCH_SIZE', '64'))
+EMBEDDING_THREADS = int(os.getenv('EMBEDDING_THREADS', '0'))  # 0 keeps the library default
+# Unit-length embeddings searched by inner product (cosine similarity); 0 restores raw vectors and L2
+EMBEDDING_NORMALIZE = os.getenv('EMBEDDING_NORMALIZE', '1') == '1'
+
+# FAISS index: auto picks flat, hnsw or ivfpq by corpus size (see vector_index.py)
+FAISS_INDEX_TYPE = os.getenv('FAISS_INDEX_TYPE', 'auto')
+FAISS_HNSW_MIN_VECTORS = 20000
+FAISS_IVFPQ_MIN_VECTORS = 200000
+FAISS_HNSW_M = 32
+FAISS_HNSW_EF_CONSTRUCTION = 80
+FAISS_HNSW_EF_SEARCH = 64
+FAISS_IVF_NPROBE = 16
+FAISS_PQ_SUBVECTOR_DIMS = 8  # dimensions per PQ sub-quantizer: 384-d vectors become 48-byte codes
+FAISS_REFINE_K_FACTOR = 8  # IVF-PQ candidates re-ranked on 8-bit vectors, as a multiple of k
+FAISS_TRAIN_SAMPLE = 50000  # vectors sampled to train IVF-PQ centroids and codebooks
+
+# Worker pools for CPU-bound ingestion (see workers.py): HTML parsing and splitting run in a
+# thread or process pool (or inline on the event loop), embedding in its own thread pool
+WORKER_POOL = os.getenv('WORKER_POOL', 'thread')
+WORKER_MAX_WORKERS = int(os.getenv('WORKER_MAX_WORKERS', '0'))  # 0 = min(4, CPU count)
+EMBED_WORKERS = int(os.getenv('EMBED_WORKERS', '1'))
+# Event-loop stall monitor: lateness of a periodic wake-up beyond the threshold counts as blocked time
+LOOP_MONITOR_INTERVAL = 0.05
+LOOP_BLOCK_THRESHOLD = 0.02
+
+# Embedding cache (set EMBEDDING_CACHE_DIR to "" to disable)
+EMBEDDING_CACHE_DIR = os.getenv('EMBEDDING_CACHE_DIR', '.cache/embeddings')
+EMBEDDING_CACHE_CAPACITY = 50000
+
+# Stage checkpoints for resuming interrupted debates (see checkpoint.py); empty disables them
+CHECKPOINT_DIR = os.getenv('CHECKPOINT_DIR', '.cache/checkpoints')
+
+# Query vectors kept per retriever for repeated evidence lookups
+QUERY_VECTOR_CACHE_SIZE = 256
+
+# Parsed JSON blocks memoized per (response text, stage) so a payload is decoded once
+JSON_PARSE_CACHE_SIZE = 256
+
+# LLM response cache: off, live, record or replay (see llm_cache.py)
+LLM_CACHE_MODE = os.getenv('LLM_CACHE_MODE', 'live').lower()
+LLM_CACHE_PATH = os.getenv('LLM_CACHE_PATH', '.cache/llm_cache.sqlite3')
+LLM_CACHE_MAX_BYTES = 200 * 1024 * 1024
+
+# Reference validation cache (set REFERENCE_CACHE_PATH to "" to disable)
+REFERENCE_CACHE_PATH = os.getenv('REFERENCE_CACHE_PATH', '.cache/reference_cache.sqlite3')
+REFERENCE_CACHE_POSITIVE_TTL = 7 * 24 * 3600
+REFERENCE_CACHE_NEGATIVE_TTL = 3600
+REFERENCE_CACHE_MAX_ENTRIES = 5000
+
+# HTTP service mode (server.py)
+SERVER_HOST = os.getenv('SERVER_HOST', '127.0.0.1')
+SERVER_PORT = int(os.getenv('SERVER_PORT', '8080'))
+SERVER_MAX_CONCURRENT_DEBATES = int(os.getenv('SERVER_MAX_CONCURRENT_DEBATES', '4'))
+SERVER_MAX_QUEUED_JOBS = 100
+SERVER_MAX_RETAINED_JOBS = 500  # finished jobs kept for polling before the oldest are dropped
+SERVER_MAX_ROUNDS = 5
+
+# Reference authority tiers (see authority_index.py); scores are shown out of 3
+AUTHORITY_TIERS_PATH = os.getenv('AUTHORITY_TIERS_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'authority_tiers.json'))
+AUTHORITY_CACHE_SIZE = 4096  # URL -> (domain, score) lookups kept
\ No newline at end of file
@@ -0,0 +1,147 @@
+"""
+context_builder.py - Token-budgeted prompt context for debate agents
+"""
+
+import re
+from collections import deque
+from typing import Deque, List, Set
+from langchain.schema import Document
+from evidence_index import chunk_hash
+from utils import estimate_tokens
+from config import (
+    CONTEXT_STAGE_BUDGETS, CONTEXT_EVIDENCE_SHARE, CONTEXT_QUOTE_SHARE, CONTEXT_RECENT_TURNS,
+    CONTEXT_SUMMARY_TOKENS, CONTEXT_TURN_SUMMARY_TOKENS
+)
+
+EVIDENCE_PASSAGE_CHARS = 500
+REMINDER_TOKENS = 30
+
+def fit_to_tokens(text: str, budget: int) -> str:
+    """Trim text to at most budget estimated tokens, cutting at a word boundary."""
+    if budget <= 0:
+        return ""
+    if estimate_tokens(text) <= budget:
+        return text
+    cut = text[:budget * 4 - 1]
+    space = cut.rfind(" ")
+    if space > len(cut) // 2:
+        cut = cut[:space]
+    return cut.rstrip() + "…"
+
+def _first_sentence(text: str) -> str:
+    return re.split(r"(?<=[.!?])\s+", text.strip(), maxsplit=1)[0]
+
+class ContextBuilder:
+    """Per-agent prompt context kept within a per-stage token budget.
+
+    The newest turns are kept word for word; each turn that falls out of that
+    window is condensed once into a line of the rolling summary, whose oldest
+    lines are dropped when it outgrows its budget. Evidence passages already
+    quoted to this agent are repeated only as a one-line reminder.
+    """
+
+    def __init__(self, recent_turns: int = CONTEXT_RECENT_TURNS,
+                 summary_tokens: int = CONTEXT_SUMMARY_TOKENS,
+                 turn_summary_tokens: int = CONTEXT_TURN_SUMMARY_TOKENS):
+        self.recent_turns = recent_turns
+        self.summary_tokens = summary_tokens
+        self.turn_summary_tokens = turn_summary_tokens
+        self.recent: Deque[str] = deque()
+        self.summary: Deque[str] = deque()
+        self.summary_size = 0
+        self.omitted = 0
+        self.quoted: Set[str] = set()
+
+    def to_state(self) -> dict:
+        return {
+            "recent": list(self.recent),
+            "summary": list(self.summary),
+            "summary_size": self.summary_size,
+            "omitted": self.omitted,
+            "quoted": sorted(self.quoted),
+        }
+
+    def load_state(self, state: dict):
+        self.recent = deque(state["recent"])
+        self.summary = deque(state["summary"])
+        self.summary_size = state["summary_size"]
+        self.omitted = state["omitted"]
+        self.quoted = set(state["quoted"])
+
+    def clear_turns(self):
+        self.recent.clear()
+        self.summary.clear()
+        self.summary_size = 0
+        self.omitted = 0
+
+    @staticmethod
+    def budget(stage: str) -> int:
+        return CONTEXT_STAGE_BUDGETS.get(stage, max(CONTEXT_STAGE_BUDGETS.values()))
+
+    def add_turn(self, text: str):
+        """Record a turn, folding the oldest recent turn into the summary."""
+        self.recent.append(text)
+        while len(self.recent) > self.recent_turns:
+            self._summarize(self.recent.popleft())
+
+    def _summarize(self, text: str):
+        line = fit_to_tokens(_first_sentence(text), self.turn_summary_tokens)
+        self.summary.append(line)
+        self.summary_size += estimate_tokens(line) + 1
+        while self.summary_size > self.summary_tokens and len(self.summary) > 1:
+            self.summary_size -= estimate_tokens(self.summary.popleft()) + 1
+            self.omitted += 1
+
+    def history(self, budget: int) -> str:
+        """Summary of older turns plus the newest turns, newest kept first when space runs out."""
+        if not self.recent and not self.summary:
+            return "No history available"
+        remaining = budget
+        recent: List[str] = []
+        for turn in reversed(self.recent):
+            cost = estimate_tokens(turn) + 1
+            if cost > remaining:
+                if not recent:
+                    recent.append(fit_to_tokens(turn, remaining - 1))
+                    remaining = 0
+                break
+            recent.append(turn)
+            remaining -= cost
+        recent.reverse()
+
+        parts = []
+        if self.summary and remaining > 0:
+            header = f"Earlier turns (summary{f', {self.omitted} oldest omitted' if self.omitted else ''}):"
+            summary = fit_to_tokens("\n".join(f"- {line}" for line in self.summary),
+                                    remaining - estimate_tokens(header) - 1)
+            if summary:
+                parts.append(f"{header}\n{summary}")
+        if recent:
+            parts.append("Recent turns:\n" + "\n".join(recent))
+        return "\n".join(parts) or "No history available"
+
+    def evidence(self, docs: List[Document], stage: str) -> str:
+        """Render evidence within the stage's evidence share, reminding rather than re-quoting."""
+        remaining = int(self.budget(stage) * CONTEXT_EVIDENCE_SHARE)
+        lines = []
+        seen = set()
+        for doc in docs:
+            key = chunk_hash(doc.page_content)
+            if key in seen:
+                continue
+            seen.add(key)
+            if key in self.quoted:
+                passage = "(quoted earlier) " + fit_to_tokens(_first_sentence(doc.page_content), REMINDER_TOKENS)
+            else:
+                passage = doc.page_content[:EVIDENCE_PASSAGE_CHARS]
+            passage = fit_to_tokens(passage, remaining - 1)
+            if not passage:
+                break
+            self.quoted.add(key)
+            lines.append(passage)
+            remaining -= estimate_tokens(passage) + 1
+        return "\n".join(lines)
+
+    def quote(self, text: str, stage: str, parts: int = 1) -> str:
+        """Fit quoted debate text (an opponent's answer or critique) into its share of the budget."""
+        return fit_to_tokens(text, int(self.budget(stage) * CONTEXT_QUOTE_SHARE / parts))
@@ -2,18 +2,32 @@
 debate_agent.py - Debate agent logic with lawyer-style critique
 """
 
-from typing import List, Tuple
+import time
+from typing import Callable, Dict, List, Optional, Tuple
 from langchain_core.chat_history import InMemoryChatMessageHistory
 from langchain_core.messages import HumanMessage, AIMessage
 from langchain.agents import Tool
+from langchain.schema import Document
 from web_loader import validate_reference
+from context_builder import ContextBuilder
+from utils import estimate_tokens
+from tracing import get_logger, span
+
+logger = get_logger(__name__)
+
+# Rough size of the stage/JSON instructions formulate_response wraps around the task
+RESPONSE_TEMPLATE_TOKENS = 60
 
 class DebateAgent:
-    def __init__(self, name: str, llm_call_func):
+    def __init__(self, name: str, llm_call_func,
+                 token_sink: Optional[Callable[[str, str, str], None]] = None):
         self.name = name
         self.llm_call = llm_call_func
+        self.token_sink = token_sink
         self.memory = InMemoryChatMessageHistory()
+        self.context = ContextBuilder()
         self.tools = self._init_tools()
+        self.call_metrics: List[Dict] = []
     
     def _init_tools(self) -> List[Tool]:
         """Initialize agent tools."""
@@ -32,10 +46,11 @@ class DebateAgent:
     
     async def formulate_response(self, prompt: str, stage: str) -> Tuple[str, List[str]]:
         """Formulate a response based on debate stage."""
-        print(f"[DEBUG] {self.name} formulating {stage} response")
+        logger.debug("%s formulating %s response", self.name, stage)
+        history_budget = ContextBuilder.budget(stage) - estimate_tokens(prompt) - RESPONSE_TEMPLATE_TOKENS
         full_prompt = f"""
         Debate Context:
-        {self._get_history()}
+        {self.context.history(history_budget)}
         
         Stage: {stage}
         Task: {prompt}
@@ -46,16 +61,17 @@ class DebateAgent:
             "references": ["https://url1", "https://url2"]
         }}
         """
-        return await self.llm_call(full_prompt)
+        return await self._call_llm(full_prompt, stage)
     
-    async def critique_opponent(self, opponent_answer: str, question: str, evidence: str) -> Tuple[str, List[str]]:
+    async def critique_opponent(self, opponent_answer: str, question: str,
+                                evidence_docs: List[Document]) -> Tuple[str, List[str]]:
         """Critique the opponent's suggestion for flaws."""
-        print(f"[DEBUG] {self.name} critiquing opponent")
+        logger.debug("%s critiquing opponent", self.name)
         critique_prompt = f"""
         As a lawyer-style debate agent for {self.name}, analyze the following opponent suggestion for flaws (e.g., factual inaccuracies, weak evidence, missing points) regarding: {question}
         
-        Opponent's suggestion: {opponent_answer}
-        Supporting evidence: {evidence}
+        Opponent's suggestion: {self.context.quote(opponent_answer, "critique")}
+        Supporting evidence: {self.context.evidence(evidence_docs, "critique")}
         
         Provide a concise critique (max 300 words) identifying specific weaknesses and suggest improvements. End with a JSON block:
         {{
@@ -63,7 +79,50 @@ class DebateAgent:
             "references": ["https://url1", "https://url2"]
         }}
         """
-        return await self.llm_call(critique_prompt)
+        return await self._call_llm(critique_prompt, "critique")
+    
+    async def _call_llm(self, prompt: str, stage: str) -> Tuple[str, List[str]]:
+        """Call the LLM, forwarding tokens to the sink and recording latency metrics."""
+        prompt_tokens = estimate_tokens(prompt)
+        budget = ContextBuilder.budget(stage)
+        logger.debug("%s %s prompt: %s tokens (budget %s)", self.name, stage, prompt_tokens, budget)
+        start = time.perf_counter()
+        first_token_at = None
+        tokens = 0
+        chunks = 0
+        
+        def on_token(chunk: str):
+            nonlocal first_token_at, tokens, chunks
+            if first_token_at is None:
+                first_token_at = time.perf_counter()
+            tokens += estimate_tokens(chunk)
+            chunks += 1
+            if self.token_sink is not None:
+                self.token_sink(self.name, stage, chunk)
+        
+        with span("llm_call", agent=self.name, stage=stage, bytes=len(prompt)) as llm_span:
+            try:
+                answer, refs = await self.llm_call(prompt, on_token=on_token)
+                llm_span.add("bytes", len(answer))
+                return answer, refs
+            finally:
+                end = time.perf_counter()
+                ttft = (first_token_at or end) - start
+                # A single chunk means the answer was not streamed; rate it over the whole call
+                generating = end - first_token_at if chunks > 1 else end - start
+                metrics = {
+                    "stage": stage,
+                    "prompt_tokens": prompt_tokens,
+                    "prompt_budget": budget,
+                    "ttft": ttft,
+                    "duration": end - start,
+                    "tokens": tokens,
+                    "tokens_per_sec": tokens / generating if generating > 0 else 0.0
+                }
+                self.call_metrics.append(metrics)
+                llm_span.set(items=tokens, ttft=ttft)
+                logger.debug("%s %s: first token after %.2fs, %s tokens at %.1f tok/s",
+                             self.name, stage, ttft, tokens, metrics["tokens_per_sec"])
     
     def _check_reference(self, url: str) -> str:
         """Check a reference URL."""
@@ -82,5 +141,31 @@ class DebateAgent:
             self.memory.add_message(HumanMessage(content=message))
         else:
             self.memory.add_message(AIMessage(content=message))
+        self.context.add_turn(message)
         if len(self.memory.messages) > max_history:
-            self.memory.messages = self.memory.messages[-max_history:]
\ No newline at end of file
+            self.memory.messages = self.memory.messages[-max_history:]
+    
+    def clear_turns(self):
+        """Forget the debate turns in memory and prompt context, keeping quoted evidence and metrics."""
+        self.memory.messages = []
+        self.context.clear_turns()
+    
+    def to_state(self) -> Dict:
+        """Memory, prompt context and call metrics as plain data for a checkpoint."""
+        return {
+            "memory": [
+                {"role": "human" if isinstance(msg, HumanMessage) else "ai", "content": msg.content}
+                for msg in self.memory.messages
+            ],
+            "context": self.context.to_state(),
+            "call_metrics": self.call_metrics,
+        }
+    
+    def load_state(self, state: Dict):
+        """Restore what to_state() saved."""
+        self.memory.messages = [
+            HumanMessage(content=msg["content"]) if msg["role"] == "human" else AIMessage(content=msg["content"])
+            for msg in state["memory"]
+        ]
+        self.context.load_state(state["context"])
+        self.call_metrics = list(state["call_metrics"])
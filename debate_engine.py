@@ -2,205 +2,247 @@
 debate_engine.py - Core debate orchestration with lawyer-style logic
 """
 
-from typing import List, Dict, Tuple
+from typing import Callable, List, Dict, Optional, Sequence, Tuple
 import asyncio
 import time
-from dataclasses import dataclass
-from utils import now_ts, calculate_authority_score, domain_from_url, urlparse, safe_json_parse
+from utils import now_ts, urlparse
+from authority_index import authority_for_url
 from evidence_retriever import EvidenceRetriever
 from debate_agent import DebateAgent
 from llm_calls import call_gemini_async, call_deepseek_async
-from web_loader import validate_reference
+from reference_verifier import ReferenceVerifier
+from checkpoint import DebateCheckpoint
+from debate_history import DebateHistory, HistoryRecord, VerifiedReference
+from workers import StallStats, run_cpu, watch_loop
+from config import MAX_REFERENCES_PER_RESPONSE, EMBEDDER_BACKGROUND_WARMUP, CHECKPOINT_DIR
+from tracing import debate_trace, get_logger, span
 
-@dataclass
-class VerifiedReference:
-    url: str
-    valid: bool
-    snippet: str
-    domain: str
-    authority_score: int = 0
+logger = get_logger(__name__)
+
+# Stage tasks are keyed "stage:round:agent"
+def task_key(stage: str, round_num: int, agent: str) -> str:
+    return f"{stage}:{round_num}:{agent}"
+
+def parse_task_key(key: str) -> Tuple[str, int, str]:
+    stage, round_num, agent = key.split(":", 2)
+    return stage, int(round_num), agent
+
+STAGE_MEMORY_LABELS = {
+    "initial_suggestion": "Initial suggestion",
+    "critique": "Critique round {round}",
+    "refinement": "Refinement round {round}",
+    "finalization": "Final answer",
+}
+
+def default_participants() -> Dict[str, Callable]:
+    return {"Gemini": call_gemini_async, "DeepSeek": call_deepseek_async}
 
 class DebateEngine:
-    def __init__(self, rounds: int = 1):
-        print("[DEBUG] Initializing DebateEngine")
+    """Runs a debate as a DAG of per-agent stage tasks.
+
+    Agents sit in a ring: each critiques the next one's latest suggestion and
+    refines its own against the critique from the agent before it. A task
+    starts as soon as the answers it needs exist, so a fast agent never waits
+    for a round barrier; reference verification, evidence ingestion and
+    checkpointing follow each answer in the background of the next LLM calls.
+    """
+
+    def __init__(self, rounds: int = 1, embedder=None, token_sink=None, evidence_index=None,
+                 round_sink: Optional[Callable[[HistoryRecord], None]] = None,
+                 checkpoint_dir: str = CHECKPOINT_DIR, resume: bool = False, checkpoint_key: str = "",
+                 participants: Optional[Dict[str, Callable]] = None):
+        logger.debug("Initializing DebateEngine")
         self.rounds = rounds
-        self.history: List[Dict] = []
-        self.evidence_retriever = EvidenceRetriever()
-        self.agents = {
-            "Gemini": DebateAgent("Gemini", call_gemini_async),
-            "DeepSeek": DebateAgent("DeepSeek", call_deepseek_async)
-        }
-    
-    async def run_debate(self, question: str) -> Tuple[str, List[Dict]]:
-        """Run the lawyer-style debate process."""
-        print("[DEBUG] Starting debate")
-        await self._initial_suggestion_round(question)
+        self.history = DebateHistory()
+        self.round_sink = round_sink
+        self.trace = None
+        self.checkpoint_dir = checkpoint_dir
+        self.resume = resume
+        self.checkpoint_key = checkpoint_key
+        self.checkpoint: Optional[DebateCheckpoint] = None
+        self.completed_tasks: List[str] = []
+        self.evidence_retriever = EvidenceRetriever(embedder=embedder, index=evidence_index)
+        self.reference_verifier = ReferenceVerifier()
+        participants = participants or default_participants()
+        if len(participants) < 2:
+            raise ValueError("A debate needs at least two participants")
+        self.agents = {name: DebateAgent(name, llm_call, token_sink) for name, llm_call in participants.items()}
+        names = list(self.agents)
+        self.opponents = {name: names[(i + 1) % len(names)] for i, name in enumerate(names)}
+        self.critics = {opponent: name for name, opponent in self.opponents.items()}
+        self.dag = self._build_dag()
+        # Answer text per finished task, and whether it and everything it depended on succeeded
+        self.outputs: Dict[str, str] = {}
+        self._clean: Dict[str, bool] = {}
+        self._answered: Dict[str, asyncio.Future] = {}
+        self._llm_seconds: Dict[str, float] = {}
+        self.loop_stalls = StallStats()
+
+    def _build_dag(self) -> Dict[str, Tuple[str, ...]]:
+        """Map every stage task to the tasks whose answers its prompt needs, in execution order."""
+        names = list(self.agents)
+        dag: Dict[str, Tuple[str, ...]] = {}
+        latest = {name: task_key("initial_suggestion", 0, name) for name in names}
+        for key in latest.values():
+            dag[key] = ()
         for round_num in range(1, self.rounds + 1):
-            print(f"[DEBUG] Running critique round {round_num}")
-            await self._critique_round(question, round_num)
-            print(f"[DEBUG] Running refinement round {round_num}")
-            await self._refinement_round(question, round_num)
-        print("[DEBUG] Running finalization round")
-        final_answer = await self._finalization_round(question)
-        print("[DEBUG] Debate completed")
+            critiques = {name: task_key("critique", round_num, name) for name in names}
+            for name in names:
+                dag[critiques[name]] = (latest[self.opponents[name]],)
+            for name in names:
+                dag[task_key("refinement", round_num, name)] = (latest[name], critiques[self.critics[name]])
+            latest = {name: task_key("refinement", round_num, name) for name in names}
+        for name in names:
+            dag[task_key("finalization", 0, name)] = (latest[name],) + tuple(latest[n] for n in names if n != name)
+        return dag
+
+    async def run_debate(self, question: str) -> Tuple[str, DebateHistory]:
+        """Run the lawyer-style debate process."""
+        logger.debug("Starting debate")
+        with debate_trace("run_debate", question=question, rounds=self.rounds) as trace, \
+                span("run_debate", rounds=self.rounds, tasks=len(self.dag)), watch_loop() as stalls:
+            self.trace = trace
+            self.loop_stalls = stalls
+            if self.checkpoint_dir:
+                self.checkpoint = DebateCheckpoint(self.checkpoint_dir, question, self.rounds, self.checkpoint_key)
+                if self.resume:
+                    final_answer = self._restore_checkpoint()
+                    if final_answer is not None:
+                        logger.info("Checkpoint holds a finished debate, returning its final answer")
+                        return final_answer, self.history
+                else:
+                    self.checkpoint.clear()
+            if EMBEDDER_BACKGROUND_WARMUP:
+                # No evidence is needed until the initial suggestions are back
+                self.evidence_retriever.warm_up()
+            loop = asyncio.get_running_loop()
+            for key in self.dag:
+                self._answered.setdefault(key, loop.create_future())
+            start = time.perf_counter()
+            pending = [asyncio.ensure_future(self._run_task(key, question))
+                       for key in self.dag if key not in self.completed_tasks]
+            try:
+                await asyncio.gather(*pending)
+            except BaseException:
+                for task in pending:
+                    task.cancel()
+                raise
+            self._log_critical_path(time.perf_counter() - start)
+            logger.info(f"Event loop blocked for {stalls.blocked_seconds:.2f}s during the debate "
+                        f"({stalls.stalls} stalls, longest {stalls.max_stall * 1000:.0f}ms)")
+            if trace is not None:
+                trace.attrs["event_loop"] = stalls.to_dict()
+
+            self._sort_history()
+            final_answers = [(h.answer, h.references) for h in self.history.stage("finalization")]
+            final_answer = self._select_final_answer(final_answers)
+            finished = len(self.completed_tasks) == len(self.dag)
+            if not finished:
+                logger.warning(f"{len(self.dag) - len(self.completed_tasks)} tasks failed or had failed inputs; "
+                               f"a resume will redo them")
+            # Only a debate whose every task is clean may be returned as finished by a resume
+            await self._save_checkpoint(final_answer if finished else None)
+        logger.debug("Debate completed")
         return final_answer, self.history
-    
-    async def _initial_suggestion_round(self, question: str):
-        """Run initial suggestion round."""
-        tasks = []
-        for agent_name, agent in self.agents.items():
-            prompt = f"As a lawyer for {agent_name}, provide a concise initial suggestion for: {question}"
-            tasks.append(agent.formulate_response(prompt, "initial_suggestion"))
-        
-        results = await asyncio.gather(*tasks, return_exceptions=True)
-        
-        for (agent_name, agent), result in zip(self.agents.items(), results):
-            if isinstance(result, Exception):
-                answer, refs = f"[Error] {result}", []
-                print(f"[DEBUG] Error in {agent_name} initial suggestion: {result}")
-            else:
-                answer, refs = result
-            json_block = safe_json_parse(answer, "initial_suggestion")
-            answer_text = json_block.get("answer", answer) if json_block else answer
+
+    async def _run_task(self, key: str, question: str):
+        """Wait for the answers a task depends on, run it, then verify and ingest its references."""
+        try:
+            await self._execute_task(key, question)
+        finally:
+            # Never leave dependents waiting on a task that died before answering
+            if not self._answered[key].done():
+                self._answered[key].cancel()
+
+    async def _execute_task(self, key: str, question: str):
+        stage, round_num, agent_name = parse_task_key(key)
+        deps = self.dag[key]
+        await asyncio.gather(*(self._answered[dep] for dep in deps))
+        agent = self.agents[agent_name]
+
+        with span("task", stage=stage, round=round_num, agent=agent_name):
+            start = time.perf_counter()
+            try:
+                answer, refs = await self._stage_response(stage, round_num, agent_name, deps, question)
+                ok = True
+            except Exception as e:
+                logger.warning(f"Error in {agent_name} {stage} (round {round_num}): {e}")
+                answer, refs, ok = f"[Error] {e}", [], False
+            self._llm_seconds[key] = time.perf_counter() - start
+            self.outputs[key] = answer
+            self._clean[key] = ok and all(self._clean[dep] for dep in deps)
+            agent.add_to_memory(f"{STAGE_MEMORY_LABELS[stage].format(round=round_num)}: {answer}", max_history=10)
+            # Dependent tasks can start now; verification and ingestion run alongside them
+            self._answered[key].set_result(answer)
+
             verified_refs = await self._verify_references(refs)
-            round_data = {
-                "agent": agent_name,
-                "stage": "initial_suggestion",
-                "round": 0,
-                "answer": answer_text,
-                "raw_response": answer,
-                "references": verified_refs,
-                "timestamp": now_ts()
-            }
-            self.history.append(round_data)
-            agent.add_to_memory(f"Initial suggestion: {answer_text}", max_history=10)
-            await self.evidence_retriever.add_evidence(verified_refs)
-    
-    async def _critique_round(self, question: str, round_num: int):
-        """Run critique round."""
-        tasks = []
-        for agent_name, agent in self.agents.items():
-            opponent_name = "DeepSeek" if agent_name == "Gemini" else "Gemini"
-            opponent_suggestion = self._get_last_suggestion(opponent_name, "initial_suggestion" if round_num == 1 else "refinement")
-            
-            evidence_docs = self.evidence_retriever.get_relevant_evidence(question)
-            evidence_str = "\n".join([doc.page_content[:500] for doc in evidence_docs])
-            
-            tasks.append(agent.critique_opponent(opponent_suggestion, question, evidence_str))
-        
-        results = await asyncio.gather(*tasks, return_exceptions=True)
-        
-        for (agent_name, agent), result in zip(self.agents.items(), results):
-            if isinstance(result, Exception):
-                critique, refs = f"[Error] {result}", []
-                print(f"[DEBUG] Error in {agent_name} critique round {round_num}: {result}")
+            self._record(HistoryRecord(agent_name, stage, round_num, answer, verified_refs, now_ts()))
+            if stage != "finalization":
+                await self.evidence_retriever.add_evidence(verified_refs)
+            if self._clean[key]:
+                self.completed_tasks.append(key)
+                await self._save_checkpoint()
             else:
-                critique, refs = result
-            json_block = safe_json_parse(critique, "critique")
-            critique_text = json_block.get("critique", critique) if json_block else critique
-            verified_refs = await self._verify_references(refs)
-            round_data = {
-                "agent": agent_name,
-                "stage": "critique",
-                "round": round_num,
-                "answer": critique_text,
-                "raw_response": critique,
-                "references": verified_refs,
-                "timestamp": now_ts()
-            }
-            self.history.append(round_data)
-            agent.add_to_memory(f"Critique round {round_num}: {critique_text}", max_history=10)
-            await self.evidence_retriever.add_evidence(verified_refs)
-    
-    async def _refinement_round(self, question: str, round_num: int):
-        """Run refinement round."""
-        tasks = []
-        for agent_name, agent in self.agents.items():
-            opponent_name = "DeepSeek" if agent_name == "Gemini" else "Gemini"
-            opponent_critique = self._get_last_critique(opponent_name, round_num)
-            evidence_docs = self.evidence_retriever.get_relevant_evidence(question)
-            evidence_str = "\n".join([doc.page_content[:500] for doc in evidence_docs])
-            
+                logger.warning(f"{key} is not checkpointed: it or a task it depends on failed")
+
+    async def _stage_response(self, stage: str, round_num: int, agent_name: str,
+                              deps: Tuple[str, ...], question: str) -> Tuple[str, List[str]]:
+        """Prompt one agent for one stage, given the answers of the tasks it depends on."""
+        agent = self.agents[agent_name]
+        if stage == "initial_suggestion":
+            prompt = f"As a lawyer for {agent_name}, provide a concise initial suggestion for: {question}"
+            return await agent.formulate_response(prompt, stage)
+
+        await self.evidence_retriever.ensure_embedder()
+        evidence_docs = await self.evidence_retriever.aget_relevant_evidence(question)
+        if stage == "critique":
+            return await agent.critique_opponent(self.outputs[deps[0]], question, evidence_docs)
+
+        if stage == "refinement":
+            opponent_critique = self.outputs[deps[1]]
             prompt = f"""
             As a lawyer for {agent_name}, refine your suggestion for: {question}
-            Opponent's critique: {opponent_critique}
-            Supporting evidence: {evidence_str}
+            Opponent's critique: {agent.context.quote(opponent_critique, "refinement")}
+            Supporting evidence: {agent.context.evidence(evidence_docs, "refinement")}
             Address the critique and strengthen your argument.
             """
-            tasks.append(agent.formulate_response(prompt, "refinement"))
-        
-        results = await asyncio.gather(*tasks, return_exceptions=True)
-        
-        for (agent_name, agent), result in zip(self.agents.items(), results):
-            if isinstance(result, Exception):
-                answer, refs = f"[Error] {result}", []
-                print(f"[DEBUG] Error in {agent_name} refinement round {round_num}: {result}")
-            else:
-                answer, refs = result
-            json_block = safe_json_parse(answer, "refinement")
-            answer_text = json_block.get("answer", answer) if json_block else answer
-            verified_refs = await self._verify_references(refs)
-            round_data = {
-                "agent": agent_name,
-                "stage": "refinement",
-                "round": round_num,
-                "answer": answer_text,
-                "raw_response": answer,
-                "references": verified_refs,
-                "timestamp": now_ts()
-            }
-            self.history.append(round_data)
-            agent.add_to_memory(f"Refinement round {round_num}: {answer_text}", max_history=10)
-            await self.evidence_retriever.add_evidence(verified_refs)
-    
-    async def _finalization_round(self, question: str) -> str:
-        """Run finalization round to merge suggestions and provide a summary."""
-        tasks = []
-        for agent_name, agent in self.agents.items():
-            opponent_name = "DeepSeek" if agent_name == "Gemini" else "Gemini"
-            my_suggestion = self._get_last_suggestion(agent_name, "refinement")
-            opponent_suggestion = self._get_last_suggestion(opponent_name, "refinement")
-            evidence_docs = self.evidence_retriever.get_relevant_evidence(question)
-            evidence_str = "\n".join([doc.page_content[:500] for doc in evidence_docs])
-            
-            prompt = f"""
+            return await agent.formulate_response(prompt, stage)
+
+        my_suggestion = self.outputs[deps[0]]
+        other_suggestions = "\n".join(
+            agent.context.quote(self.outputs[dep], "finalization", parts=len(deps)) for dep in deps[1:]
+        )
+        prompt = f"""
             As a lawyer for {agent_name}, collaborate with the opponent to produce a high-accuracy final answer for: {question}
-            Your suggestion: {my_suggestion}
-            Opponent's suggestion: {opponent_suggestion}
-            Supporting evidence: {evidence_str}
+            Your suggestion: {agent.context.quote(my_suggestion, "finalization", parts=len(deps))}
+            {"Opponent's suggestion" if len(deps) == 2 else "Other suggestions"}: {other_suggestions}
+            Supporting evidence: {agent.context.evidence(evidence_docs, "finalization")}
             Merge the strongest points from both suggestions, prioritizing factual accuracy and evidence quality. End with a JSON block:
             {{
                 "final_answer": "...",
                 "references": ["https://url1", "https://url2"]
             }}
             """
-            tasks.append(agent.formulate_response(prompt, "finalization"))
-        
-        results = await asyncio.gather(*tasks, return_exceptions=True)
-        
-        final_answers = []
-        for (agent_name, agent), result in zip(self.agents.items(), results):
-            if isinstance(result, Exception):
-                answer, refs = f"[Error] {result}", []
-                print(f"[DEBUG] Error in {agent_name} finalization: {result}")
-            else:
-                answer, refs = result
-            json_block = safe_json_parse(answer, "finalization")
-            answer_text = json_block.get("final_answer", answer) if json_block else answer
-            verified_refs = await self._verify_references(refs)
-            round_data = {
-                "agent": agent_name,
-                "stage": "finalization",
-                "round": 0,
-                "answer": answer_text,
-                "raw_response": answer,
-                "references": verified_refs,
-                "timestamp": now_ts()
-            }
-            self.history.append(round_data)
-            agent.add_to_memory(f"Final answer: {answer_text}", max_history=10)
-            final_answers.append((answer_text, verified_refs))
-        
+        return await agent.formulate_response(prompt, stage)
+
+    def _sort_history(self):
+        """Put the history in DAG order; tasks finish, and are recorded, in any order."""
+        order = {key: i for i, key in enumerate(self.dag)}
+        self.history.sort(key=lambda h: order.get(task_key(h.stage, h.round, h.agent), len(order)))
+
+    def _log_critical_path(self, wall: float):
+        """Compare the DAG's wall time with what per-stage barriers would have cost for the same calls."""
+        if not self._llm_seconds:
+            return
+        slowest: Dict[Tuple[str, int], float] = {}
+        for key, seconds in self._llm_seconds.items():
+            stage, round_num, _ = parse_task_key(key)
+            slowest[(stage, round_num)] = max(slowest.get((stage, round_num), 0.0), seconds)
+        logger.info(f"Stage DAG finished in {wall:.2f}s; LLM calls alone would take "
+                    f"{sum(slowest.values()):.2f}s behind per-stage barriers")
+
+    def _select_final_answer(self, final_answers: List[Tuple[str, Sequence[VerifiedReference]]]) -> str:
+        """Score the agents' final answers and build the closing summary around the best one."""
         # Select the best final answer
         scored_answers = []
         for answer, refs in final_answers:
@@ -255,36 +297,91 @@ VERIFIED REFERENCES:
         
         return result
     
+    async def _save_checkpoint(self, final_answer: Optional[str] = None):
+        """Write history, agent state and the completed tasks; only tasks with clean inputs count as completed."""
+        if self.checkpoint is None:
+            return
+        state = {
+            "completed_tasks": list(self.completed_tasks),
+            "history": self.history.to_state(),
+            "agents": {name: agent.to_state() for name, agent in self.agents.items()},
+            "final_answer": final_answer,
+        }
+        with span("checkpoint", items=len(self.completed_tasks)):
+            try:
+                index = self.evidence_retriever.index
+                if not index.path:
+                    # The index is not persisted on its own, so keep a copy with the checkpoint
+                    await run_cpu("index", index.save, self.checkpoint.evidence_path)
+                self.checkpoint.save(state)
+                logger.debug("Checkpoint saved with %s/%s tasks", len(self.completed_tasks), len(self.dag))
+            except Exception as e:
+                logger.warning(f"Failed to save checkpoint: {e}")
+    
+    def _restore_checkpoint(self) -> Optional[str]:
+        """Reload history, agent state and evidence; returns the final answer if the debate had finished."""
+        state = self.checkpoint.load()
+        if state is None:
+            logger.info("No checkpoint to resume from, starting from the first stage")
+            return None
+        completed = [key for key in state["completed_tasks"] if key in self.dag]
+        for record in DebateHistory.from_state(state["history"]):
+            key = task_key(record.stage, record.round, record.agent)
+            if key in completed:
+                self._record(record)
+                self.outputs[key] = record.answer
+        for name, agent_state in state["agents"].items():
+            if name in self.agents:
+                self.agents[name].load_state(agent_state)
+        # The saved memory can hold turns of tasks that failed and will be redone, so rebuild
+        # every agent's turns from the restored records only
+        for agent in self.agents.values():
+            agent.clear_turns()
+        self._sort_history()
+        for record in self.history:
+            label = STAGE_MEMORY_LABELS[record.stage].format(round=record.round)
+            self.agents[record.agent].add_to_memory(f"{label}: {record.answer}", max_history=10)
+        index = self.evidence_retriever.index
+        if not index.path and len(index) == 0:
+            index.load(self.checkpoint.evidence_path)
+        loop = asyncio.get_running_loop()
+        for key in completed:
+            self._clean[key] = True
+            self._answered[key] = loop.create_future()
+            self._answered[key].set_result(self.outputs[key])
+        self.completed_tasks = completed
+        logger.info(f"Resumed from checkpoint with {len(completed)}/{len(self.dag)} tasks done")
+        return state.get("final_answer")
+    
+    def _record(self, record: HistoryRecord):
+        """Add a stage result to the history and hand it to the round sink, if any."""
+        self.history.add(record)
+        if self.round_sink is not None:
+            try:
+                self.round_sink(record)
+            except Exception as e:
+                logger.warning(f"Round sink error: {e}")
+    
     async def _verify_references(self, urls: List[str]) -> List[VerifiedReference]:
-        """Verify reference URLs."""
-        verified = []
-        for url in urls[:6]:
+        """Verify one answer's reference URLs concurrently (see ReferenceVerifier)."""
+        candidates = []
+        for url in urls[:MAX_REFERENCES_PER_RESPONSE]:
             if not urlparse(url).scheme:
-                print(f"[DEBUG] Skipping invalid URL: {url}")
+                logger.debug("Skipping invalid URL: %s", url)
                 continue
-            is_valid, snippet = validate_reference(url)
-            domain = domain_from_url(url)
-            score = calculate_authority_score(domain)
+            candidates.append(url)
+
+        with span("verify_references", items=len(candidates)):
+            checked = await self.reference_verifier.verify(candidates)
+        verified = []
+        for url, is_valid, snippet in checked:
+            domain, authority_score = authority_for_url(url)
             verified.append(VerifiedReference(
                 url=url,
                 valid=is_valid,
                 snippet=snippet,
                 domain=domain,
-                authority_score=score
+                authority_score=authority_score
             ))
-            print(f"[DEBUG] Verified {url}: {'Valid' if is_valid else 'Invalid'}")
+            logger.debug("Verified %s: %s", url, "Valid" if is_valid else "Invalid")
         return verified
-    
-    def _get_last_suggestion(self, agent_name: str, stage: str) -> str:
-        """Get the last suggestion from an agent."""
-        for round_data in reversed(self.history):
-            if round_data["agent"] == agent_name and round_data["stage"] in [stage]:
-                return round_data["answer"]
-        return "No previous suggestion found"
-    
-    def _get_last_critique(self, agent_name: str, round_num: int) -> str:
-        """Get the last critique from an agent."""
-        for round_data in reversed(self.history):
-            if round_data["agent"] == agent_name and round_data["stage"] == "critique" and round_data["round"] == round_num:
-                return round_data["answer"]
-        return "No previous critique found"
\ No newline at end of file
@@ -0,0 +1,132 @@
+"""
+debate_history.py - Indexed, compact store for a debate's stage results
+
+    history = DebateHistory()
+    history.add(HistoryRecord("Gemini", "critique", 1, answer, refs, now_ts()))
+    history.get("critique", 1, "Gemini")   # one agent's critique in round 1
+    history.stage("refinement", 1)         # every agent's refinement in round 1
+
+Records are slotted objects indexed by (stage, round, agent), by (stage,
+round) and by agent, so lookups never scan the whole history. References are
+interned per debate: a URL verified with the same outcome in several rounds
+is one VerifiedReference (and one snippet) shared by every record that cites
+it, and checkpoints write it once. The raw response is only stored when it
+differs from the answer.
+"""
+
+from dataclasses import asdict, dataclass
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+@dataclass(frozen=True, slots=True)
+class VerifiedReference:
+    url: str
+    valid: bool
+    snippet: str
+    domain: str
+    authority_score: int = 0
+
+class HistoryRecord:
+    """One agent's answer for one stage and round (round 0 for the initial and final stages)."""
+    __slots__ = ("agent", "stage", "round", "answer", "references", "timestamp", "_raw")
+
+    def __init__(self, agent: str, stage: str, round_num: int, answer: str,
+                 references: Sequence[VerifiedReference] = (), timestamp: float = 0.0,
+                 raw_response: Optional[str] = None):
+        self.agent = agent
+        self.stage = stage
+        self.round = round_num
+        self.answer = answer
+        self.references: Tuple[VerifiedReference, ...] = tuple(references)
+        self.timestamp = timestamp
+        self._raw = None if raw_response is None or raw_response == answer else raw_response
+
+    @property
+    def key(self) -> Tuple[str, int, str]:
+        return self.stage, self.round, self.agent
+
+    @property
+    def raw_response(self) -> str:
+        return self.answer if self._raw is None else self._raw
+
+    def __repr__(self) -> str:
+        return f"HistoryRecord({self.agent!r}, {self.stage!r}, {self.round}, {len(self.answer)} chars)"
+
+class DebateHistory:
+    """Stage results in recording order, with O(1) lookups by task, by stage round and by agent."""
+
+    def __init__(self, records: Iterable[HistoryRecord] = ()):
+        self._records: List[HistoryRecord] = []
+        self._by_key: Dict[Tuple[str, int, str], HistoryRecord] = {}
+        self._by_stage: Dict[Tuple[str, int], List[HistoryRecord]] = {}
+        self._by_agent: Dict[str, List[HistoryRecord]] = {}
+        self._references: Dict[VerifiedReference, VerifiedReference] = {}
+        self.max_round = 0
+        for record in records:
+            self.add(record)
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def __iter__(self) -> Iterator[HistoryRecord]:
+        return iter(self._records)
+
+    def __contains__(self, key: Tuple[str, int, str]) -> bool:
+        return key in self._by_key
+
+    def intern(self, reference: VerifiedReference) -> VerifiedReference:
+        """The shared instance of an equal reference already in this history, or this one."""
+        return self._references.setdefault(reference, reference)
+
+    def add(self, record: HistoryRecord) -> HistoryRecord:
+        if record.key in self._by_key:
+            raise ValueError(f"{record.agent} {record.stage} (round {record.round}) is already recorded")
+        record.references = tuple(self.intern(ref) for ref in record.references)
+        self._records.append(record)
+        self._by_key[record.key] = record
+        self._by_stage.setdefault((record.stage, record.round), []).append(record)
+        self._by_agent.setdefault(record.agent, []).append(record)
+        self.max_round = max(self.max_round, record.round)
+        return record
+
+    def get(self, stage: str, round_num: int, agent: str) -> Optional[HistoryRecord]:
+        return self._by_key.get((stage, round_num, agent))
+
+    def stage(self, stage: str, round_num: int = 0) -> List[HistoryRecord]:
+        """Every agent's record for a stage and round, in history order."""
+        return self._by_stage.get((stage, round_num), [])
+
+    def agent(self, name: str) -> List[HistoryRecord]:
+        return self._by_agent.get(name, [])
+
+    def sort(self, key: Callable[[HistoryRecord], object]):
+        """Reorder the history and every index by key, e.g. into stage order once concurrent tasks finish."""
+        self._records.sort(key=key)
+        for records in (*self._by_stage.values(), *self._by_agent.values()):
+            records.sort(key=key)
+
+    def to_state(self) -> dict:
+        """JSON-serializable form; each distinct reference is written once and cited by position."""
+        positions: Dict[VerifiedReference, int] = {}
+        references = []
+        records = []
+        for record in self._records:
+            cited = []
+            for ref in record.references:
+                if ref not in positions:
+                    positions[ref] = len(references)
+                    references.append(asdict(ref))
+                cited.append(positions[ref])
+            entry = {"agent": record.agent, "stage": record.stage, "round": record.round,
+                     "answer": record.answer, "references": cited, "timestamp": record.timestamp}
+            if record._raw is not None:
+                entry["raw_response"] = record._raw
+            records.append(entry)
+        return {"references": references, "records": records}
+
+    @classmethod
+    def from_state(cls, state: dict) -> "DebateHistory":
+        references = [VerifiedReference(**ref) for ref in state["references"]]
+        return cls(HistoryRecord(entry["agent"], entry["stage"], entry["round"], entry["answer"],
+                                 [references[i] for i in entry["references"]], entry["timestamp"],
+                                 entry.get("raw_response"))
+                   for entry in state["records"])
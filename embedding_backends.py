@@ -0,0 +1,80 @@
+"""
+embedding_backends.py - Configurable CPU inference for the sentence embedding model
+
+    torch       sentence-transformers on PyTorch, fp32 (the original setup)
+    torch-int8  the same model with its Linear layers dynamically quantized to int8
+    onnx        ONNX Runtime with the model's exported fp32 graph
+    onnx-int8   ONNX Runtime with the int8-quantized graph shipped in the model repo
+                (EMBEDDING_ONNX_INT8_FILE)
+
+Every backend encodes in EMBEDDING_BATCH_SIZE batches on EMBEDDING_THREADS
+threads and, with EMBEDDING_NORMALIZE, returns unit-length vectors so the
+evidence index can rank by inner product. The ONNX backends need
+sentence-transformers[onnx]; without it they fall back to torch.
+"""
+
+from typing import Tuple
+from langchain_core.embeddings import Embeddings
+from config import (
+    EMBEDDING_MODEL, EMBEDDING_BACKEND, EMBEDDING_ONNX_INT8_FILE, EMBEDDING_BATCH_SIZE, EMBEDDING_THREADS,
+    EMBEDDING_NORMALIZE
+)
+from tracing import get_logger
+
+logger = get_logger(__name__)
+
+EMBEDDING_BACKENDS = ("torch", "torch-int8", "onnx", "onnx-int8")
+
+def embedding_model_id(backend: str = EMBEDDING_BACKEND, model_name: str = EMBEDDING_MODEL,
+                       normalize: bool = EMBEDDING_NORMALIZE) -> str:
+    """Identity of the vectors a backend produces; cached vectors are only reused for the same id."""
+    return f"{model_name}:{backend}{':normalized' if normalize else ''}"
+
+def _onnx_model_kwargs(backend: str, threads: int) -> dict:
+    import onnxruntime
+    import optimum.onnxruntime  # noqa: F401  (sentence-transformers' ONNX backend runs on optimum)
+
+    options = onnxruntime.SessionOptions()
+    if threads > 0:
+        options.intra_op_num_threads = threads
+        options.inter_op_num_threads = 1
+    kwargs = {"provider": "CPUExecutionProvider", "session_options": options}
+    if backend == "onnx-int8":
+        kwargs["file_name"] = EMBEDDING_ONNX_INT8_FILE
+    return {"backend": "onnx", "model_kwargs": kwargs}
+
+def _quantize_int8(embedder):
+    import torch
+
+    # HuggingFaceEmbeddings keeps the SentenceTransformer in _client (client in older releases)
+    model = getattr(embedder, "_client", None) or getattr(embedder, "client")
+    torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+
+def load_embedder(backend: str = EMBEDDING_BACKEND, model_name: str = EMBEDDING_MODEL,
+                  batch_size: int = EMBEDDING_BATCH_SIZE, threads: int = EMBEDDING_THREADS,
+                  normalize: bool = EMBEDDING_NORMALIZE) -> Tuple[Embeddings, str]:
+    """Load the embedding model (no embedding cache); returns (embedder, backend actually used)."""
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Unknown embedding backend '{backend}', expected one of {', '.join(EMBEDDING_BACKENDS)}")
+    from langchain_huggingface import HuggingFaceEmbeddings
+
+    model_kwargs = {"device": "cpu"}
+    if backend.startswith("onnx"):
+        try:
+            model_kwargs.update(_onnx_model_kwargs(backend, threads))
+        except ImportError as e:
+            logger.warning(f"ONNX Runtime unavailable ({e}), using the torch backend")
+            backend = "torch"
+    if backend.startswith("torch") and threads > 0:
+        import torch
+        torch.set_num_threads(threads)
+
+    embedder = HuggingFaceEmbeddings(
+        model_name=model_name,
+        model_kwargs=model_kwargs,
+        encode_kwargs={"normalize_embeddings": normalize, "batch_size": batch_size},
+    )
+    if backend == "torch-int8":
+        _quantize_int8(embedder)
+    logger.debug("Embedding backend '%s' ready (batch %s, threads %s)", backend, batch_size, threads or "default")
+    return embedder, backend
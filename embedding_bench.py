@@ -0,0 +1,156 @@
+"""
+embedding_bench.py - Benchmark embedding backends and FAISS index kinds
+
+Embeds a synthetic evidence corpus with each requested backend and reports
+load time, throughput, resident memory growth and recall@k of each backend's
+nearest neighbours against the first backend (fp32 torch by default). Then
+builds flat, HNSW and IVF-PQ indexes over a clustered set of unit vectors
+and reports build time, query latency, recall@k against exact search and
+index size.
+
+    python embedding_bench.py --backends torch torch-int8 onnx onnx-int8 --texts 2000
+    python embedding_bench.py --skip-embed --vectors 300000
+
+Backends are loaded one after another in the same process, so the memory
+column is the growth each one caused; run a single backend for absolute numbers.
+"""
+
+import argparse
+import os
+import resource
+import time
+from typing import List
+import numpy as np
+import faiss
+
+TOPICS = ["interest rates", "inflation", "monsoon rainfall", "crop yields", "semiconductor exports",
+          "solar capacity", "vaccine efficacy", "court ruling", "election turnout", "river pollution"]
+FILLER = ["the report", "officials said", "according to the data", "in the last quarter", "analysts expect",
+          "a recent study", "the ministry", "compared with last year", "across several states", "experts warn"]
+
+def rss_mb() -> float:
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def synthetic_texts(n: int, seed: int = 0) -> List[str]:
+    rng = np.random.default_rng(seed)
+    texts = []
+    for _ in range(n):
+        topic = TOPICS[rng.integers(len(TOPICS))]
+        words = [FILLER[i] for i in rng.integers(len(FILLER), size=12)]
+        texts.append(f"{words[0]} {topic} {' '.join(words[1:6])} {topic} {' '.join(words[6:])} "
+                     f"({rng.integers(1990, 2025)}, {rng.integers(1, 99)}%)")
+    return texts
+
+def clustered_vectors(n: int, d: int, clusters: int = 256, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, d)).astype(np.float32)
+    vectors = centers[rng.integers(clusters, size=n)] + 0.6 * rng.standard_normal((n, d)).astype(np.float32)
+    faiss.normalize_L2(vectors)
+    return vectors
+
+def exact_neighbours(base: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    index = faiss.IndexFlatIP(base.shape[1])
+    index.add(base)
+    return index.search(queries, k)[1]
+
+def recall_at_k(found: np.ndarray, truth: np.ndarray) -> float:
+    return float(np.mean([len(set(f) & set(t)) / len(t) for f, t in zip(found, truth)]))
+
+def bench_backends(backends: List[str], texts: List[str], k: int, queries: int, batch_size: int,
+                   threads: int) -> List[dict]:
+    from embedding_backends import load_embedder
+
+    rows = []
+    baseline = None
+    for backend in backends:
+        before = rss_mb()
+        try:
+            start = time.perf_counter()
+            embedder, used = load_embedder(backend, batch_size=batch_size, threads=threads, normalize=True)
+            loaded = time.perf_counter() - start
+            embedder.embed_documents(texts[:batch_size])  # warm-up batch
+            start = time.perf_counter()
+            vectors = np.asarray(embedder.embed_documents(texts), dtype=np.float32)
+            elapsed = time.perf_counter() - start
+        except Exception as e:
+            rows.append({"backend": backend, "error": f"{type(e).__name__}: {e}"[:80]})
+            continue
+        neighbours = exact_neighbours(vectors, vectors[:queries], k)
+        if baseline is None:
+            baseline = neighbours
+        rows.append({
+            "backend": backend if used == backend else f"{backend}->{used}",
+            "load_s": loaded,
+            "texts_per_s": len(texts) / elapsed,
+            "rss_mb": rss_mb() - before,
+            "recall": recall_at_k(neighbours, baseline),
+        })
+    return rows
+
+def bench_indexes(vectors: np.ndarray, queries: np.ndarray, k: int) -> List[dict]:
+    from vector_index import INDEX_KINDS, IVFPQ_MIN_TRAIN_VECTORS, build_index, index_bytes
+
+    truth = exact_neighbours(vectors, queries, k)
+    rows = []
+    for kind in INDEX_KINDS:
+        if kind == "ivfpq" and len(vectors) < IVFPQ_MIN_TRAIN_VECTORS:
+            rows.append({"kind": kind, "error": f"needs at least {IVFPQ_MIN_TRAIN_VECTORS} vectors"})
+            continue
+        start = time.perf_counter()
+        index = build_index(vectors, faiss.METRIC_INNER_PRODUCT, kind)
+        built = time.perf_counter() - start
+        start = time.perf_counter()
+        found = np.vstack([index.search(q[None, :], k)[1] for q in queries])
+        per_query = (time.perf_counter() - start) / len(queries)
+        rows.append({
+            "kind": kind,
+            "build_s": built,
+            "query_ms": per_query * 1000,
+            "recall": recall_at_k(found, truth),
+            "mb": index_bytes(index) / 2**20,
+        })
+    return rows
+
+def main():
+    from config import EMBEDDING_BATCH_SIZE, EMBEDDING_THREADS
+
+    parser = argparse.ArgumentParser(description="Benchmark embedding backends and FAISS index kinds")
+    parser.add_argument("--backends", nargs="+", default=["torch", "torch-int8", "onnx", "onnx-int8"],
+                        help="first backend is the recall baseline")
+    parser.add_argument("--texts", type=int, default=2000, help="synthetic passages to embed")
+    parser.add_argument("--batch-size", type=int, default=EMBEDDING_BATCH_SIZE)
+    parser.add_argument("--threads", type=int, default=EMBEDDING_THREADS)
+    parser.add_argument("--vectors", type=int, default=50000, help="clustered unit vectors for the index benchmark")
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--skip-embed", action="store_true", help="only benchmark the index kinds")
+    args = parser.parse_args()
+
+    if not args.skip_embed:
+        rows = bench_backends(args.backends, synthetic_texts(args.texts), args.k,
+                              min(args.queries, args.texts), args.batch_size, args.threads)
+        print(f"{'backend':<22}{'load s':>8}{'texts/s':>10}{'+RSS MB':>9}{f'recall@{args.k}':>11}")
+        for row in rows:
+            if "error" in row:
+                print(f"{row['backend']:<22}  unavailable: {row['error']}")
+            else:
+                print(f"{row['backend']:<22}{row['load_s']:>8.2f}{row['texts_per_s']:>10.1f}"
+                      f"{row['rss_mb']:>9.0f}{row['recall']:>11.3f}")
+        print()
+
+    points = clustered_vectors(args.vectors + args.queries, args.dim)
+    vectors, queries = points[:args.vectors], points[args.vectors:]
+    print(f"{'index':<8}{'build s':>9}{'query ms':>10}{f'recall@{args.k}':>11}{'size MB':>9}   ({args.vectors} x {args.dim})")
+    for row in bench_indexes(vectors, queries, args.k):
+        if "error" in row:
+            print(f"{row['kind']:<8}  skipped: {row['error']}")
+        else:
+            print(f"{row['kind']:<8}{row['build_s']:>9.2f}{row['query_ms']:>10.3f}{row['recall']:>11.3f}{row['mb']:>9.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+"""
+embedding_cache.py - Embedding cache keyed by text hash with memory-mapped vectors
+"""
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from itertools import islice
+from typing import List
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from config import EMBEDDING_CACHE_DIR, EMBEDDING_CACHE_CAPACITY
+from tracing import get_logger
+
+logger = get_logger(__name__)
+
+VECTORS_FILE = "vectors.f32"
+SLOTS_FILE = "slots.json"
+JOURNAL_FILE = "slots.log"
+
+class CachedEmbeddings(Embeddings):
+    """Wrap an embedder so repeated document texts skip model inference.
+
+    Vectors live in a float32 memmap of fixed capacity. slots.json is a
+    snapshot mapping each text hash to its row in least-recently-used order,
+    and slots.log journals the changes made since then (stores, evictions
+    and hits), so a batch only appends its own keys. The snapshot is
+    rewritten and the journal restarted once the journal outgrows the cache.
+    The oldest rows are reused once the cache is full; evictions are
+    journaled before their rows are overwritten, so a crash in between never
+    maps a key to another text's vector.
+    """
+
+    def __init__(self, base: Embeddings, path: str = EMBEDDING_CACHE_DIR,
+                 capacity: int = EMBEDDING_CACHE_CAPACITY, model_id: str | None = None,
+                 queries_as_documents: bool = False):
+        self.base = base
+        self.path = path
+        self.capacity = capacity
+        self.model_id = model_id or getattr(base, "model_name", base.__class__.__name__)
+        # The base embeds a query exactly like a document, so query batches can use embed_documents
+        self.queries_as_documents = queries_as_documents
+        self.dim: int | None = None
+        self.slots: OrderedDict[str, int] = OrderedDict()
+        self.vectors: np.memmap | None = None
+        self.hits = 0
+        self.misses = 0
+        # Snapshot generation the journal belongs to, and how many entries it holds
+        self.generation = 0
+        self.journaled = 0
+        self._lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+        self._load()
+
+    def _load(self):
+        slots_path = os.path.join(self.path, SLOTS_FILE)
+        vectors_path = os.path.join(self.path, VECTORS_FILE)
+        if not (os.path.exists(slots_path) and os.path.exists(vectors_path)):
+            return
+        try:
+            with open(slots_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            if meta["model_id"] != self.model_id or meta["capacity"] != self.capacity:
+                logger.info("Embedding cache built for a different model or capacity, resetting")
+                return
+            self.dim = meta["dim"]
+            self.vectors = np.memmap(vectors_path, dtype=np.float32, mode="r+", shape=(self.capacity, self.dim))
+            self.slots = OrderedDict((key, slot) for key, slot in meta["slots"])
+            self.generation = meta.get("generation", 0)
+            self._replay_journal()
+            logger.debug("Loaded embedding cache: %s vectors", len(self.slots))
+        except Exception as e:
+            logger.warning(f"Failed to load embedding cache, resetting: {e}")
+            self.dim = None
+            self.vectors = None
+            self.slots = OrderedDict()
+
+    def _replay_journal(self):
+        """Apply the journal entries written since the snapshot: "+key slot", "-key" or "=key"."""
+        journal_path = os.path.join(self.path, JOURNAL_FILE)
+        if not os.path.exists(journal_path):
+            return
+        with open(journal_path, "r", encoding="utf-8") as f:
+            lines = f.read().split("\n")
+        # A journal left from an older snapshot was already folded into it
+        if lines[0] != f"#{self.generation}":
+            return
+        # The last line is empty, or torn by a crash mid-append
+        for line in lines[1:-1]:
+            op, key = line[:1], line[1:]
+            if op == "+":
+                key, slot = key.split(" ")
+                self.slots.pop(key, None)
+                self.slots[key] = int(slot)
+            elif op == "-":
+                self.slots.pop(key, None)
+            elif op == "=" and key in self.slots:
+                self.slots.move_to_end(key)
+        self.journaled = len(lines) - 2
+
+    def _open_vectors(self, dim: int):
+        self.dim = dim
+        self.vectors = np.memmap(
+            os.path.join(self.path, VECTORS_FILE), dtype=np.float32, mode="w+", shape=(self.capacity, dim)
+        )
+        self.slots = OrderedDict()
+        self._write_slots()
+
+    def _write_slots(self):
+        """Snapshot the slot map under a new generation and start an empty journal for it."""
+        self.generation += 1
+        meta = {
+            "model_id": self.model_id,
+            "capacity": self.capacity,
+            "dim": self.dim,
+            "generation": self.generation,
+            "slots": list(self.slots.items()),
+        }
+        slots_path = os.path.join(self.path, SLOTS_FILE)
+        with open(f"{slots_path}.tmp", "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(f"{slots_path}.tmp", slots_path)
+        with open(os.path.join(self.path, JOURNAL_FILE), "w", encoding="utf-8") as f:
+            f.write(f"#{self.generation}\n")
+        self.journaled = 0
+
+    def _journal(self, entries: List[str]):
+        if not entries:
+            return
+        with open(os.path.join(self.path, JOURNAL_FILE), "a", encoding="utf-8") as f:
+            f.write("".join(f"{entry}\n" for entry in entries))
+        self.journaled += len(entries)
+
+    def _key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model_id}\0{text}".encode("utf-8")).hexdigest()
+
+    def _claim_slots(self, count: int) -> List[int]:
+        """Rows for count new vectors: unused ones first, then those of the least recently used keys."""
+        fresh = []
+        if len(self.slots) < self.capacity:
+            used = set(self.slots.values())
+            fresh = list(islice((slot for slot in range(self.capacity) if slot not in used), count))
+        evicted = [self.slots.popitem(last=False) for _ in range(count - len(fresh))]
+        self._journal([f"-{key}" for key, _ in evicted])
+        return fresh + [slot for _, slot in evicted]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [self._key(text) for text in texts]
+        with self._lock:
+            found = {}
+            missing = {}
+            for key, text in zip(keys, texts):
+                if key in found or key in missing:
+                    continue
+                if key in self.slots:
+                    self.slots.move_to_end(key)
+                    found[key] = self.vectors[self.slots[key]].tolist()
+                else:
+                    missing[key] = text
+            # Repeats of a text within the batch are neither hits nor misses
+            hits = len(found)
+            self.hits += hits
+            self.misses += len(missing)
+            touched = [f"={key}" for key in found]
+
+            if missing:
+                computed = np.asarray(self.base.embed_documents(list(missing.values())), dtype=np.float32)
+                if self.vectors is None or computed.shape[1] != self.dim:
+                    self._open_vectors(computed.shape[1])
+                    touched = []
+                for key, vector in zip(missing, computed):
+                    found[key] = vector.tolist()
+                self._journal(touched)
+                # A batch larger than the cache keeps only its last capacity vectors
+                stored = list(zip(missing, computed))[-self.capacity:]
+                added = []
+                for (key, vector), slot in zip(stored, self._claim_slots(len(stored))):
+                    self.vectors[slot] = vector
+                    self.slots[key] = slot
+                    added.append(f"+{key} {slot}")
+                # Rows reach the file before the journal points at them
+                self.vectors.flush()
+                self._journal(added)
+            else:
+                self._journal(touched)
+            if self.journaled > self.capacity:
+                self._write_slots()
+        logger.debug("Embedding cache: %s hits, %s computed", hits, len(missing))
+        return [found[key] for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.base.embed_query(text)
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """Embed queries in one batch without storing them in the document cache."""
+        if hasattr(self.base, "embed_queries"):
+            return self.base.embed_queries(texts)
+        if self.queries_as_documents:
+            return self.base.embed_documents(texts)
+        return [self.base.embed_query(text) for text in texts]
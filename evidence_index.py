@@ -0,0 +1,447 @@
+"""
+evidence_index.py - Persistent, deduplicated index of evidence chunks
+
+Depending on the retrieval mode the chunks are held in a FAISS vector store
+(dense), a BM25 inverted index (lexical) or both (hybrid). Lexical mode never
+calls the embedder, so the embedding model is not loaded at all.
+
+With EMBEDDING_NORMALIZE the vectors are unit length and ranked by inner
+product; the FAISS index kind (flat, HNSW, IVF-PQ) follows the corpus size
+and is rebuilt when the corpus outgrows it (see vector_index.py).
+
+On disk, chunk texts are appended to a JSONL segment while the vectors and
+row ids are written per save generation; manifest.json names the files of
+the last complete save, so a crash mid-save leaves the previous one intact.
+
+Mutations and searches hold the index lock. EvidenceRetriever runs both on
+the single index thread (workers.py), so the event loop never waits on the
+lock while a batch is embedded, rebuilt or saved.
+"""
+
+import functools
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+import numpy as np
+import faiss
+from langchain.schema import Document
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+from langchain_community.vectorstores.utils import DistanceStrategy
+from lexical_index import BM25Index
+from vector_index import INDEX_KINDS, build_index, index_kind, refill_index, target_kind, tune, unit_vectors
+from config import (
+    EVIDENCE_INDEX_DIR, EVIDENCE_SOURCE_TTL, EVIDENCE_MAX_SOURCE_AGE, RETRIEVAL_MODE, EMBEDDING_NORMALIZE
+)
+from tracing import get_logger
+
+logger = get_logger(__name__)
+
+MANIFEST_FILE = "manifest.json"
+INDEX_FILE = "index.{generation}.faiss"
+META_FILE = "meta.{generation}.json"
+CHUNKS_FILE = "chunks.{generation}.jsonl"
+STALE_FILE_PREFIXES = ("index.", "meta.", "chunks.")
+LEGACY_INDEX_FILE = "index.faiss"
+LEGACY_META_FILE = "meta.json"
+RETRIEVAL_MODES = ("dense", "lexical", "hybrid")
+
+def chunk_hash(text: str) -> str:
+    """Content hash used as the docstore id of a chunk."""
+    return hashlib.sha256(" ".join(text.split()).encode("utf-8")).hexdigest()
+
+def _locked(method):
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+def _fsync(path: str):
+    with open(path, "rb") as f:
+        os.fsync(f.fileno())
+
+def _write_json(path: str, obj):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(obj, f)
+        f.flush()
+        os.fsync(f.fileno())
+
+def _atomic_write(path: str, writer):
+    """Write to a temporary sibling file and move it into place."""
+    tmp = f"{path}.tmp"
+    writer(tmp)
+    os.replace(tmp, path)
+
+class EvidenceIndex:
+    def __init__(self, embedder, path: str = EVIDENCE_INDEX_DIR,
+                 source_ttl: float = EVIDENCE_SOURCE_TTL, mode: str = RETRIEVAL_MODE):
+        if mode not in RETRIEVAL_MODES:
+            raise ValueError(f"Unknown retrieval mode '{mode}', expected one of {', '.join(RETRIEVAL_MODES)}")
+        self.embedder = embedder
+        self.path = path
+        self.source_ttl = source_ttl
+        self.mode = mode
+        self.dense = mode != "lexical"
+        self.normalize = EMBEDDING_NORMALIZE
+        self.metric = faiss.METRIC_INNER_PRODUCT if self.normalize else faiss.METRIC_L2
+        self.vectorstore: Optional[FAISS] = None
+        self.lexical: Optional[BM25Index] = BM25Index() if mode != "dense" else None
+        # url -> {"fetched_at": timestamp, "chunks": [chunk ids]}
+        self.sources: Dict[str, dict] = {}
+        self.version = 0
+        # directory -> generation and JSONL segment of the last save or load there
+        self._segments: Dict[str, dict] = {}
+        self.lock = threading.RLock()
+        if self.path:
+            self.load()
+
+    def __len__(self) -> int:
+        if not self.dense:
+            return len(self.lexical)
+        return self.vectorstore.index.ntotal if self.vectorstore is not None else 0
+
+    def _chunk_ids(self) -> List[str]:
+        if not self.dense:
+            return list(self.lexical.ids())
+        if self.vectorstore is None:
+            return []
+        return [self.vectorstore.index_to_docstore_id[i] for i in range(self.vectorstore.index.ntotal)]
+
+    def _distance_strategy(self) -> DistanceStrategy:
+        return DistanceStrategy.MAX_INNER_PRODUCT if self.normalize else DistanceStrategy.EUCLIDEAN_DISTANCE
+
+    def _wrap(self, index, docstore, index_to_docstore_id: Dict[int, str]) -> FAISS:
+        # Vectors are normalized here rather than by the wrapper (normalize_L2 is meant for L2 only),
+        # so embedders that do not normalize their output are ranked by cosine similarity too
+        return FAISS(self.embedder, tune(index), docstore, index_to_docstore_id,
+                     distance_strategy=self._distance_strategy())
+
+    def _rebuild(self, exclude: Iterable[str] = ()):
+        """Rebuild the FAISS index without the excluded chunks, as the kind suited to the remaining size.
+
+        Also converts an index saved with another metric (e.g. raw vectors
+        under L2) by re-normalizing its vectors. IVF-PQ vectors are rebuilt
+        from their quantized reconstructions; while the corpus stays in the
+        IVF-PQ range the trained index is refilled rather than retrained.
+        """
+        excluded = set(exclude)
+        old = self.vectorstore.index
+        rows = sorted(self.vectorstore.index_to_docstore_id.items())
+        keep = [(row, cid) for row, cid in rows if cid not in excluded]
+        vectors = old.reconstruct_n(0, old.ntotal) if old.ntotal else np.zeros((0, old.d), dtype=np.float32)
+        vectors = np.ascontiguousarray(vectors[[row for row, _ in keep]], dtype=np.float32)
+        if self.normalize and len(vectors):
+            faiss.normalize_L2(vectors)
+        removed = [cid for _, cid in rows if cid in excluded]
+        if removed:
+            self.vectorstore.docstore.delete(removed)
+        start = time.perf_counter()
+        kind = target_kind(len(keep))
+        if kind == "ivfpq" and index_kind(old) == "ivfpq" and old.metric_type == self.metric:
+            index = refill_index(old, vectors)
+        else:
+            index = build_index(vectors, self.metric, kind)
+        self.vectorstore = self._wrap(index, self.vectorstore.docstore, {i: cid for i, (_, cid) in enumerate(keep)})
+        logger.debug("Rebuilt evidence index as %s over %s vectors in %.2fs",
+                     index_kind(index), len(keep), time.perf_counter() - start)
+
+    def _document(self, chunk_id: str) -> Document:
+        if not self.dense:
+            return self.lexical.docs[chunk_id]
+        return self.vectorstore.docstore.search(chunk_id)
+
+    def _read_files(self, path: str):
+        """(meta, docs by chunk id, index file path) of the saved generation in path, or None."""
+        manifest_path = os.path.join(path, MANIFEST_FILE)
+        if not os.path.exists(manifest_path):
+            return self._read_legacy_files(path)
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        with open(os.path.join(path, manifest["meta"]), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        docs = {}
+        with open(os.path.join(path, manifest["chunks"]), "rb") as f:
+            # Bytes past chunks_bytes were appended by a save that never committed its manifest
+            lines = f.read(manifest["chunks_bytes"]).splitlines()
+        for line in lines:
+            # A chunk re-added after removal is appended again; the last record wins
+            record = json.loads(line)
+            docs[record["id"]] = Document(page_content=record["page_content"], metadata=record["metadata"])
+        self._segments[path] = {"generation": manifest["generation"], "chunks": manifest["chunks"],
+                                "bytes": manifest["chunks_bytes"], "records": len(lines),
+                                "ids": set(meta["ids"])}
+        index_path = os.path.join(path, manifest["index"]) if manifest["index"] else None
+        return meta, docs, index_path
+
+    def _read_legacy_files(self, path: str):
+        """Single meta.json holding every chunk text, as written before the manifest layout."""
+        meta_path = os.path.join(path, LEGACY_META_FILE)
+        if not os.path.exists(meta_path):
+            return None
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        docs = {
+            doc_id: Document(page_content=doc["page_content"], metadata=doc["metadata"])
+            for doc_id, doc in meta["docs"].items()
+        }
+        index_path = os.path.join(path, LEGACY_INDEX_FILE)
+        return meta, docs, index_path if os.path.exists(index_path) else None
+
+    @_locked
+    def load(self, path: Optional[str] = None):
+        """Load the index from disk (its own directory unless path is given).
+
+        Vectors are memory-mapped when possible; the BM25 index is rebuilt
+        from the stored chunks.
+        """
+        path = path or self.path
+        try:
+            files = self._read_files(path)
+            if files is None or (self.dense and files[2] is None):
+                logger.debug("No persisted evidence index, starting empty")
+                return
+            meta, docs, index_path = files
+            ids = meta["ids"]
+            docs = {doc_id: docs[doc_id] for doc_id in ids}
+            if self.dense:
+                if not meta.get("dense", True):
+                    logger.warning("Persisted evidence index was saved without vectors, starting empty")
+                    return
+                try:
+                    index = faiss.read_index(index_path, faiss.IO_FLAG_MMAP)
+                except RuntimeError:
+                    index = faiss.read_index(index_path)
+                if index.ntotal != len(ids):
+                    logger.warning(f"Evidence index and metadata disagree ({index.ntotal} vs {len(ids)}), starting empty")
+                    return
+                self.vectorstore = self._wrap(index, InMemoryDocstore(docs), dict(enumerate(ids)))
+                if index.metric_type != self.metric:
+                    logger.info("Evidence index was saved with another distance metric, converting it")
+                    self._rebuild()
+            if self.lexical is not None:
+                start = time.perf_counter()
+                self.lexical = BM25Index()
+                for doc_id in ids:
+                    self.lexical.add(doc_id, docs[doc_id])
+                logger.debug("Built BM25 index over %s chunks in %.1fms",
+                             len(ids), (time.perf_counter() - start) * 1000)
+            self.sources = meta["sources"]
+            self.version = meta.get("version", 0)
+            logger.debug("Loaded evidence index: %s chunks from %s sources", len(ids), len(self.sources))
+        except Exception as e:
+            logger.error(f"Failed to load evidence index: {e}")
+            self.vectorstore = None
+            self.lexical = BM25Index() if self.lexical is not None else None
+            self.sources = {}
+            self._segments.pop(path, None)
+            return
+        self.compact(max_age=EVIDENCE_MAX_SOURCE_AGE, only_if_expired=True)
+
+    @_locked
+    def save(self, path: Optional[str] = None, rewrite: bool = False):
+        """Persist the index to its own directory unless path is given.
+
+        Chunk texts are appended to a JSONL segment, so a save only writes the
+        chunks added since the last one; the segment is rewritten when
+        rewrite is set (compaction) or stale records outnumber live chunks.
+        The vectors and a small meta file (row ids, sources) are written under
+        a new generation number, and manifest.json, replaced last, names the
+        files and segment length that belong together.
+        """
+        path = path or self.path
+        if not path or (self.dense and self.vectorstore is None):
+            return
+        os.makedirs(path, exist_ok=True)
+        ids = self._chunk_ids()
+        previous = self._segments.get(path) or self._manifest_state(path)
+        generation = previous["generation"] + 1
+        if rewrite or previous["chunks"] is None or previous["records"] > 2 * len(ids):
+            segment = {"chunks": CHUNKS_FILE.format(generation=generation), "bytes": 0, "records": 0, "ids": set()}
+        else:
+            # Chunks removed since the last save are forgotten, so re-adding one appends it again
+            segment = {"chunks": previous["chunks"], "bytes": previous["bytes"], "records": previous["records"],
+                       "ids": previous["ids"] & set(ids)}
+
+        chunks_path = os.path.join(path, segment["chunks"])
+        with open(chunks_path, "r+b" if segment["bytes"] else "wb") as f:
+            f.truncate(segment["bytes"])
+            f.seek(segment["bytes"])
+            for doc_id in ids:
+                if doc_id not in segment["ids"]:
+                    doc = self._document(doc_id)
+                    record = {"id": doc_id, "page_content": doc.page_content, "metadata": doc.metadata}
+                    f.write((json.dumps(record) + "\n").encode("utf-8"))
+                    segment["ids"].add(doc_id)
+                    segment["records"] += 1
+            f.flush()
+            os.fsync(f.fileno())
+            segment["bytes"] = f.tell()
+
+        meta = {"version": self.version, "dense": self.dense, "ids": ids, "sources": self.sources}
+        manifest = {"generation": generation, "index": None, "meta": META_FILE.format(generation=generation),
+                    "chunks": segment["chunks"], "chunks_bytes": segment["bytes"]}
+        if self.dense:
+            manifest["index"] = INDEX_FILE.format(generation=generation)
+            faiss.write_index(self.vectorstore.index, os.path.join(path, manifest["index"]))
+            _fsync(os.path.join(path, manifest["index"]))
+        _write_json(os.path.join(path, manifest["meta"]), meta)
+        _atomic_write(os.path.join(path, MANIFEST_FILE), lambda tmp: _write_json(tmp, manifest))
+
+        live = {MANIFEST_FILE, manifest["index"], manifest["meta"], manifest["chunks"]}
+        for name in os.listdir(path):
+            if name not in live and (name.startswith(STALE_FILE_PREFIXES) or name in (LEGACY_INDEX_FILE, LEGACY_META_FILE)):
+                try:
+                    os.remove(os.path.join(path, name))
+                except OSError as e:
+                    logger.debug("Could not remove old evidence index file '%s': %s", name, e)
+        self._segments[path] = {"generation": generation, **segment}
+        logger.debug("Saved evidence index: %s chunks, generation %s", len(ids), generation)
+
+    def _manifest_state(self, path: str) -> dict:
+        """What the manifest in path says about the last save, for a directory this object has not used yet."""
+        try:
+            with open(os.path.join(path, MANIFEST_FILE), "r", encoding="utf-8") as f:
+                generation = json.load(f)["generation"]
+        except (OSError, ValueError, KeyError):
+            generation = 0
+        # Never append to a segment this object has not read: start a new one
+        return {"generation": generation, "chunks": None, "bytes": 0, "records": 0, "ids": set()}
+
+    def is_fresh(self, url: str, now: float | None = None) -> bool:
+        """Whether the source was indexed recently enough to skip re-fetching."""
+        entry = self.sources.get(url)
+        if entry is None:
+            return False
+        return (now or time.time()) - entry["fetched_at"] <= self.source_ttl
+
+    def _referenced_elsewhere(self, exclude: Iterable[str]) -> set:
+        excluded = set(exclude)
+        return {cid for url, entry in self.sources.items() if url not in excluded for cid in entry["chunks"]}
+
+    def _delete(self, chunk_ids: List[str], rebuild: bool = True):
+        """Remove chunks; HNSW and IVF-PQ indexes cannot drop vectors in place, so they are rebuilt
+        without them (or left for the caller to rebuild once when rebuild is False)."""
+        if chunk_ids and self.vectorstore is not None:
+            if index_kind(self.vectorstore.index) == "flat":
+                self.vectorstore.delete(chunk_ids)
+            elif rebuild:
+                self._rebuild(exclude=chunk_ids)
+        if self.lexical is not None:
+            for chunk_id in chunk_ids:
+                self.lexical.remove(chunk_id)
+
+    @_locked
+    def new_chunks(self, splits: List[Document]) -> Dict[str, Document]:
+        """Chunks whose content is not in the index yet, by chunk id."""
+        known = set(self._chunk_ids())
+        new_docs: Dict[str, Document] = {}
+        for doc in splits:
+            cid = chunk_hash(doc.page_content)
+            if cid not in known and cid not in new_docs:
+                new_docs[cid] = doc
+        return new_docs
+
+    @_locked
+    def add_documents(self, splits: List[Document], vectors: Optional[Dict[str, List[float]]] = None) -> int:
+        """Add split chunks, embedding only content not already in the index.
+
+        vectors may carry embeddings computed beforehand (e.g. in a worker
+        pool, outside the lock) by chunk id; chunks without one are embedded
+        here. Re-fetched sources replace their previous chunks; chunks shared
+        with other sources are kept. Returns the number of newly added chunks.
+        """
+        now = time.time()
+        by_source: Dict[str, Dict[str, Document]] = {}
+        for doc in splits:
+            source = doc.metadata.get("source", "")
+            by_source.setdefault(source, {})[chunk_hash(doc.page_content)] = doc
+        new_docs = self.new_chunks(splits)
+
+        shared = self._referenced_elsewhere(by_source)
+        obsolete = []
+        for source, chunks in by_source.items():
+            previous = set(self.sources.get(source, {}).get("chunks", []))
+            obsolete.extend(cid for cid in previous - set(chunks) if cid not in shared)
+            self.sources[source] = {"fetched_at": now, "chunks": list(chunks)}
+        # A non-flat index is rebuilt at most once per batch, after the new vectors are in
+        approximate = self.vectorstore is not None and index_kind(self.vectorstore.index) != "flat"
+        self._delete(obsolete, rebuild=not approximate)
+
+        if new_docs:
+            ids = list(new_docs)
+            docs = [new_docs[cid] for cid in ids]
+            if self.dense:
+                self._add_vectors(ids, docs, vectors or {})
+            if self.lexical is not None:
+                for cid, doc in zip(ids, docs):
+                    self.lexical.add(cid, doc)
+        if self.vectorstore is not None:
+            pending = obsolete if approximate else []
+            remaining = len(self) - len(pending)
+            if pending or INDEX_KINDS.index(target_kind(remaining)) > INDEX_KINDS.index(index_kind(self.vectorstore.index)):
+                self._rebuild(exclude=pending)
+        if new_docs or obsolete:
+            self.version += 1
+        logger.debug("Evidence index: %s new chunks %s, %s deduplicated, %s replaced",
+                     len(new_docs), "embedded" if self.dense else "indexed", len(splits) - len(new_docs), len(obsolete))
+        return len(new_docs)
+
+    def _add_vectors(self, ids: List[str], docs: List[Document], vectors: Dict[str, List[float]]):
+        missing = [i for i, cid in enumerate(ids) if cid not in vectors]
+        if missing:
+            computed = self.embedder.embed_documents([docs[i].page_content for i in missing])
+            vectors = {**vectors, **{ids[i]: vector for i, vector in zip(missing, computed)}}
+        matrix = np.array([vectors[cid] for cid in ids], dtype=np.float32)
+        if self.normalize:
+            matrix = unit_vectors(matrix)
+        text_embeddings = [(doc.page_content, vector) for doc, vector in zip(docs, matrix.tolist())]
+        metadatas = [doc.metadata for doc in docs]
+        if self.vectorstore is None:
+            self.vectorstore = FAISS.from_embeddings(text_embeddings, self.embedder, metadatas=metadatas, ids=ids,
+                                                     distance_strategy=self._distance_strategy())
+        else:
+            self.vectorstore.add_embeddings(text_embeddings, metadatas=metadatas, ids=ids)
+
+    @_locked
+    def compact(self, max_age: float | None = None, only_if_expired: bool = False) -> int:
+        """Drop expired sources and orphaned chunks, then rebuild the index densely.
+
+        Returns the number of chunks removed.
+        """
+        if self.vectorstore is None and not self.lexical:
+            return 0
+        now = time.time()
+        expired = [url for url, entry in self.sources.items()
+                   if max_age is not None and now - entry["fetched_at"] > max_age]
+        if only_if_expired and not expired:
+            return 0
+        for url in expired:
+            del self.sources[url]
+        live = {cid for entry in self.sources.values() for cid in entry["chunks"]}
+        orphans = [cid for cid in self._chunk_ids() if cid not in live]
+        self._delete(orphans, rebuild=False)
+
+        if self.vectorstore is not None:
+            # Rebuild into a fresh, fully in-memory index so the file is rewritten without holes;
+            # a flat index has already dropped the orphans, the others drop them here
+            self._rebuild(exclude=orphans)
+        self.version += 1
+        logger.debug("Compacted evidence index: removed %s chunks, %s expired sources", len(orphans), len(expired))
+        self.save(rewrite=True)
+        return len(orphans)
+
+    @_locked
+    def search_by_vectors(self, vectors: List[List[float]], k: int = 3) -> List[List[Document]]:
+        """Nearest chunks for each query vector, normalized like the indexed ones."""
+        if self.vectorstore is None:
+            return [[] for _ in vectors]
+        if self.normalize:
+            vectors = unit_vectors(vectors).tolist()
+        return [self.vectorstore.similarity_search_by_vector(vector, k=k) for vector in vectors]
+
+    def similarity_search(self, query: str, k: int = 3) -> List[Document]:
+        return self.search_by_vectors([self.embedder.embed_query(query)], k=k)[0]
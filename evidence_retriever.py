@@ -1,72 +1,270 @@
 """
 evidence_retriever.py - RAG system for evidence retrieval
+
+The retrieval mode of the evidence index (RETRIEVAL_MODE) decides how
+queries are answered: dense FAISS search over MiniLM embeddings, BM25
+lexical search without any embedding model, or both merged by
+reciprocal-rank fusion.
+
+Ingestion keeps the event loop free: splitting and embedding run in the
+worker pools and index mutations on the single index thread (workers.py).
+Async searches run on that index thread too, so a query made while a batch
+is being indexed waits there for the index lock instead of blocking the loop.
+
+DebateEngine looks up evidence for the debate question once per task, so
+its lookups are single queries: the first embeds the question and the rest
+reuse the cached query vector and the results memoized for the current index
+version. The batch methods embed several distinct queries in one forward
+pass for callers that have them.
 """
 
-from typing import List, Optional
-from langchain_huggingface import HuggingFaceEmbeddings
+import asyncio
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+from langchain_core.embeddings import Embeddings
 from langchain_community.vectorstores import FAISS
+from evidence_index import EvidenceIndex, chunk_hash
+from embedding_cache import CachedEmbeddings
+from embedding_backends import embedding_model_id, load_embedder
+from config import (
+    EMBEDDING_MODEL, EMBEDDING_BACKEND, EMBEDDING_CACHE_DIR, EMBEDDER_BACKGROUND_WARMUP, QUERY_VECTOR_CACHE_SIZE,
+    RRF_K, HYBRID_CANDIDATES_PER_K
+)
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.schema import Document
 from web_loader import SimpleWebLoader
+from utils import STARTUP_TIMER
+from workers import run_cpu
+from tracing import get_logger, span
+
+logger = get_logger(__name__)
+
+def load_default_embedder() -> Embeddings:
+    """Load the embedding model on the configured backend, wrapped in the embedding cache."""
+    try:
+        with STARTUP_TIMER.phase("import langchain_huggingface"):
+            import langchain_huggingface  # noqa: F401
+        logger.debug("Initializing %s on the '%s' backend", EMBEDDING_MODEL, EMBEDDING_BACKEND)
+        with STARTUP_TIMER.phase(f"load {EMBEDDING_MODEL.rsplit('/', 1)[-1]}"):
+            embedder, backend = load_embedder()
+        if EMBEDDING_CACHE_DIR:
+            # sentence-transformers encodes queries and documents identically, so queries can be batched
+            embedder = CachedEmbeddings(embedder, model_id=embedding_model_id(backend), queries_as_documents=True)
+        logger.debug("Embedder initialized successfully")
+        return embedder
+    except Exception as e:
+        logger.error(f"Failed to initialize embedder: {e}")
+        raise
+
+class LazyEmbeddings(Embeddings):
+    """Embeddings proxy that loads the real model on first use.
+
+    load() is thread-safe so the model can be warmed up in a worker thread
+    while the event loop keeps serving LLM calls.
+    """
+
+    def __init__(self, factory=load_default_embedder):
+        self.factory = factory
+        self._embedder: Optional[Embeddings] = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._embedder is not None
+
+    def load(self) -> Embeddings:
+        if self._embedder is None:
+            with self._lock:
+                if self._embedder is None:
+                    with span("embedder_load"):
+                        self._embedder = self.factory()
+        return self._embedder
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        embedder = self.load()
+        with span("embed", items=len(texts), bytes=sum(len(t) for t in texts)):
+            return embedder.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        embedder = self.load()
+        with span("embed_query", items=1, bytes=len(text)):
+            return embedder.embed_query(text)
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        embedder = self.load()
+        with span("embed_query", items=len(texts), bytes=sum(len(t) for t in texts)):
+            return embed_queries(embedder, texts)
+
+def embed_queries(embedder: Embeddings, texts: List[str]) -> List[List[float]]:
+    """Embed several queries, in one batched forward pass when the embedder supports it."""
+    if hasattr(embedder, "embed_queries"):
+        return embedder.embed_queries(texts)
+    return [embedder.embed_query(text) for text in texts]
+
+def reciprocal_rank_fusion(rankings: List[List[Document]], k: int, rrf_k: int = RRF_K) -> List[Document]:
+    """Merge ranked lists: each chunk scores sum(1 / (rrf_k + rank)) over the lists it appears in."""
+    scores: Dict[str, float] = {}
+    docs: Dict[str, Document] = {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking, start=1):
+            key = chunk_hash(doc.page_content)
+            docs.setdefault(key, doc)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (rrf_k + rank)
+    best = sorted(scores, key=scores.get, reverse=True)[:k]
+    return [docs[key] for key in best]
 
 class EvidenceRetriever:
-    def __init__(self):
-        try:
-            print("[DEBUG] Initializing HuggingFaceEmbeddings")
-            model_kwargs = {'device': 'cpu'}
-            encode_kwargs = {'normalize_embeddings': False}
-            self.embedder = HuggingFaceEmbeddings(
-                model_name="sentence-transformers/all-MiniLM-L6-v2",
-                model_kwargs=model_kwargs,
-                encode_kwargs=encode_kwargs
-            )
-            print("[DEBUG] Embedder initialized successfully")
-        except Exception as e:
-            print(f"[Embedding Error] Failed to initialize embedder: {e}")
-            raise
+    def __init__(self, embedder=None, index: Optional[EvidenceIndex] = None):
+        self.embedder = embedder if embedder is not None else LazyEmbeddings()
+        self._warmup: Optional[asyncio.Future] = None
         self.text_splitter = RecursiveCharacterTextSplitter(
             chunk_size=1000,
             chunk_overlap=200
         )
-        self.vectorstore: Optional[FAISS] = None
+        self.index = index if index is not None else EvidenceIndex(self.embedder)
+        self.load_stats: List[dict] = []
+        self._query_vectors: OrderedDict[str, List[float]] = OrderedDict()
+        self._results: Dict[Tuple[str, int], List[Document]] = {}
+        self._results_version = self.index.version
+    
+    @property
+    def vectorstore(self) -> Optional[FAISS]:
+        return self.index.vectorstore
+    
+    def warm_up(self) -> asyncio.Future:
+        """Start loading the embedder in a worker thread; await the result to wait for it."""
+        if self._warmup is None:
+            if self.index.dense and isinstance(self.embedder, LazyEmbeddings) and not self.embedder.loaded:
+                self._warmup = asyncio.ensure_future(asyncio.to_thread(self.embedder.load))
+            else:
+                self._warmup = asyncio.get_running_loop().create_future()
+                self._warmup.set_result(self.embedder)
+        return self._warmup
+    
+    async def ensure_embedder(self):
+        """Wait for the embedder without blocking the event loop."""
+        if EMBEDDER_BACKGROUND_WARMUP:
+            await self.warm_up()
     
     async def add_evidence(self, references: List[dict]) -> bool:
         """Add evidence from verified references to the vector store."""
+        with span("add_evidence", items=len(references)):
+            return await self._add_evidence(references)
+    
+    async def _add_evidence(self, references: List[dict]) -> bool:
         valid_urls = [ref.url for ref in references if ref.valid]
         if not valid_urls:
-            print("[DEBUG] No valid URLs for evidence")
+            logger.debug("No valid URLs for evidence")
             return False
         
+        stale_urls = [url for url in valid_urls if not self.index.is_fresh(url)]
+        if not stale_urls:
+            logger.debug("All %s evidence URLs already indexed", len(valid_urls))
+            return True
+        
         try:
-            print(f"[DEBUG] Loading {len(valid_urls)} URLs for RAG")
-            loader = SimpleWebLoader(valid_urls)
+            logger.debug("Loading %s URLs for RAG (%s already indexed)",
+                         len(stale_urls), len(valid_urls) - len(stale_urls))
+            loader = SimpleWebLoader(stale_urls)
             docs = await loader.aload()
+            self.load_stats.extend(loader.stats)
             
             if not docs:
-                print("[DEBUG] No documents loaded for RAG")
+                logger.debug("No documents loaded for RAG")
                 return False
                 
-            splits = self.text_splitter.split_documents(docs)
+            with span("split", items=len(docs), bytes=sum(len(doc.page_content) for doc in docs)) as split_span:
+                splits = await run_cpu("split", self.text_splitter.split_documents, docs)
+                split_span.set(chunks=len(splits))
             
             try:
-                print("[DEBUG] Indexing documents with FAISS")
-                if self.vectorstore is None:
-                    self.vectorstore = FAISS.from_documents(splits, self.embedder)
-                else:
-                    self.vectorstore.add_documents(splits)
-                print("[DEBUG] Documents indexed successfully")
+                vectors = None
+                new_chunks = await run_cpu("index", self.index.new_chunks, splits) if self.index.dense else {}
+                if new_chunks:
+                    await self.ensure_embedder()
+                    texts = [doc.page_content for doc in new_chunks.values()]
+                    vectors = dict(zip(new_chunks, await run_cpu("embed", self.embedder.embed_documents, texts)))
+                logger.debug("Indexing documents")
+                with span("faiss_add", items=len(splits)) as add_span:
+                    add_span.set(new_chunks=await run_cpu("index", self.index.add_documents, splits, vectors))
+                with span("index_save"):
+                    await run_cpu("index", self.index.save)
+                logger.debug("Documents indexed successfully")
                 return True
             except Exception as e:
-                print(f"[FAISS Error] Failed to index documents: {e}")
+                logger.error(f"Failed to index documents: {e}")
                 return False
         except Exception as e:
-            print(f"[RAG Error] Failed to add evidence: {e}")
+            logger.error(f"Failed to add evidence: {e}")
             return False
     
+    def _query_vectors_for(self, queries: List[str]) -> List[List[float]]:
+        """Return query vectors, embedding all uncached queries in a single batch."""
+        found: Dict[str, List[float]] = {}
+        missing = []
+        for query in dict.fromkeys(queries):
+            if query in self._query_vectors:
+                self._query_vectors.move_to_end(query)
+                found[query] = self._query_vectors[query]
+            else:
+                missing.append(query)
+        if missing:
+            for query, vector in zip(missing, embed_queries(self.embedder, missing)):
+                found[query] = vector
+                self._query_vectors[query] = vector
+            # A batch larger than the cache may evict its own vectors; they are returned from found
+            while len(self._query_vectors) > QUERY_VECTOR_CACHE_SIZE:
+                self._query_vectors.popitem(last=False)
+        return [found[query] for query in queries]
+    
+    def get_relevant_evidence_batch(self, queries: List[str], k: int = 3) -> List[List[Document]]:
+        """Retrieve relevant evidence for several queries at once.
+
+        Uncached queries are embedded together. Results are memoized per
+        (query, k) until the index changes.
+        """
+        if len(self.index) == 0:
+            logger.debug("No evidence indexed for retrieval")
+            return [[] for _ in queries]
+        if self._results_version != self.index.version:
+            self._results.clear()
+            self._results_version = self.index.version
+        
+        pending = [q for q in dict.fromkeys(queries) if (q, k) not in self._results]
+        if pending:
+            logger.debug("Retrieving evidence for %s queries (%s memoized)",
+                         len(pending), len(set(queries)) - len(pending))
+            if self.index.mode == "lexical":
+                found = self._lexical_search(pending, k)
+            elif self.index.mode == "hybrid":
+                depth = k * HYBRID_CANDIDATES_PER_K
+                found = [reciprocal_rank_fusion(pair, k) for pair in
+                         zip(self._dense_search(pending, depth), self._lexical_search(pending, depth))]
+            else:
+                found = self._dense_search(pending, k)
+            for query, docs in zip(pending, found):
+                self._results[(query, k)] = docs
+        return [self._results[(q, k)] for q in queries]
+    
+    def _dense_search(self, queries: List[str], k: int) -> List[List[Document]]:
+        if self.vectorstore is None:
+            return [[] for _ in queries]
+        vectors = self._query_vectors_for(queries)
+        with span("faiss_search", items=len(queries), k=k):
+            return self.index.search_by_vectors(vectors, k=k)
+    
+    def _lexical_search(self, queries: List[str], k: int) -> List[List[Document]]:
+        with span("bm25_search", items=len(queries), k=k), self.index.lock:
+            return [[doc for doc, _ in self.index.lexical.search(query, k)] for query in queries]
+    
     def get_relevant_evidence(self, query: str, k: int = 3) -> List[Document]:
         """Retrieve relevant evidence for a query."""
-        if self.vectorstore is None:
-            print("[DEBUG] No vectorstore available for evidence retrieval")
-            return []
-        print(f"[DEBUG] Retrieving evidence for query: {query[:50]}...")
-        return self.vectorstore.similarity_search(query, k=k)
\ No newline at end of file
+        return self.get_relevant_evidence_batch([query], k=k)[0]
+    
+    async def aget_relevant_evidence_batch(self, queries: List[str], k: int = 3) -> List[List[Document]]:
+        """get_relevant_evidence_batch() on the index thread, queued behind any pending index writes."""
+        return await run_cpu("index", self.get_relevant_evidence_batch, queries, k)
+    
+    async def aget_relevant_evidence(self, query: str, k: int = 3) -> List[Document]:
+        return (await self.aget_relevant_evidence_batch([query], k=k))[0]
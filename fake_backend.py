@@ -0,0 +1,230 @@
+"""
+fake_backend.py - Local stand-in for Gemini, OpenRouter and reference pages
+
+Serves the Gemini generateContent and OpenRouter chat-completions formats plus
+fake reference pages, with configurable latency, error rate and 429 responses,
+so the debate engine can be exercised without network access.
+
+Run standalone:  python fake_backend.py --port 8900 --llm-latency 0.8
+Then point the engine at it:
+    GEMINI_API_BASE=http://127.0.0.1:8900
+    DEEPSEEK_URL=http://127.0.0.1:8900/api/v1/chat/completions
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import random
+from dataclasses import dataclass
+from aiohttp import web
+
+PAGE_PARAGRAPH = (
+    "Official statistics show steady growth in infrastructure spending, with independent "
+    "audits reporting measurable gains in employment, inflation control and public services. "
+)
+
+@dataclass
+class LatencyProfile:
+    distribution: str = "lognormal"  # fixed, uniform, exponential or lognormal
+    mean: float = 0.5
+    sigma: float = 0.5
+
+    def sample(self, rng: random.Random) -> float:
+        """Draw one delay in seconds."""
+        if self.mean <= 0:
+            return 0.0
+        if self.distribution == "fixed":
+            return self.mean
+        if self.distribution == "uniform":
+            return rng.uniform(0, 2 * self.mean)
+        if self.distribution == "exponential":
+            return rng.expovariate(1 / self.mean)
+        # lognormal parameterised so that its mean equals self.mean
+        mu = math.log(self.mean) - self.sigma ** 2 / 2
+        return rng.lognormvariate(mu, self.sigma)
+
+@dataclass
+class FakeBackendConfig:
+    llm_latency: LatencyProfile
+    page_latency: LatencyProfile
+    error_rate: float = 0.0
+    rate_limit_rate: float = 0.0
+    retry_after: int = 1
+    refs_per_answer: int = 3
+    page_paragraphs: int = 40
+    token_interval: float = 0.005
+    seed: int | None = None
+
+class FakeBackend:
+    def __init__(self, config: FakeBackendConfig):
+        self.config = config
+        self.rng = random.Random(config.seed)
+        self.counters = {"gemini": 0, "openrouter": 0, "pages": 0, "errors": 0, "rate_limited": 0}
+
+    def _fault(self) -> web.Response | None:
+        """Return an injected 429 or 5xx response, or None for a normal reply."""
+        roll = self.rng.random()
+        if roll < self.config.rate_limit_rate:
+            self.counters["rate_limited"] += 1
+            return web.json_response(
+                {"error": {"code": 429, "message": "Resource has been exhausted"}},
+                status=429,
+                headers={"Retry-After": str(self.config.retry_after)}
+            )
+        if roll < self.config.rate_limit_rate + self.config.error_rate:
+            self.counters["errors"] += 1
+            return web.json_response(
+                {"error": {"code": 503, "message": "The model is overloaded"}},
+                status=503
+            )
+        return None
+
+    def _answer_text(self, request: web.Request, prompt: str) -> str:
+        """Build a debate-style answer that ends with the JSON block agents expect."""
+        if '"final_answer"' in prompt:
+            key = "final_answer"
+        elif '"critique"' in prompt:
+            key = "critique"
+        else:
+            key = "answer"
+        base = f"{request.scheme}://{request.host}"
+        refs = [f"{base}/pages/{self.rng.randrange(1000)}" for _ in range(self.config.refs_per_answer)]
+        body = " ".join(PAGE_PARAGRAPH for _ in range(3)).strip()
+        block = json.dumps({key: body, "references": refs})
+        return f"Here is my position on the question.\n\n{body}\n\n{block}"
+
+    async def gemini_generate(self, request: web.Request) -> web.Response:
+        self.counters["gemini"] += 1
+        payload = await request.json()
+        await asyncio.sleep(self.config.llm_latency.sample(self.rng))
+        fault = self._fault()
+        if fault is not None:
+            return fault
+        prompt = " ".join(
+            part.get("text", "") for content in payload.get("contents", []) for part in content.get("parts", [])
+        )
+        text = self._answer_text(request, prompt)
+        return web.json_response({
+            "candidates": [{"content": {"parts": [{"text": text}], "role": "model"}, "finishReason": "STOP"}],
+            "usageMetadata": {"promptTokenCount": len(prompt) // 4, "candidatesTokenCount": len(text) // 4}
+        })
+
+    async def _stream_sse(self, request: web.Request, text: str, event_for) -> web.StreamResponse:
+        """Send text as server-sent events in small deltas, spaced by token_interval."""
+        resp = web.StreamResponse(headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"})
+        await resp.prepare(request)
+        for i in range(0, len(text), 16):
+            await resp.write(f"data: {json.dumps(event_for(text[i:i + 16]))}\n\n".encode("utf-8"))
+            await asyncio.sleep(self.config.token_interval)
+        return resp
+
+    async def gemini_stream(self, request: web.Request) -> web.StreamResponse:
+        self.counters["gemini"] += 1
+        payload = await request.json()
+        await asyncio.sleep(self.config.llm_latency.sample(self.rng))
+        fault = self._fault()
+        if fault is not None:
+            return fault
+        prompt = " ".join(
+            part.get("text", "") for content in payload.get("contents", []) for part in content.get("parts", [])
+        )
+        text = self._answer_text(request, prompt)
+        return await self._stream_sse(
+            request, text,
+            lambda delta: {"candidates": [{"content": {"parts": [{"text": delta}], "role": "model"}}]}
+        )
+
+    async def openrouter_chat(self, request: web.Request) -> web.StreamResponse:
+        self.counters["openrouter"] += 1
+        payload = await request.json()
+        await asyncio.sleep(self.config.llm_latency.sample(self.rng))
+        fault = self._fault()
+        if fault is not None:
+            return fault
+        prompt = " ".join(str(m.get("content", "")) for m in payload.get("messages", []))
+        text = self._answer_text(request, prompt)
+        if payload.get("stream"):
+            resp = await self._stream_sse(
+                request, text,
+                lambda delta: {"choices": [{"index": 0, "delta": {"content": delta}}]}
+            )
+            await resp.write(b"data: [DONE]\n\n")
+            return resp
+        return web.json_response({
+            "id": f"fake-{self.counters['openrouter']}",
+            "model": payload.get("model", ""),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(text) // 4}
+        })
+
+    async def page(self, request: web.Request) -> web.Response:
+        self.counters["pages"] += 1
+        await asyncio.sleep(self.config.page_latency.sample(self.rng))
+        page_id = request.match_info["page_id"]
+        paragraphs = "".join(f"<p>{PAGE_PARAGRAPH} (page {page_id}, section {i})</p>" for i in range(self.config.page_paragraphs))
+        html = (
+            f"<html><head><title>Reference {page_id}</title><script>var x = 1;</script></head>"
+            f"<body><nav>Home | About | Contact</nav><main><h1>Report {page_id}</h1>{paragraphs}</main>"
+            f"<footer>Copyright fake backend</footer></body></html>"
+        )
+        return web.Response(text=html, content_type="text/html")
+
+    async def stats(self, request: web.Request) -> web.Response:
+        return web.json_response(self.counters)
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.add_routes([
+            web.post("/v1beta/models/{model}:generateContent", self.gemini_generate),
+            web.post("/v1beta/models/{model}:streamGenerateContent", self.gemini_stream),
+            web.post("/api/v1/chat/completions", self.openrouter_chat),
+            web.route("*", "/pages/{page_id}", self.page),
+            web.get("/stats", self.stats),
+        ])
+        return app
+
+async def start_fake_backend(config: FakeBackendConfig, host: str = "127.0.0.1", port: int = 0) -> tuple[web.AppRunner, str, FakeBackend]:
+    """Start the fake backend on the running loop; returns (runner, base_url, backend)."""
+    backend = FakeBackend(config)
+    runner = web.AppRunner(backend.app())
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    bound_port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://{host}:{bound_port}", backend
+
+def add_backend_arguments(parser: argparse.ArgumentParser):
+    """Register the fake-backend knobs on an argument parser."""
+    parser.add_argument("--llm-latency", type=float, default=0.8, help="mean LLM latency in seconds")
+    parser.add_argument("--page-latency", type=float, default=0.1, help="mean page latency in seconds")
+    parser.add_argument("--latency-dist", default="lognormal", choices=["fixed", "uniform", "exponential", "lognormal"])
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="lognormal sigma")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of LLM calls answered with 503")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="fraction of LLM calls answered with 429")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After seconds sent with 429")
+    parser.add_argument("--token-interval", type=float, default=0.005, help="delay between streamed deltas in seconds")
+    parser.add_argument("--seed", type=int, default=None)
+
+def backend_config_from_args(args: argparse.Namespace) -> FakeBackendConfig:
+    return FakeBackendConfig(
+        llm_latency=LatencyProfile(args.latency_dist, args.llm_latency, args.latency_sigma),
+        page_latency=LatencyProfile(args.latency_dist, args.page_latency, args.latency_sigma),
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        retry_after=args.retry_after,
+        token_interval=args.token_interval,
+        seed=args.seed
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Gemini/OpenRouter/web backend for offline load tests")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    add_backend_arguments(parser)
+    args = parser.parse_args()
+    backend = FakeBackend(backend_config_from_args(args))
+    web.run_app(backend.app(), host=args.host, port=args.port)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+"""
+html_extract.py - Main-content text extraction for evidence pages
+
+Drops scripts, styles, navigation, headers, footers, cookie banners and similar
+boilerplate, picks the element holding the page's main content (<main>,
+<article> or the densest block of paragraphs), keeps paragraph breaks,
+normalizes whitespace and caps the result at LOADER_MAX_TEXT_CHARS.
+
+lxml is used when it is installed; otherwise BeautifulSoup's html.parser does
+the same job more slowly.
+"""
+
+import re
+import time
+from typing import Dict, Tuple
+from config import LOADER_MAX_TEXT_CHARS
+
+try:
+    import lxml.html
+    from lxml import etree
+    HTML_BACKEND = "lxml"
+    _PARSE_ERRORS = (ValueError, LookupError, etree.ParserError)
+except ImportError:
+    from bs4 import BeautifulSoup, Comment
+    HTML_BACKEND = "html.parser"
+    _PARSE_ERRORS = (ValueError, LookupError)
+
+BOILERPLATE_TAGS = (
+    "script", "style", "noscript", "template", "svg", "canvas", "iframe", "object", "embed",
+    "form", "button", "select", "input", "nav", "header", "footer", "aside", "menu", "dialog",
+)
+BOILERPLATE_ROLES = {"navigation", "banner", "contentinfo", "complementary", "search", "dialog", "alert"}
+BOILERPLATE_HINT = re.compile(
+    r"cookie|consent|gdpr|banner|navbar|\bnav\b|menu|breadcrumb|footer|masthead|sidebar|"
+    r"share|social|subscribe|newsletter|advert|\bads?\b|promo|sponsor|related|recommend|"
+    r"comment|popup|modal|overlay|skip-link|signup|login",
+    re.IGNORECASE,
+)
+# A class/id that also looks like content (e.g. "content has-sidebar") is kept
+CONTENT_HINT = re.compile(r"content|article|main|body|post|entry|story|text", re.IGNORECASE)
+# Never dropped on a class/id hint: stripping these would lose the page itself
+PROTECTED_TAGS = {"html", "body", "main", "article"}
+BLOCK_TAGS = frozenset({
+    "p", "div", "section", "article", "main", "li", "ul", "ol", "dl", "dt", "dd", "table", "tr",
+    "td", "th", "pre", "blockquote", "br", "hr", "h1", "h2", "h3", "h4", "h5", "h6", "figcaption",
+})
+PARAGRAPH_TAGS = ("p", "pre", "blockquote", "li", "td")
+MIN_MAIN_CHARS = 200  # a main-content candidate shorter than this falls back to the whole body
+
+_SPACES = re.compile(r"[ \t\f\v\r\u00a0\u200b]+")
+_BLANK_LINES = re.compile(r"\n{3,}")
+
+# lxml refuses str input that still carries an XML encoding declaration
+_XML_DECLARATION = re.compile(r"^\s*<\?xml[^>]*\?>")
+
+def decode_body(body: bytes, encoding: str) -> str:
+    """Decode with Python's codecs, falling back to UTF-8 for a charset label Python does not know."""
+    try:
+        return body.decode(encoding, errors="replace")
+    except LookupError:
+        return body.decode("utf-8", errors="replace")
+
+def normalize_whitespace(text: str) -> str:
+    """Collapse runs of spaces, strip each line and keep at most one blank line between paragraphs."""
+    lines = [_SPACES.sub(" ", line).strip() for line in text.split("\n")]
+    return _BLANK_LINES.sub("\n\n", "\n".join(lines)).strip()
+
+def cap_text(text: str, max_chars: int) -> Tuple[str, bool]:
+    """Cut text to max_chars at a paragraph or word boundary; returns (text, truncated)."""
+    if max_chars <= 0 or len(text) <= max_chars:
+        return text, False
+    cut = text[:max_chars]
+    boundary = max(cut.rfind("\n"), cut.rfind(" "))
+    if boundary > max_chars // 2:
+        cut = cut[:boundary]
+    return cut.rstrip(), True
+
+def _attr_text(value) -> str:
+    # BeautifulSoup gives multi-valued attributes such as class as lists
+    return " ".join(value) if isinstance(value, list) else (value or "")
+
+def _is_boilerplate(tag: str, attrs) -> bool:
+    if tag in BOILERPLATE_TAGS:
+        return True
+    if tag in PROTECTED_TAGS:
+        return False
+    if attrs.get("hidden") is not None or attrs.get("aria-hidden") == "true":
+        return True
+    if (attrs.get("role") or "").lower() in BOILERPLATE_ROLES:
+        return True
+    hint = f"{_attr_text(attrs.get('id'))} {_attr_text(attrs.get('class'))}".strip()
+    return bool(hint) and BOILERPLATE_HINT.search(hint) is not None and CONTENT_HINT.search(hint) is None
+
+# lxml backend
+
+def _lxml_main(body):
+    """The <main>/<article> element or, failing that, the block with the most paragraph text."""
+    for path in ("//main", "//*[@role='main']", "//article"):
+        found = body.xpath(path)
+        if found:
+            best = max(found, key=lambda el: len(el.text_content()))
+            if len(best.text_content()) >= MIN_MAIN_CHARS:
+                return best
+    scores: Dict = {}
+    for para in body.iter(*PARAGRAPH_TAGS):
+        length = len(para.text_content())
+        if length < 25:
+            continue
+        parent = para.getparent()
+        if parent is None:
+            continue
+        scores[parent] = scores.get(parent, 0) + length
+        grandparent = parent.getparent()
+        if grandparent is not None:
+            scores[grandparent] = scores.get(grandparent, 0) + length / 2
+    if scores:
+        best = max(scores, key=scores.get)
+        if scores[best] >= MIN_MAIN_CHARS:
+            return best
+    return body
+
+def _lxml_text(root) -> str:
+    parts = []
+    for event, node in etree.iterwalk(root, events=("start", "end")):
+        block = node.tag in BLOCK_TAGS
+        if event == "start":
+            if block:
+                parts.append("\n")
+            if node.text:
+                parts.append(node.text)
+        else:
+            if block:
+                parts.append("\n")
+            if node is not root and node.tail:
+                parts.append(node.tail)
+    return "".join(parts)
+
+def _extract_lxml(html: bytes, encoding: str) -> str:
+    # Decoded here rather than by libxml2, which rejects labels such as "latin-1"
+    parser = lxml.html.HTMLParser(remove_comments=True, remove_pis=True)
+    text = _XML_DECLARATION.sub("", decode_body(html, encoding), count=1)
+    root = lxml.html.document_fromstring(text, parser=parser)
+    # Boilerplate is collected first and dropped after, so the walk never sees a mutated tree
+    doomed = [el for el in root.iter() if isinstance(el.tag, str) and _is_boilerplate(el.tag, el.attrib)]
+    for el in doomed:
+        if el.getparent() is not None:
+            el.drop_tree()
+    body = root.find("body")
+    return _lxml_text(_lxml_main(body if body is not None else root))
+
+# BeautifulSoup fallback
+
+def _extract_soup(html: bytes, encoding: str) -> str:
+    soup = BeautifulSoup(decode_body(html, encoding), "html.parser")
+    for comment in soup.find_all(string=lambda s: isinstance(s, Comment)):
+        comment.extract()
+    for el in [el for el in soup.find_all(True) if _is_boilerplate(el.name, el.attrs)]:
+        if not el.decomposed:
+            el.decompose()
+    main = None
+    for found in (soup.find_all("main"), soup.find_all(attrs={"role": "main"}), soup.find_all("article")):
+        if found:
+            best = max(found, key=lambda el: len(el.get_text()))
+            if len(best.get_text()) >= MIN_MAIN_CHARS:
+                main = best
+                break
+    root = main or soup.body or soup
+    for el in root.find_all(list(BLOCK_TAGS)):
+        el.insert_before("\n")
+        el.insert_after("\n")
+    return root.get_text()
+
+def extract_text(body: bytes, encoding: str = "utf-8", content_type: str = "text/html",
+                 max_chars: int = LOADER_MAX_TEXT_CHARS) -> Tuple[str, dict]:
+    """Extract the readable main text of a page; returns (text, stats).
+
+    stats has the backend, raw and extracted sizes, whether the cap was hit and
+    the extraction time in seconds.
+    """
+    start = time.perf_counter()
+    if content_type == "text/plain":
+        raw = decode_body(body, encoding)
+        backend = "plain"
+    else:
+        backend = HTML_BACKEND
+        try:
+            raw = _extract_lxml(body, encoding) if backend == "lxml" else _extract_soup(body, encoding)
+        except _PARSE_ERRORS:
+            # Empty or undecodable documents
+            raw = ""
+    text, truncated = cap_text(normalize_whitespace(raw), max_chars)
+    return text, {
+        "backend": backend,
+        "bytes": len(body),
+        "chars": len(text),
+        "truncated_text": truncated,
+        "extract_seconds": time.perf_counter() - start,
+    }
@@ -0,0 +1,86 @@
+"""
+json_parse_bench.py - Microbenchmark for safe_json_parse on large model responses
+
+Compares the old greedy-regex parser with the balanced-brace scanner on long
+answers whose JSON block is followed by prose, by a stray example object, or
+wrapped in a provider envelope, and reports the cost of a memoized re-parse.
+
+    python json_parse_bench.py --sizes 10000 100000 1000000 --repeat 20
+"""
+
+import argparse
+import json
+import re
+import statistics
+import time
+from typing import Callable, Dict, List
+
+def legacy_parse(s: str, stage: str) -> dict | None:
+    """The previous implementation: first '{' to last '}', then one json.loads."""
+    match = re.search(r'\{[\s\S]*\}', s)
+    if not match:
+        return None
+    try:
+        parsed = json.loads(match.group(0))
+    except json.JSONDecodeError:
+        return None
+    if not isinstance(parsed, dict):
+        return None
+    required = {"answer"} if stage in ["initial_suggestion", "refinement"] else {"critique"} if stage == "critique" else {"final_answer"}
+    return parsed if required.issubset(parsed.keys()) else None
+
+def build_cases(size: int) -> Dict[str, tuple]:
+    prose = ("The policy shifted {in practice} after 2014; see the annex for details. " * (size // 70 + 1))[:size]
+    block = json.dumps({"answer": prose[:size // 4], "references": ["https://www.rbi.org.in", "https://www.mea.gov.in"]})
+    envelope = json.dumps({"candidates": [{"content": {"parts": [{"text": prose + "\n" + block}]}}]})
+    plain = prose.replace("{", "(").replace("}", ")")
+    return {
+        "plain_prose_block": (plain + "\n" + json.dumps({"answer": plain[:size // 4], "references": []}), "response"),
+        "trailing_block": (prose + "\n" + block, "response"),
+        "prose_after_block": (prose + "\n" + block + "\nHope this helps {cheers}.", "response"),
+        "example_after_block": (prose + "\n" + block + '\nFormat: {"note": "example"}', "response"),
+        "gemini_envelope": (envelope, "gemini_response"),
+    }
+
+def time_calls(func: Callable[[], object], repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+def run(sizes: List[int], repeat: int) -> List[dict]:
+    from utils import _parse_cached, safe_json_parse
+
+    rows = []
+    for size in sizes:
+        for name, (text, stage) in build_cases(size).items():
+            legacy_stage = "initial_suggestion" if stage == "response" else stage
+            _parse_cached.cache_clear()
+            found = safe_json_parse(text, stage) is not None
+            rows.append({
+                "case": name,
+                "bytes": len(text),
+                "legacy_ms": time_calls(lambda: legacy_parse(text, legacy_stage), repeat) * 1000,
+                "legacy_found": legacy_parse(text, legacy_stage) is not None,
+                "scanner_ms": time_calls(lambda: (_parse_cached.cache_clear(), safe_json_parse(text, stage)), repeat) * 1000,
+                "scanner_found": found,
+                "cached_us": time_calls(lambda: safe_json_parse(text, stage), repeat) * 1e6,
+            })
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark JSON block extraction on large responses")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000], help="prose length in characters")
+    parser.add_argument("--repeat", type=int, default=20, help="timed runs per case (median reported)")
+    args = parser.parse_args()
+
+    rows = run(args.sizes, max(1, args.repeat))
+    print(f"{'case':<22}{'bytes':>10}{'legacy ms':>12}{'found':>7}{'scanner ms':>12}{'found':>7}{'cached us':>11}")
+    for row in rows:
+        print(f"{row['case']:<22}{row['bytes']:>10}{row['legacy_ms']:>12.3f}{str(row['legacy_found']):>7}"
+              f"{row['scanner_ms']:>12.3f}{str(row['scanner_found']):>7}{row['cached_us']:>11.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+lexical_index.py - Incremental BM25 inverted index over evidence chunks
+
+Needs no embedding model: chunks are tokenized into lowercase words, stop
+words are dropped and each term keeps a postings map of chunk slot -> term
+frequency. Chunks are added and removed one at a time as EvidenceIndex
+changes, so the index never has to be rebuilt, and rebuilding it from a
+persisted docstore takes milliseconds.
+"""
+
+import heapq
+import math
+import re
+from collections import Counter
+from typing import Dict, Iterable, List, Tuple
+from langchain.schema import Document
+from config import BM25_K1, BM25_B
+
+_TOKEN = re.compile(r"[^\W_]+", re.UNICODE)
+STOP_WORDS = frozenset("""
+a an and are as at be been but by can could did do does for from had has have he her his how i if in into is it
+its may more most no not of on or our she should so such than that the their them then there these they this
+those to was we were what when where which while who why will with would you your
+""".split())
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in _TOKEN.findall(text.lower()) if t not in STOP_WORDS and len(t) > 1]
+
+class BM25Index:
+    def __init__(self, k1: float = BM25_K1, b: float = BM25_B):
+        self.k1 = k1
+        self.b = b
+        self.docs: Dict[str, Document] = {}      # chunk id -> document
+        self.slots: Dict[str, int] = {}          # chunk id -> integer slot used in postings
+        self.slot_ids: Dict[int, str] = {}
+        self.lengths: Dict[int, int] = {}
+        self.postings: Dict[str, Dict[int, int]] = {}
+        self.total_length = 0
+        self._next_slot = 0
+
+    def __len__(self) -> int:
+        return len(self.docs)
+
+    def __contains__(self, chunk_id: str) -> bool:
+        return chunk_id in self.docs
+
+    def ids(self) -> Iterable[str]:
+        return self.docs.keys()
+
+    def add(self, chunk_id: str, doc: Document):
+        if chunk_id in self.docs:
+            return
+        slot = self._next_slot
+        self._next_slot += 1
+        terms = Counter(tokenize(doc.page_content))
+        postings = self.postings
+        for term, tf in terms.items():
+            entry = postings.get(term)
+            if entry is None:
+                postings[term] = {slot: tf}
+            else:
+                entry[slot] = tf
+        length = sum(terms.values())
+        self.docs[chunk_id] = doc
+        self.slots[chunk_id] = slot
+        self.slot_ids[slot] = chunk_id
+        self.lengths[slot] = length
+        self.total_length += length
+
+    def remove(self, chunk_id: str):
+        doc = self.docs.pop(chunk_id, None)
+        if doc is None:
+            return
+        slot = self.slots.pop(chunk_id)
+        del self.slot_ids[slot]
+        self.total_length -= self.lengths.pop(slot)
+        # Re-tokenizing the stored text is cheaper than keeping every chunk's term list
+        for term in set(tokenize(doc.page_content)):
+            postings = self.postings.get(term)
+            if postings is not None:
+                postings.pop(slot, None)
+                if not postings:
+                    del self.postings[term]
+
+    def search(self, query: str, k: int = 3) -> List[Tuple[Document, float]]:
+        """Top-k chunks by BM25 score as (document, score), best first."""
+        if not self.docs:
+            return []
+        n = len(self.docs)
+        avg_length = self.total_length / n or 1.0
+        scores: Dict[int, float] = {}
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for slot, tf in postings.items():
+                norm = self.k1 * (1 - self.b + self.b * self.lengths[slot] / avg_length)
+                scores[slot] = scores.get(slot, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+        best = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+        return [(self.docs[self.slot_ids[slot]], score) for slot, score in best]
@@ -0,0 +1,112 @@
+"""
+llm_cache.py - Content-addressed cache of LLM responses with record/replay modes
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import List, Tuple
+from config import LLM_CACHE_MODE, LLM_CACHE_PATH, LLM_CACHE_MAX_BYTES
+from tracing import get_logger
+
+logger = get_logger(__name__)
+
+# off: never touch the cache; live: serve hits, call the provider on a miss and store;
+# record: always call the provider and overwrite; replay: serve hits only, never call out
+CACHE_MODES = ("off", "live", "record", "replay")
+
+def make_cache_key(provider: str, model: str, params: dict, prompt: str) -> str:
+    """Hash everything that determines a provider's response."""
+    material = json.dumps(
+        {
+            "provider": provider,
+            "model": model,
+            "params": params,
+            "prompt": hashlib.sha256(prompt.encode("utf-8")).hexdigest(),
+        },
+        sort_keys=True
+    )
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+class LLMResponseCache:
+    def __init__(self, path: str = LLM_CACHE_PATH, max_bytes: int = LLM_CACHE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS llm_cache (
+                key TEXT PRIMARY KEY,
+                provider TEXT NOT NULL,
+                answer TEXT NOT NULL,
+                refs TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_lru ON llm_cache (last_access)")
+        self._conn.commit()
+
+    def get(self, key: str) -> Tuple[str, List[str]] | None:
+        """Return the cached (answer, references) for a key, or None."""
+        with self._lock:
+            row = self._conn.execute("SELECT answer, refs FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("UPDATE llm_cache SET last_access = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+        return (row[0], json.loads(row[1]))
+
+    def put(self, key: str, provider: str, answer: str, refs: List[str]):
+        """Store a response and evict least recently used entries over the size limit."""
+        refs_json = json.dumps(refs)
+        size = len(answer.encode("utf-8")) + len(refs_json)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                """INSERT OR REPLACE INTO llm_cache
+                   (key, provider, answer, refs, size, created_at, last_access)
+                   VALUES (?, ?, ?, ?, ?, ?, ?)""",
+                (key, provider, answer, refs_json, size, now, now)
+            )
+            total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM llm_cache").fetchone()[0]
+            if total > self.max_bytes:
+                excess = total - self.max_bytes
+                victims = []
+                for victim_key, victim_size in self._conn.execute(
+                    "SELECT key, size FROM llm_cache ORDER BY last_access ASC"
+                ):
+                    if excess <= 0:
+                        break
+                    victims.append((victim_key,))
+                    excess -= victim_size
+                self._conn.executemany("DELETE FROM llm_cache WHERE key = ?", victims)
+            self._conn.commit()
+
+    def close(self):
+        """Close the underlying database connection."""
+        with self._lock:
+            self._conn.close()
+
+_default_cache: LLMResponseCache | None = None
+
+def get_llm_cache() -> LLMResponseCache | None:
+    """Return the process-wide response cache, or None when caching is off."""
+    global _default_cache
+    if LLM_CACHE_MODE == "off" or not LLM_CACHE_PATH:
+        return None
+    if _default_cache is None:
+        try:
+            _default_cache = LLMResponseCache()
+        except sqlite3.Error as e:
+            logger.warning(f"LLM response cache unavailable: {e}")
+            return None
+    return _default_cache
@@ -3,81 +3,251 @@ llm_calls.py - Functions for calling Gemini and DeepSeek APIs
 """
 
 import asyncio
+import ssl
 import aiohttp
 import requests
 import certifi
 import re
 import json
-from typing import Tuple, List
-from config import GEMINI_URL, DEEPSEEK_URL, DEEPSEEK_MODEL, LLM_TIMEOUT, DEEPSEEK_API_KEY
-from utils import safe_json_parse, urlparse
+from typing import AsyncIterator, Callable, Optional, Tuple, List
+from config import (
+    GEMINI_URL, GEMINI_STREAM_URL, GEMINI_MODEL, DEEPSEEK_URL, DEEPSEEK_MODEL, LLM_TIMEOUT, DEEPSEEK_API_KEY,
+    LLM_MAX_CONNECTIONS, LLM_MAX_CONNECTIONS_PER_HOST, LLM_KEEPALIVE_TIMEOUT, LLM_CACHE_MODE, LLM_STREAMING,
+    GEMINI_API_KEY, GEMINI_REQUESTS_PER_MINUTE, DEEPSEEK_REQUESTS_PER_MINUTE
+)
+from utils import safe_json_parse, urlparse, IncrementalJSONScanner
+from llm_cache import CACHE_MODES, get_llm_cache, make_cache_key
+from provider_resilience import ProviderHTTPError, ProviderUnavailable, get_provider_guard, parse_retry_after
+from tracing import get_logger
 
-async def call_gemini_async(prompt: str) -> Tuple[str, List[str]]:
-    print("[DEBUG] Calling Gemini API")
+logger = get_logger(__name__)
+
+GEMINI_GENERATION_CONFIG = {"temperature": 0.2, "topP": 0.9, "maxOutputTokens": 2048}
+DEEPSEEK_GENERATION_PARAMS = {"temperature": 0.2, "max_tokens": 2048}
+
+ERROR_RESPONSE = re.compile(r"^\[(Gemini|DeepSeek) Replay Miss\]")
+
+if LLM_CACHE_MODE not in CACHE_MODES:
+    raise ValueError(f"LLM_CACHE_MODE must be one of {CACHE_MODES}, got {LLM_CACHE_MODE!r}")
+
+class ProviderClient:
+    """Long-lived keep-alive HTTP session for one LLM provider."""
+
+    def __init__(self, name: str, limit: int = LLM_MAX_CONNECTIONS,
+                 limit_per_host: int = LLM_MAX_CONNECTIONS_PER_HOST):
+        self.name = name
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self._session: aiohttp.ClientSession | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    def session(self) -> aiohttp.ClientSession:
+        """Return the pooled session, creating it on first use in the running loop."""
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._loop is not loop:
+            logger.debug("Opening %s session pool (limit=%s, per_host=%s)",
+                         self.name, self.limit, self.limit_per_host)
+            connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                keepalive_timeout=LLM_KEEPALIVE_TIMEOUT,
+                ssl=ssl.create_default_context(cafile=certifi.where())
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=LLM_TIMEOUT)
+            )
+            self._loop = loop
+        return self._session
+
+    async def close(self):
+        """Close the pooled session if it is open."""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        self._loop = None
+
+PROVIDER_CLIENTS = {
+    "gemini": ProviderClient("gemini"),
+    "deepseek": ProviderClient("deepseek"),
+}
+
+def _gemini_guard():
+    return get_provider_guard("gemini", GEMINI_API_KEY, GEMINI_REQUESTS_PER_MINUTE)
+
+def _deepseek_guard():
+    return get_provider_guard("deepseek", DEEPSEEK_API_KEY, DEEPSEEK_REQUESTS_PER_MINUTE)
+
+def _http_error(status: int, body: str, headers) -> ProviderHTTPError:
+    logger.warning(f"HTTP error: {status}")
+    return ProviderHTTPError(status, body[:800], parse_retry_after(headers.get("Retry-After")))
+
+async def close_provider_sessions():
+    """Close every provider session; call once on shutdown."""
+    for client in PROVIDER_CLIENTS.values():
+        await client.close()
+
+async def _cached_call(provider: str, label: str, model: str, params: dict, sent_prompt: str, fetch,
+                       on_token: Optional[Callable[[str], None]] = None, streams: bool = False) -> Tuple[str, List[str]]:
+    """Route a provider call through the response cache according to LLM_CACHE_MODE.
+
+    sent_prompt is the full text sent to the provider; fetch is a zero-argument
+    coroutine factory performing the live call. When the answer did not arrive
+    token by token (cache hit or non-streaming fetch) it is passed to on_token
+    in one piece.
+    """
+    def emit(result: Tuple[str, List[str]], streamed: bool) -> Tuple[str, List[str]]:
+        if on_token is not None and not streamed:
+            on_token(result[0])
+        return result
+
+    cache = get_llm_cache()
+    if cache is None:
+        return emit(await fetch(), streams)
+    key = make_cache_key(provider, model, params, sent_prompt)
+    if LLM_CACHE_MODE in ("live", "replay"):
+        hit = cache.get(key)
+        if hit is not None:
+            logger.debug("%s response served from cache", label)
+            return emit(hit, False)
+        if LLM_CACHE_MODE == "replay":
+            logger.debug("%s replay miss for key %s", label, key[:12])
+            return emit((f"[{label} Replay Miss] No recorded response for this prompt", []), False)
+    answer, refs = await fetch()
+    if not ERROR_RESPONSE.match(answer):
+        cache.put(key, provider, answer, refs)
+    return emit((answer, refs), streams)
+
+async def _sse_events(resp: aiohttp.ClientResponse) -> AsyncIterator[str]:
+    """Yield the data payload of each server-sent event until [DONE]."""
+    data_lines: List[str] = []
+    async for raw in resp.content:
+        line = raw.decode("utf-8", errors="ignore").rstrip("\r\n")
+        if not line:
+            if data_lines:
+                data = "\n".join(data_lines)
+                data_lines = []
+                if data.strip() == "[DONE]":
+                    return
+                yield data
+            continue
+        if line.startswith(":"):
+            continue
+        if line.startswith("data:"):
+            data_lines.append(line[5:].lstrip())
+    if data_lines and "\n".join(data_lines).strip() != "[DONE]":
+        yield "\n".join(data_lines)
+
+async def _call_streaming(label: str, chunks: AsyncIterator[str],
+                          on_token: Optional[Callable[[str], None]]) -> Tuple[str, List[str]]:
+    """Consume a provider token stream, forwarding deltas and parsing the JSON block as it arrives.
+
+    Errors before the first delta propagate unchanged so the provider guard can retry them.
+    """
+    scanner = IncrementalJSONScanner()
+    emitted = False
+    try:
+        async for chunk in chunks:
+            if not chunk:
+                continue
+            scanner.feed(chunk)
+            emitted = True
+            if on_token is not None:
+                on_token(chunk)
+    except Exception as e:
+        if not emitted:
+            raise
+        # Tokens already reached the sink, so the call cannot be transparently retried
+        logger.warning(f"{label} stream interrupted: {e}")
+        raise ProviderUnavailable(f"{label} stream interrupted after partial output: {e}") from e
+    return _extract_answer(scanner.text, label, parsed=scanner.last_object("response"))
+
+def _extract_answer(textual: str, provider: str, parsed: Optional[dict] = None) -> Tuple[str, List[str]]:
+    """Pull the answer and references out of the model's trailing JSON block."""
+    inner_json = parsed if parsed is not None else safe_json_parse(textual, "response")
+    if inner_json:
+        answer = inner_json.get("answer") or inner_json.get("critique") or inner_json.get("final_answer") or ""
+        refs = inner_json.get("references", []) or []
+        refs = [str(r).strip() for r in refs if r and isinstance(r, str) and urlparse(r).scheme in ["http", "https"]]
+        logger.debug("%s response parsed: %s chars, %s refs", provider, len(answer), len(refs))
+        return (answer.strip() or textual.strip(), refs)
+    urls = re.findall(r"https?://[^\s)]+", textual)
+    logger.debug("%s fallback to regex: %s URLs", provider, len(urls))
+    return (textual.strip(), urls)
+
+def _gemini_prompt(prompt: str) -> str:
     system_prompt = (
         "You are Gemini 2.0 Flash, a panelist in a news channel debate. Provide a concise, technical, and factual answer (max 500 words). "
         "End with a JSON block with keys: 'answer' (string) and 'references' (list of 3-5 valid HTTPS URLs to official or reputable sources). "
         "Example: {\"answer\": \"...\", \"references\": [\"https://www.pmindia.gov.in\", \"https://www.mea.gov.in\"]}"
     )
+    return system_prompt + "\n\nQUESTION:\n" + prompt
+
+def _parse_gemini_body(text: str) -> Tuple[str, List[str]]:
+    json_block = safe_json_parse(text, "gemini_response")
+    if not json_block:
+        logger.warning(f"Gemini malformed response: {text[:100]}...")
+        urls = re.findall(r"https?://[^\s)]+", text)
+        return (text.strip(), urls)
 
-    combined = system_prompt + "\n\nQUESTION:\n" + prompt
+    textual = ""
+    if "candidates" in json_block and len(json_block["candidates"]) > 0:
+        cand = json_block["candidates"][0].get("content", {})
+        if isinstance(cand, dict) and "parts" in cand:
+            textual = " ".join(p.get("text", "") for p in cand["parts"] if isinstance(p, dict))
+        elif "text" in cand:
+            textual = cand["text"]
+        else:
+            textual = json.dumps(cand)
+    else:
+        textual = text
+    return _extract_answer(textual, "Gemini")
 
+async def call_gemini_async(prompt: str, on_token: Optional[Callable[[str], None]] = None) -> Tuple[str, List[str]]:
+    if LLM_STREAMING:
+        attempt = lambda: _call_streaming("Gemini", _gemini_stream_chunks(prompt), on_token)
+    else:
+        attempt = lambda: _call_gemini_live(prompt)
+    fetch = lambda: _gemini_guard().call(attempt)
+    return await _cached_call(
+        "gemini", "Gemini", GEMINI_MODEL, GEMINI_GENERATION_CONFIG,
+        _gemini_prompt(prompt), fetch, on_token=on_token, streams=LLM_STREAMING
+    )
+
+async def _gemini_stream_chunks(prompt: str) -> AsyncIterator[str]:
+    """Yield text deltas from Gemini streamGenerateContent (SSE)."""
+    logger.debug("Streaming Gemini API")
     payload = {
-        "contents": [{"parts": [{"text": combined}]}],
-        "generationConfig": {"temperature": 0.2, "topP": 0.9, "maxOutputTokens": 2048}
+        "contents": [{"parts": [{"text": _gemini_prompt(prompt)}]}],
+        "generationConfig": GEMINI_GENERATION_CONFIG
     }
+    session = PROVIDER_CLIENTS["gemini"].session()
+    async with session.post(GEMINI_STREAM_URL, headers={"Content-Type": "application/json"}, json=payload) as resp:
+        if resp.status != 200:
+            raise _http_error(resp.status, await resp.text(), resp.headers)
+        async for data in _sse_events(resp):
+            event = json.loads(data)
+            for cand in event.get("candidates", [])[:1]:
+                for part in cand.get("content", {}).get("parts", []):
+                    if isinstance(part, dict) and part.get("text"):
+                        yield part["text"]
 
-    headers = {"Content-Type": "application/json"}
-    try:
-        async with aiohttp.ClientSession() as session:
-            async with session.post(GEMINI_URL, headers=headers, json=payload, timeout=LLM_TIMEOUT) as resp:
-                text = await resp.text()
-                if resp.status != 200:
-                    print(f"[DEBUG] Gemini HTTP error: {resp.status}")
-                    return (f"[Gemini HTTP {resp.status}] {text[:800]}", [])
-                
-                json_block = safe_json_parse(text, "gemini_response")
-                if not json_block:
-                    print(f"[DEBUG] Gemini malformed response: {text[:100]}...")
-                    urls = re.findall(r"https?://[^\s)]+", text)
-                    return (text.strip(), urls)
-
-                textual = ""
-                if "candidates" in json_block and len(json_block["candidates"]) > 0:
-                    cand = json_block["candidates"][0].get("content", {})
-                    if isinstance(cand, dict) and "parts" in cand:
-                        textual = " ".join(p.get("text", "") for p in cand["parts"] if isinstance(p, dict))
-                    elif "text" in cand:
-                        textual = cand["text"]
-                    else:
-                        textual = json.dumps(cand)
-                else:
-                    textual = text
-
-                inner_json = safe_json_parse(textual, "gemini")
-                if inner_json:
-                    answer = inner_json.get("answer", "") or inner_json.get("final_answer", "")
-                    refs = inner_json.get("references", []) or []
-                    refs = [str(r).strip() for r in refs if r and isinstance(r, str) and urlparse(r).scheme in ["http", "https"]]
-                    print(f"[DEBUG] Gemini response parsed: {len(answer)} chars, {len(refs)} refs")
-                    return (answer.strip() or textual.strip(), refs)
-                else:
-                    urls = re.findall(r"https?://[^\s)]+", textual)
-                    print(f"[DEBUG] Gemini fallback to regex: {len(urls)} URLs")
-                    return (textual.strip(), urls)
-    except asyncio.TimeoutError:
-        print("[DEBUG] Gemini timeout")
-        return ("[Gemini Timeout]", [])
-    except Exception as e:
-        print(f"[DEBUG] Gemini exception: {e}")
-        return (f"[Gemini Exception] {e}", [])
+async def _call_gemini_live(prompt: str) -> Tuple[str, List[str]]:
+    logger.debug("Calling Gemini API")
+    payload = {
+        "contents": [{"parts": [{"text": _gemini_prompt(prompt)}]}],
+        "generationConfig": GEMINI_GENERATION_CONFIG
+    }
 
-async def call_deepseek_async(prompt: str) -> Tuple[str, List[str]]:
-    print("[DEBUG] Calling DeepSeek API")
-    loop = asyncio.get_event_loop()
-    return await loop.run_in_executor(None, lambda: call_deepseek_sync(prompt))
+    headers = {"Content-Type": "application/json"}
+    session = PROVIDER_CLIENTS["gemini"].session()
+    async with session.post(GEMINI_URL, headers=headers, json=payload) as resp:
+        text = await resp.text()
+        if resp.status != 200:
+            raise _http_error(resp.status, text, resp.headers)
+        return _parse_gemini_body(text)
 
-def call_deepseek_sync(prompt: str) -> Tuple[str, List[str]]:
+def _deepseek_request(prompt: str) -> Tuple[dict, dict]:
     system_note = (
         "You are DeepSeek, a panelist in a news channel debate. Provide a concise, technical, and factual answer (max 500 words). "
         "End with a JSON object with keys: 'answer' (string) and 'references' (list of 3-5 valid HTTPS URLs to official or reputable sources). "
@@ -94,50 +264,78 @@ def call_deepseek_sync(prompt: str) -> Tuple[str, List[str]]:
     payload = {
         "model": DEEPSEEK_MODEL,
         "messages": [{"role": "user", "content": full_prompt}],
-        "temperature": 0.2,
-        "max_tokens": 2048
+        **DEEPSEEK_GENERATION_PARAMS
     }
+    return headers, payload
 
-    try:
+def _parse_deepseek_body(text: str) -> Tuple[str, List[str]]:
+    data = safe_json_parse(text, "deepseek_response")
+    if not data:
+        logger.warning(f"DeepSeek malformed response: {text[:100]}...")
+        urls = re.findall(r"https?://[^\s)]+", text)
+        return (text.strip(), urls)
+
+    textual = ""
+    if "choices" in data and len(data["choices"]) > 0:
+        choice = data["choices"][0]
+        msg = choice.get("message") or choice.get("text") or {}
+        if isinstance(msg, dict):
+            textual = msg.get("content", "") or msg.get("text", "")
+        else:
+            textual = str(msg)
+        if not textual:
+            textual = json.dumps(choice)
+    else:
+        textual = text
+    return _extract_answer(textual, "DeepSeek")
+
+async def call_deepseek_async(prompt: str, on_token: Optional[Callable[[str], None]] = None) -> Tuple[str, List[str]]:
+    _, payload = _deepseek_request(prompt)
+    if LLM_STREAMING:
+        attempt = lambda: _call_streaming("DeepSeek", _deepseek_stream_chunks(prompt), on_token)
+    else:
+        attempt = lambda: _call_deepseek_live(prompt)
+    fetch = lambda: _deepseek_guard().call(attempt)
+    return await _cached_call(
+        "deepseek", "DeepSeek", DEEPSEEK_MODEL, DEEPSEEK_GENERATION_PARAMS,
+        payload["messages"][0]["content"], fetch, on_token=on_token, streams=LLM_STREAMING
+    )
+
+async def _deepseek_stream_chunks(prompt: str) -> AsyncIterator[str]:
+    """Yield content deltas from the OpenRouter chat-completions SSE stream."""
+    logger.debug("Streaming DeepSeek API")
+    headers, payload = _deepseek_request(prompt)
+    payload["stream"] = True
+    session = PROVIDER_CLIENTS["deepseek"].session()
+    async with session.post(DEEPSEEK_URL, headers=headers, json=payload) as resp:
+        if resp.status != 200:
+            raise _http_error(resp.status, await resp.text(), resp.headers)
+        async for data in _sse_events(resp):
+            event = json.loads(data)
+            if "error" in event:
+                raise ProviderHTTPError(event["error"].get("code", 500), json.dumps(event["error"]))
+            for choice in event.get("choices", [])[:1]:
+                delta = choice.get("delta") or {}
+                if delta.get("content"):
+                    yield delta["content"]
+
+async def _call_deepseek_live(prompt: str) -> Tuple[str, List[str]]:
+    logger.debug("Calling DeepSeek API")
+    headers, payload = _deepseek_request(prompt)
+    session = PROVIDER_CLIENTS["deepseek"].session()
+    async with session.post(DEEPSEEK_URL, headers=headers, json=payload) as resp:
+        text = await resp.text()
+        if resp.status != 200:
+            raise _http_error(resp.status, text, resp.headers)
+        return _parse_deepseek_body(text)
+
+def call_deepseek_sync(prompt: str) -> Tuple[str, List[str]]:
+    headers, payload = _deepseek_request(prompt)
+
+    def attempt() -> Tuple[str, List[str]]:
         resp = requests.post(DEEPSEEK_URL, headers=headers, json=payload, timeout=LLM_TIMEOUT, verify=certifi.where())
-        text = resp.text
         if resp.status_code != 200:
-            print(f"[DEBUG] DeepSeek HTTP error: {resp.status_code}")
-            return (f"[DeepSeek HTTP {resp.status_code}] {text[:800]}", [])
-        
-        data = safe_json_parse(text, "deepseek_response")
-        if not data:
-            print(f"[DEBUG] DeepSeek malformed response: {text[:100]}...")
-            urls = re.findall(r"https?://[^\s)]+", text)
-            return (text.strip(), urls)
-
-        textual = ""
-        if "choices" in data and len(data["choices"]) > 0:
-            choice = data["choices"][0]
-            msg = choice.get("message") or choice.get("text") or {}
-            if isinstance(msg, dict):
-                textual = msg.get("content", "") or msg.get("text", "")
-            else:
-                textual = str(msg)
-            if not textual:
-                textual = json.dumps(choice)
-        else:
-            textual = text
-
-        inner_json = safe_json_parse(textual, "deepseek")
-        if inner_json:
-            answer = inner_json.get("answer", "") or inner_json.get("final_answer", "")
-            refs = inner_json.get("references", []) or []
-            refs = [str(r).strip() for r in refs if r and isinstance(r, str) and urlparse(r).scheme in ["http", "https"]]
-            print(f"[DEBUG] DeepSeek response parsed: {len(answer)} chars, {len(refs)} refs")
-            return (answer.strip() or textual.strip(), refs)
-        else:
-            urls = re.findall(r"https?://[^\s)]+", textual)
-            print(f"[DEBUG] DeepSeek fallback to regex: {len(urls)} URLs")
-            return (textual.strip(), urls)
-    except requests.Timeout:
-        print("[DEBUG] DeepSeek timeout")
-        return ("[DeepSeek Timeout]", [])
-    except Exception as e:
-        print(f"[DEBUG] DeepSeek exception: {e}")
-        return (f"[DeepSeek Exception] {e}", [])
\ No newline at end of file
+            raise _http_error(resp.status_code, resp.text, resp.headers)
+        return _parse_deepseek_body(resp.text)
+
+    return _deepseek_guard().call_sync(attempt)
@@ -0,0 +1,186 @@
+"""
+load_test.py - Offline load-test driver for DebateEngine.run_debate
+
+Starts the fake backend in-process, points the provider URLs at it and runs N
+debates concurrently, then reports throughput and per-stage p50/p95/p99 latency.
+
+    python load_test.py --debates 20 --concurrency 10 --rounds 1 --llm-latency 0.8
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import time
+from collections import defaultdict
+from typing import Dict, List
+from fake_backend import add_backend_arguments, backend_config_from_args, start_fake_backend
+
+STAGES = (
+    "debate", "initial_suggestion", "critique", "refinement", "finalization",
+    "llm_call", "verify_references", "add_evidence"
+)
+
+def percentile(samples: List[float], pct: float) -> float:
+    """Nearest-rank percentile of the samples (0 when empty)."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+def _timed(timings: Dict[str, List[float]], stage: str, func):
+    """Wrap an async callable so every call records its duration under stage."""
+    async def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            timings[stage].append(time.perf_counter() - start)
+    return wrapper
+
+def _instrument(engine, timings: Dict[str, List[float]]):
+    """Attach timing wrappers to one engine's stages, LLM calls and I/O steps."""
+    stage_response = engine._stage_response
+
+    async def timed_stage(stage, *args):
+        start = time.perf_counter()
+        try:
+            return await stage_response(stage, *args)
+        finally:
+            timings[stage].append(time.perf_counter() - start)
+
+    engine._stage_response = timed_stage
+    engine._verify_references = _timed(timings, "verify_references", engine._verify_references)
+    engine.evidence_retriever.add_evidence = _timed(timings, "add_evidence", engine.evidence_retriever.add_evidence)
+    for agent in engine.agents.values():
+        agent.llm_call = _timed(timings, "llm_call", agent.llm_call)
+
+async def run_load_test(args: argparse.Namespace) -> dict:
+    runner, base_url, backend = await start_fake_backend(backend_config_from_args(args))
+    os.environ["GEMINI_API_BASE"] = base_url
+    os.environ["DEEPSEEK_URL"] = f"{base_url}/api/v1/chat/completions"
+    os.environ.setdefault("GEMINI_API_KEY", "fake")
+    os.environ.setdefault("DEEPSEEK_API_KEY", "fake")
+    os.environ["GEMINI_REQUESTS_PER_MINUTE"] = str(args.rpm)
+    os.environ["DEEPSEEK_REQUESTS_PER_MINUTE"] = str(args.rpm)
+    if not args.use_caches:
+        os.environ["LLM_CACHE_MODE"] = "off"
+        os.environ["REFERENCE_CACHE_PATH"] = ""
+        os.environ["EVIDENCE_INDEX_DIR"] = ""
+        os.environ["EMBEDDING_CACHE_DIR"] = ""
+    if args.worker_pool:
+        os.environ["WORKER_POOL"] = args.worker_pool
+
+    # Imported only now so config picks up the fake backend URLs
+    from debate_engine import DebateEngine
+    from evidence_retriever import EvidenceRetriever
+    from llm_calls import close_provider_sessions
+    from provider_resilience import provider_stats
+    from tracing import get_logger
+    from web_loader import close_http_session
+    from workers import watch_loop
+
+    logger = get_logger(__name__)
+
+    embedder = EvidenceRetriever().embedder
+    timings: Dict[str, List[float]] = defaultdict(list)
+    failures = 0
+    failed_tasks = 0
+    limit = asyncio.Semaphore(args.concurrency)
+
+    async def one_debate(index: int):
+        nonlocal failures, failed_tasks
+        async with limit:
+            engine = DebateEngine(rounds=args.rounds, embedder=embedder, checkpoint_dir="")
+            _instrument(engine, timings)
+            start = time.perf_counter()
+            try:
+                await engine.run_debate(f"Load test topic #{index}: which policy improved growth more?")
+            except Exception as e:
+                failures += 1
+                logger.warning(f"Debate {index} failed: {e}")
+                return
+            finally:
+                timings["debate"].append(time.perf_counter() - start)
+            # Stages that fail are recorded as "[Error] ..." answers rather than raised
+            errors = sum(1 for record in engine.history if record.answer.startswith("[Error]"))
+            failed_tasks += errors
+            if errors or len(engine.completed_tasks) < len(engine.dag):
+                failures += 1
+                logger.warning(f"Debate {index} finished with {errors} failed stage tasks")
+
+    wall_start = time.perf_counter()
+    try:
+        with watch_loop() as stalls:
+            await asyncio.gather(*(one_debate(i) for i in range(args.debates)))
+    finally:
+        wall = time.perf_counter() - wall_start
+        await close_provider_sessions()
+        await close_http_session()
+        await runner.cleanup()
+
+    return {
+        "debates": args.debates,
+        "concurrency": args.concurrency,
+        "rounds": args.rounds,
+        "failures": failures,
+        "failed_tasks": failed_tasks,
+        "wall_seconds": wall,
+        "throughput_per_min": args.debates / wall * 60 if wall else 0.0,
+        "backend": backend.counters,
+        "providers": provider_stats(),
+        "event_loop": stalls.to_dict(),
+        "stages": {
+            stage: {
+                "count": len(timings[stage]),
+                "p50": percentile(timings[stage], 50),
+                "p95": percentile(timings[stage], 95),
+                "p99": percentile(timings[stage], 99),
+                "max": max(timings[stage], default=0.0),
+            }
+            for stage in STAGES
+        },
+    }
+
+def print_report(report: dict):
+    print("==================================================")
+    print("Load Test Report")
+    print("==================================================")
+    print(f"Debates: {report['debates']} (concurrency {report['concurrency']}, rounds {report['rounds']}, failures {report['failures']}, "
+          f"failed stage tasks {report['failed_tasks']})")
+    print(f"Wall time: {report['wall_seconds']:.2f}s  Throughput: {report['throughput_per_min']:.1f} debates/min")
+    print(f"Backend requests: {report['backend']}")
+    loop = report["event_loop"]
+    print(f"Event loop blocked: {loop['blocked_seconds']:.2f}s ({loop['stalls']} stalls, "
+          f"longest {loop['max_stall_seconds'] * 1000:.0f}ms)")
+    for name, stats in report["providers"].items():
+        print(f"Provider {name}: {stats}")
+    print()
+    print(f"{'stage':<20}{'count':>7}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}")
+    for stage, row in report["stages"].items():
+        print(f"{stage:<20}{row['count']:>7}{row['p50']:>9.3f}{row['p95']:>9.3f}{row['p99']:>9.3f}{row['max']:>9.3f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Run concurrent debates against the local fake backend")
+    parser.add_argument("--debates", type=int, default=10, help="total debates to run")
+    parser.add_argument("--concurrency", type=int, default=5, help="debates in flight at once")
+    parser.add_argument("--rounds", type=int, default=1, help="critique/refinement rounds per debate")
+    parser.add_argument("--rpm", type=float, default=0, help="per-provider request limit per minute (0 = unlimited)")
+    parser.add_argument("--use-caches", action="store_true", help="keep LLM, reference, evidence-index and embedding caches enabled")
+    parser.add_argument("--worker-pool", choices=("thread", "process", "inline"), default=None,
+                        help="where parsing and splitting run (default: WORKER_POOL)")
+    parser.add_argument("--json-out", default=None, help="also write the report as JSON to this path")
+    add_backend_arguments(parser)
+    args = parser.parse_args()
+
+    report = asyncio.run(run_load_test(args))
+    print_report(report)
+    if args.json_out:
+        with open(args.json_out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nReport written to '{os.path.abspath(args.json_out)}'")
+
+if __name__ == "__main__":
+    main()
@@ -2,18 +2,31 @@
 main.py - Entry point for the AI News Channel Debate
 """
 
+import argparse
 import asyncio
+import logging
 import sys
 import warnings
 import os
-import urllib3
-from debate_engine import DebateEngine
-from output_formatter import format_and_save_transcript
-from config import GEMINI_API_KEY, DEEPSEEK_API_KEY
 
-# Suppress warnings
+# Suppress warnings; set before transformers is imported so TensorFlow is never loaded
 os.environ['TF_ENABLE_ONEDNN_OPTS'] = '0'
 os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'
+os.environ.setdefault('USE_TF', '0')
+
+from utils import STARTUP_TIMER
+with STARTUP_TIMER.phase("import debate_engine"):
+    from debate_engine import DebateEngine
+with STARTUP_TIMER.phase("import output_formatter"):
+    from output_formatter import format_and_save_transcript, LiveTranscript
+import urllib3
+from llm_calls import close_provider_sessions
+from web_loader import close_http_session
+from config import GEMINI_API_KEY, DEEPSEEK_API_KEY, LLM_STREAMING
+from tracing import get_logger, use_trace
+
+logger = get_logger(__name__)
+
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 warnings.filterwarnings('ignore', category=DeprecationWarning, module='tf_keras')
 
@@ -23,13 +36,13 @@ if sys.platform == "win32":
     sys.modules['pwd'] = types.ModuleType('pwd')
     sys.modules['pwd'].getpwnam = lambda x: None
 
-async def main():
+async def main(resume: bool = False):
     """Run the debate system."""
     try:
-        print("[DEBUG] Starting program")
-        print("[DEBUG] Current working directory: " + os.getcwd())
-        print("[DEBUG] GEMINI_API_KEY present: " + ("Yes" if GEMINI_API_KEY else "No"))
-        print("[DEBUG] DEEPSEEK_API_KEY present: " + ("Yes" if DEEPSEEK_API_KEY else "No"))
+        logger.debug("Starting program")
+        logger.debug("Current working directory: " + os.getcwd())
+        logger.debug("GEMINI_API_KEY present: " + ("Yes" if GEMINI_API_KEY else "No"))
+        logger.debug("DEEPSEEK_API_KEY present: " + ("Yes" if DEEPSEEK_API_KEY else "No"))
         
         print("\n==================================================")
         print("Welcome to the AI News Channel Debate!")
@@ -43,20 +56,29 @@ async def main():
         print("Advocates: Gemini (Proponent) and DeepSeek (Opponent)")
         print("Let's start the lawyer-style debate!\n")
         
-        engine = DebateEngine(rounds=1)
-        print("[DEBUG] DebateEngine attributes: " + str(dir(engine)))  # Debug class attributes
+        live = LiveTranscript(question) if LLM_STREAMING else None
+        with STARTUP_TIMER.phase("init DebateEngine"):
+            engine = DebateEngine(rounds=1, token_sink=live, resume=resume)
+        logger.debug("DebateEngine attributes: " + str(dir(engine)))  # Debug class attributes
         try:
             final_answer, history = await engine.run_debate(question)
         except Exception as e:
-            print(f"[DEBUG] Debate engine error: {e}")
+            logger.error(f"Debate engine error: {e}")
             final_answer = f"[Error] Debate failed: {e}"
             history = []
+        finally:
+            if live is not None:
+                live.close()
         
         # Ensure output is generated even on partial failure
         try:
-            format_and_save_transcript(question, history, final_answer)
+            call_metrics = {name: agent.call_metrics for name, agent in engine.agents.items()}
+            with use_trace(engine.trace):
+                format_and_save_transcript(question, history, final_answer, call_metrics=call_metrics)
+            if engine.trace is not None:
+                engine.trace.save()
         except Exception as e:
-            print(f"[DEBUG] Output formatting error: {e}")
+            logger.error(f"Output formatting error: {e}")
             # Fallback: write raw output to file
             with open("debate_transcript_fallback.txt", "w", encoding="utf-8", errors="ignore") as f:
                 f.write(f"# Debate Transcript (Fallback)\n\n")
@@ -65,20 +87,29 @@ async def main():
                 f.write(f"Final Answer:\n{final_answer}\n\n")
                 f.write("History:\n")
                 for h in history:
-                    f.write(f"{h['agent']} ({h['stage']}): {h['answer']}\n")
-            print("[DEBUG] Fallback transcript saved to 'debate_transcript_fallback.txt'")
+                    f.write(f"{h.agent} ({h.stage}): {h.answer}\n")
+            logger.debug("Fallback transcript saved to 'debate_transcript_fallback.txt'")
         
-        print("[DEBUG] Program completed")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(STARTUP_TIMER.report())
+        logger.debug("Program completed")
     except KeyboardInterrupt:
         print("\nDebate interrupted by user")
     except Exception as e:
-        print(f"[DEBUG] Error in main: {e}")
+        logger.error(f"Error in main: {e}")
         print("An error occurred during the debate. Please check logs and try again.")
+    finally:
+        await close_provider_sessions()
+        await close_http_session()
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="AI News Channel Debate")
+    parser.add_argument("--resume", action="store_true",
+                        help="reuse the stages checkpointed by an interrupted run of the same topic")
+    args = parser.parse_args()
     try:
-        asyncio.run(main())
+        asyncio.run(main(resume=args.resume))
     except KeyboardInterrupt:
         print("\nProgram terminated by user")
     except Exception as e:
-        print(f"[DEBUG] Fatal error: {e}")
\ No newline at end of file
+        logger.error(f"Fatal error: {e}")
\ No newline at end of file
@@ -3,13 +3,68 @@ output_formatter.py - Functions for formatting and saving debate output
 """
 
 import os
-from typing import List, Dict
-from utils import safe_json_parse
+from typing import Iterable, List, Dict, Optional
+from debate_history import DebateHistory, HistoryRecord
+from tracing import get_logger, span
 
-def format_and_save_transcript(question: str, history: List[Dict], final_answer: str, filename: str = "debate_transcript.md"):
+logger = get_logger(__name__)
+
+class LiveTranscript:
+    """Token sink that echoes answers to the console and a live Markdown file as they stream in."""
+    
+    def __init__(self, question: str, filename: str = "debate_transcript.live.md"):
+        self.filename = filename
+        self._current = None
+        self._file = open(filename, "w", encoding="utf-8", errors="ignore")
+        self._file.write(f"# AI News Channel Debate (live)\n\n## Topic: {question}\n")
+        self._file.flush()
+    
+    def __call__(self, agent: str, stage: str, chunk: str):
+        if (agent, stage) != self._current:
+            header = f"\n\n### {agent} ({stage})\n"
+            print(header, flush=True)
+            self._file.write(header)
+            self._current = (agent, stage)
+        print(chunk, end="", flush=True)
+        self._file.write(chunk)
+        self._file.flush()
+    
+    def close(self):
+        print()
+        self._file.close()
+        logger.debug("Live transcript saved to '%s'", os.path.abspath(self.filename))
+
+def serialize_round(record: HistoryRecord) -> Dict:
+    """Convert one history record into a plain JSON-serializable dict."""
+    return {
+        "agent": record.agent,
+        "stage": record.stage,
+        "round": record.round,
+        "answer": record.answer,
+        "timestamp": record.timestamp,
+        "references": [
+            {"url": r.url, "valid": r.valid, "domain": r.domain, "authority_score": r.authority_score}
+            for r in record.references
+        ]
+    }
+
+def serialize_history(history: Iterable[HistoryRecord]) -> List[Dict]:
+    """Convert debate history into plain JSON-serializable dicts."""
+    return [serialize_round(h) for h in history]
+
+def format_and_save_transcript(question: str, history: Iterable[HistoryRecord], final_answer: str, filename: str = "debate_transcript.md",
+                               call_metrics: Optional[Dict[str, List[Dict]]] = None):
     """Format debate output and save to Markdown file."""
-    print("[DEBUG] Formatting and saving transcript")
-    print("[DEBUG] Saving to: " + os.path.abspath(filename))
+    if not isinstance(history, DebateHistory):
+        history = DebateHistory(history)
+    with span("format_transcript", items=len(history)) as format_span:
+        transcript = _format_and_save_transcript(question, history, final_answer, filename, call_metrics)
+        format_span.set(bytes=len(transcript))
+
+def _format_and_save_transcript(question: str, history: DebateHistory, final_answer: str, filename: str,
+                                call_metrics: Optional[Dict[str, List[Dict]]]) -> str:
+    logger.debug("Formatting and saving transcript")
+    logger.debug("Saving to: " + os.path.abspath(filename))
     
     # Initialize transcript content
     transcript = f"# AI News Channel Debate Transcript\n\n"
@@ -22,55 +77,49 @@ def format_and_save_transcript(question: str, history: List[Dict], final_answer:
     
     print("Initial Suggestions:\n")
     transcript += f"## Initial Suggestions\n\n"
-    for round_data in [h for h in history if h['stage'] == "initial_suggestion"]:
-        print(f"{round_data['agent']} suggests:")
-        answer_text = round_data["answer"]
-        json_block = safe_json_parse(round_data["raw_response"], "initial_suggestion")
-        answer_text = json_block.get("answer", answer_text) if json_block else answer_text
+    for round_data in history.stage("initial_suggestion"):
+        print(f"{round_data.agent} suggests:")
+        answer_text = round_data.answer
         print(answer_text)
-        valid_count = len([r for r in round_data['references'] if r.valid])
+        valid_count = len([r for r in round_data.references if r.valid])
         print(f"Supporting References: {valid_count} valid\n")
-        transcript += f"### {round_data['agent']}\n"
+        transcript += f"### {round_data.agent}\n"
         transcript += f"{answer_text}\n\n"
         transcript += f"#### References\n"
-        for ref in round_data['references']:
+        for ref in round_data.references:
             if ref.valid:
                 transcript += f"- {ref.url} (Domain: {ref.domain}, Authority: {ref.authority_score}/3)\n"
         transcript += "\n"
     
-    for r in range(1, max((h['round'] for h in history if h['stage'] in ["critique", "refinement"]), default=0) + 1):
+    for r in range(1, history.max_round + 1):
         print(f"Critique Round {r}:\n")
         transcript += f"## Critique Round {r}\n\n"
-        for round_data in [h for h in history if h['stage'] == "critique" and h['round'] == r]:
-            print(f"{round_data['agent']} critiques:")
-            answer_text = round_data["answer"]
-            json_block = safe_json_parse(round_data["raw_response"], "critique")
-            answer_text = json_block.get("critique", answer_text) if json_block else answer_text
+        for round_data in history.stage("critique", r):
+            print(f"{round_data.agent} critiques:")
+            answer_text = round_data.answer
             print(answer_text)
-            valid_count = len([r for r in round_data['references'] if r.valid])
+            valid_count = len([r for r in round_data.references if r.valid])
             print(f"Supporting References: {valid_count} valid\n")
-            transcript += f"### {round_data['agent']}\n"
+            transcript += f"### {round_data.agent}\n"
             transcript += f"{answer_text}\n\n"
             transcript += f"#### References\n"
-            for ref in round_data['references']:
+            for ref in round_data.references:
                 if ref.valid:
                     transcript += f"- {ref.url} (Domain: {ref.domain}, Authority: {ref.authority_score}/3)\n"
             transcript += "\n"
         
         print(f"Refinement Round {r}:\n")
         transcript += f"## Refinement Round {r}\n\n"
-        for round_data in [h for h in history if h['stage'] == "refinement" and h['round'] == r]:
-            print(f"{round_data['agent']} refines:")
-            answer_text = round_data["answer"]
-            json_block = safe_json_parse(round_data["raw_response"], "refinement")
-            answer_text = json_block.get("answer", answer_text) if json_block else answer_text
+        for round_data in history.stage("refinement", r):
+            print(f"{round_data.agent} refines:")
+            answer_text = round_data.answer
             print(answer_text)
-            valid_count = len([r for r in round_data['references'] if r.valid])
+            valid_count = len([r for r in round_data.references if r.valid])
             print(f"Supporting References: {valid_count} valid\n")
-            transcript += f"### {round_data['agent']}\n"
+            transcript += f"### {round_data.agent}\n"
             transcript += f"{answer_text}\n\n"
             transcript += f"#### References\n"
-            for ref in round_data['references']:
+            for ref in round_data.references:
                 if ref.valid:
                     transcript += f"- {ref.url} (Domain: {ref.domain}, Authority: {ref.authority_score}/3)\n"
             transcript += "\n"
@@ -82,15 +131,25 @@ def format_and_save_transcript(question: str, history: List[Dict], final_answer:
     transcript += f"## Final Answer\n\n"
     transcript += final_answer.replace("```json", "").replace("```", "").strip() + "\n"
     
+    if call_metrics:
+        transcript += "\n## Response Latency\n\n"
+        transcript += "| Agent | Stage | Prompt tokens (budget) | First token (s) | Total (s) | Tokens | Tokens/s |\n"
+        transcript += "|---|---|---|---|---|---|---|\n"
+        for agent_name, metrics in call_metrics.items():
+            for m in metrics:
+                transcript += (f"| {agent_name} | {m['stage']} | {m['prompt_tokens']} ({m['prompt_budget']}) "
+                               f"| {m['ttft']:.2f} | {m['duration']:.2f} | {m['tokens']} | {m['tokens_per_sec']:.1f} |\n")
+    
     # Save to Markdown
     try:
         with open(filename, "w", encoding="utf-8", errors="ignore") as f:
             f.write(transcript)
         print(f"\nFull debate transcript saved to '{os.path.abspath(filename)}'")
     except Exception as e:
-        print(f"[DEBUG] Failed to save transcript to {filename}: {e}")
+        logger.error(f"Failed to save transcript to {filename}: {e}")
         # Fallback: save to a backup file
         backup_file = "debate_transcript_backup.md"
         with open(backup_file, "w", encoding="utf-8", errors="ignore") as f:
             f.write(transcript)
-        print(f"[DEBUG] Saved transcript to backup file: '{os.path.abspath(backup_file)}'")
\ No newline at end of file
+        logger.debug("Saved transcript to backup file: '%s'", os.path.abspath(backup_file))
+    return transcript
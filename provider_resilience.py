@@ -0,0 +1,264 @@
+"""
+provider_resilience.py - Rate limiting, retries and circuit breaking for LLM providers
+"""
+
+import asyncio
+import hashlib
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Awaitable, Callable, Dict, Optional, Tuple, TypeVar
+import aiohttp
+import requests
+from config import (
+    LLM_RATE_BURST, LLM_MAX_RETRIES, LLM_BACKOFF_BASE, LLM_BACKOFF_MAX, LLM_RETRY_AFTER_MAX,
+    CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_TIMEOUT
+)
+from tracing import get_logger
+
+logger = get_logger(__name__)
+
+T = TypeVar("T")
+
+# 429 means we are over quota; the 5xx codes mean the provider itself is struggling
+THROTTLED_STATUSES = {429}
+UNHEALTHY_STATUSES = {500, 502, 503, 504}
+TRANSIENT_EXCEPTIONS = (asyncio.TimeoutError, aiohttp.ClientError, requests.ConnectionError, requests.Timeout)
+
+class ProviderHTTPError(Exception):
+    def __init__(self, status: int, body: str, retry_after: Optional[float] = None):
+        super().__init__(f"HTTP {status}: {body[:200]}" if body else f"HTTP {status}")
+        self.status = status
+        self.body = body
+        self.retry_after = retry_after
+
+class ProviderUnavailable(Exception):
+    """Raised when a provider call is given up on: circuit open or retries exhausted."""
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header given either in seconds or as an HTTP date."""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+def _describe(e: Exception) -> str:
+    return str(e) or type(e).__name__
+
+def backoff_delay(attempt: int, retry_after: Optional[float] = None,
+                  base: float = LLM_BACKOFF_BASE, cap: float = LLM_BACKOFF_MAX) -> float:
+    """Full-jitter exponential backoff; a server-sent Retry-After is a lower bound."""
+    delay = random.uniform(0, min(cap, base * 2 ** attempt))
+    if retry_after is not None:
+        delay = max(delay, min(retry_after, LLM_RETRY_AFTER_MAX))
+    return delay
+
+class TokenBucket:
+    """Thread-safe token bucket whose rate backs off on 429s and recovers on success.
+
+    A rate of 0 disables limiting. reserve() books a token and returns how long
+    the caller has to wait for it, so async and sync callers can share a bucket.
+    """
+
+    def __init__(self, rate_per_minute: float, burst: int = LLM_RATE_BURST):
+        self.max_rate = rate_per_minute / 60.0
+        self.rate = self.max_rate
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        if self.max_rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            return max(wait, self.paused_until - now)
+
+    async def acquire(self):
+        wait = self.reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def acquire_sync(self):
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    def throttled(self, retry_after: Optional[float]):
+        """Halve the rate and hold every caller until Retry-After has passed."""
+        with self._lock:
+            if self.max_rate > 0:
+                self.rate = max(self.max_rate / 8, self.rate / 2)
+            if retry_after:
+                self.paused_until = max(self.paused_until, time.monotonic() + min(retry_after, LLM_RETRY_AFTER_MAX))
+
+    def succeeded(self):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+
+class CircuitBreaker:
+    """Fails fast after consecutive provider failures, then lets one probe through.
+
+    A probe that never reports back (cancelled, or ended without a verdict)
+    does not wedge the breaker: after another reset_timeout a new probe is let through.
+    """
+
+    def __init__(self, failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+                 reset_timeout: float = CIRCUIT_RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.state = "closed"  # closed, open or half_open
+        self.opened_at = 0.0
+        self.probe_at: Optional[float] = None  # when the outstanding half-open probe started
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "closed":
+                return True
+            now = time.monotonic()
+            if self.state == "open" and now - self.opened_at >= self.reset_timeout:
+                self.state = "half_open"
+            elif self.state != "half_open" or (self.probe_at is not None and now - self.probe_at < self.reset_timeout):
+                return False
+            self.probe_at = now
+            return True
+
+    def release_probe(self):
+        """Let the next caller probe at once when the outstanding probe was abandoned."""
+        with self._lock:
+            if self.state == "half_open":
+                self.probe_at = None
+
+    def retry_in(self) -> float:
+        started = self.probe_at if self.state == "half_open" and self.probe_at is not None else self.opened_at
+        return max(0.0, self.reset_timeout - (time.monotonic() - started))
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.state = "closed"
+            self.probe_at = None
+
+    def record_failure(self) -> bool:
+        """Count a failure; returns True if this opened the circuit."""
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                was_open = self.state == "open"
+                self.state = "open"
+                self.opened_at = time.monotonic()
+                return not was_open
+            return False
+
+class ProviderGuard:
+    """Rate limiter, retry loop and circuit breaker for one provider and API key."""
+
+    def __init__(self, name: str, rate_per_minute: float, max_retries: int = LLM_MAX_RETRIES):
+        self.name = name
+        self.bucket = TokenBucket(rate_per_minute)
+        self.breaker = CircuitBreaker()
+        self.max_retries = max_retries
+        self.stats = {"calls": 0, "retries": 0, "throttled": 0, "failures": 0, "rejected": 0}
+
+    def _check_circuit(self):
+        if not self.breaker.allow():
+            self.stats["rejected"] += 1
+            raise ProviderUnavailable(f"{self.name} circuit open, retry in {self.breaker.retry_in():.0f}s")
+
+    def _on_error(self, e: Exception, attempt: int) -> float:
+        """Record a failed attempt and return the delay before the next one, or re-raise."""
+        retry_after = None
+        if isinstance(e, ProviderHTTPError) and e.status in THROTTLED_STATUSES:
+            self.stats["throttled"] += 1
+            retry_after = e.retry_after
+            self.bucket.throttled(retry_after)
+            # Over quota, but the provider did answer, so it counts as healthy for the breaker
+            self.breaker.record_success()
+        elif (isinstance(e, ProviderHTTPError) and e.status in UNHEALTHY_STATUSES) or isinstance(e, TRANSIENT_EXCEPTIONS):
+            self.stats["failures"] += 1
+            retry_after = getattr(e, "retry_after", None)
+            if self.breaker.record_failure():
+                logger.warning(f"{self.name} circuit opened after {self.breaker.failures} failures")
+        else:
+            # The provider answered; the request itself was rejected or unparseable
+            self.breaker.record_success()
+            raise e
+        if attempt >= self.max_retries:
+            raise ProviderUnavailable(f"{self.name} failed after {attempt + 1} attempts: {_describe(e)}") from e
+        self.stats["retries"] += 1
+        delay = backoff_delay(attempt, retry_after)
+        logger.info(f"{self.name} {_describe(e)}, retry {attempt + 1}/{self.max_retries} in {delay:.2f}s")
+        return delay
+
+    def _on_success(self):
+        self.breaker.record_success()
+        self.bucket.succeeded()
+
+    async def call(self, attempt_fn: Callable[[], Awaitable[T]]) -> T:
+        """Run attempt_fn under the rate limit, retrying transient failures."""
+        self.stats["calls"] += 1
+        for attempt in range(self.max_retries + 1):
+            self._check_circuit()
+            await self.bucket.acquire()
+            try:
+                result = await attempt_fn()
+            except Exception as e:
+                await asyncio.sleep(self._on_error(e, attempt))
+                continue
+            except BaseException:
+                # Cancelled mid-call: the attempt says nothing about the provider's health
+                self.breaker.release_probe()
+                raise
+            self._on_success()
+            return result
+
+    def call_sync(self, attempt_fn: Callable[[], T]) -> T:
+        """Blocking counterpart of call() for the requests-based client."""
+        self.stats["calls"] += 1
+        for attempt in range(self.max_retries + 1):
+            self._check_circuit()
+            self.bucket.acquire_sync()
+            try:
+                result = attempt_fn()
+            except Exception as e:
+                time.sleep(self._on_error(e, attempt))
+                continue
+            except BaseException:
+                self.breaker.release_probe()
+                raise
+            self._on_success()
+            return result
+
+_guards: Dict[Tuple[str, str], ProviderGuard] = {}
+_guards_lock = threading.Lock()
+
+def get_provider_guard(provider: str, api_key: Optional[str], rate_per_minute: float) -> ProviderGuard:
+    """Return the shared guard for a provider and API key, creating it on first use."""
+    key_id = hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()[:12]
+    with _guards_lock:
+        guard = _guards.get((provider, key_id))
+        if guard is None:
+            guard = ProviderGuard(f"{provider}[{key_id[:6]}]", rate_per_minute)
+            _guards[(provider, key_id)] = guard
+        return guard
+
+def provider_stats() -> Dict[str, dict]:
+    """Snapshot of retry, throttle and circuit counters for every guard."""
+    with _guards_lock:
+        return {guard.name: {**guard.stats, "circuit": guard.breaker.state} for guard in _guards.values()}
@@ -0,0 +1,148 @@
+"""
+reference_cache.py - Persistent cache of reference validation results
+"""
+
+import atexit
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+from config import (
+    REFERENCE_CACHE_PATH, REFERENCE_CACHE_POSITIVE_TTL,
+    REFERENCE_CACHE_NEGATIVE_TTL, REFERENCE_CACHE_MAX_ENTRIES
+)
+from tracing import get_logger
+
+logger = get_logger(__name__)
+
+@dataclass
+class CachedValidation:
+    valid: bool
+    snippet: str
+    content_type: str
+    status_code: int
+    checked_at: float
+
+def normalize_url(url: str) -> str:
+    """Normalize a URL so equivalent spellings share a cache entry."""
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    port = parts.port
+    if port and not ((scheme == "http" and port == 80) or (scheme == "https" and port == 443)):
+        host = f"{host}:{port}"
+    path = parts.path.rstrip("/") or "/"
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((scheme, host, path, query, ""))
+
+class ReferenceCache:
+    def __init__(self, path: str = REFERENCE_CACHE_PATH,
+                 positive_ttl: float = REFERENCE_CACHE_POSITIVE_TTL,
+                 negative_ttl: float = REFERENCE_CACHE_NEGATIVE_TTL,
+                 max_entries: int = REFERENCE_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.positive_ttl = positive_ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        # normalized url -> last access time of cache hits not yet written
+        self._touched: Dict[str, float] = {}
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS reference_cache (
+                url TEXT PRIMARY KEY,
+                valid INTEGER NOT NULL,
+                snippet TEXT NOT NULL,
+                content_type TEXT NOT NULL,
+                status_code INTEGER NOT NULL,
+                checked_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )"""
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS reference_cache_lru ON reference_cache (last_access)"
+        )
+        self._conn.commit()
+
+    def get(self, url: str) -> CachedValidation | None:
+        """Return a fresh cached result for the URL, or None on miss/expiry.
+
+        Hits only record their access time in memory; the touches are written
+        with the next put() or on close(), so a hit never commits.
+        """
+        key = normalize_url(url)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT valid, snippet, content_type, status_code, checked_at FROM reference_cache WHERE url = ?",
+                (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            entry = CachedValidation(bool(row[0]), row[1], row[2], row[3], row[4])
+            ttl = self.positive_ttl if entry.valid else self.negative_ttl
+            if now - entry.checked_at > ttl:
+                # Left in place: the caller re-validates the URL and put() replaces it
+                return None
+            self._touched[key] = now
+            return entry
+
+    def _flush_touches(self):
+        if self._touched:
+            self._conn.executemany("UPDATE reference_cache SET last_access = ? WHERE url = ?",
+                                   [(at, key) for key, at in self._touched.items()])
+            self._touched.clear()
+
+    def put(self, url: str, valid: bool, snippet: str, content_type: str = "", status_code: int = 0):
+        """Store a validation result, write pending access times and evict least recently used entries."""
+        key = normalize_url(url)
+        now = time.time()
+        with self._lock:
+            self._touched.pop(key, None)
+            self._flush_touches()
+            self._conn.execute(
+                """INSERT OR REPLACE INTO reference_cache
+                   (url, valid, snippet, content_type, status_code, checked_at, last_access)
+                   VALUES (?, ?, ?, ?, ?, ?, ?)""",
+                (key, int(valid), snippet, content_type, status_code, now, now)
+            )
+            count = self._conn.execute("SELECT COUNT(*) FROM reference_cache").fetchone()[0]
+            if count > self.max_entries:
+                self._conn.execute(
+                    """DELETE FROM reference_cache WHERE url IN (
+                           SELECT url FROM reference_cache ORDER BY last_access ASC LIMIT ?
+                       )""",
+                    (count - self.max_entries,)
+                )
+            self._conn.commit()
+
+    def close(self):
+        """Write pending access times and close the underlying database connection."""
+        with self._lock:
+            self._flush_touches()
+            self._conn.commit()
+            self._conn.close()
+
+_default_cache: ReferenceCache | None = None
+
+def get_reference_cache() -> ReferenceCache | None:
+    """Return the process-wide reference cache, or None when disabled."""
+    global _default_cache
+    if not REFERENCE_CACHE_PATH:
+        return None
+    if _default_cache is None:
+        try:
+            _default_cache = ReferenceCache()
+            # Writes the access times of hits that no later put() committed
+            atexit.register(_default_cache.close)
+        except sqlite3.Error as e:
+            logger.warning(f"Reference cache unavailable: {e}")
+            return None
+    return _default_cache
@@ -0,0 +1,73 @@
+"""
+reference_verifier.py - Concurrent, bounded verification of reference URLs
+"""
+
+import asyncio
+import time
+from typing import Dict, List, Tuple
+from urllib.parse import urlparse
+from config import VERIFY_MAX_CONCURRENCY, VERIFY_PER_HOST_LIMIT, VERIFY_BATCH_DEADLINE
+from web_loader import avalidate_reference
+from tracing import get_logger, span
+
+logger = get_logger(__name__)
+
+UNVERIFIED_SNIPPET = "Unverified: verification deadline exceeded"
+
+class ReferenceVerifier:
+    def __init__(self, max_concurrency: int = VERIFY_MAX_CONCURRENCY,
+                 per_host_limit: int = VERIFY_PER_HOST_LIMIT,
+                 deadline: float = VERIFY_BATCH_DEADLINE):
+        self.max_concurrency = max_concurrency
+        self.per_host_limit = per_host_limit
+        self.deadline = deadline
+        self._global_limit: asyncio.Semaphore | None = None
+        self._host_limits: Dict[str, asyncio.Semaphore] = {}
+
+    def _host_limit(self, url: str) -> asyncio.Semaphore:
+        """Get the semaphore bounding requests to the URL's host."""
+        host = (urlparse(url).hostname or "").lower()
+        if host not in self._host_limits:
+            self._host_limits[host] = asyncio.Semaphore(self.per_host_limit)
+        return self._host_limits[host]
+
+    async def _verify_one(self, url: str) -> Tuple[bool, str]:
+        """Verify a single URL under the global and per-host limits."""
+        async with self._global_limit:
+            async with self._host_limit(url):
+                with span("verify_reference", host=urlparse(url).hostname or "", items=1) as verify_span:
+                    is_valid, snippet = await avalidate_reference(url)
+                    verify_span.set(valid=is_valid, bytes=len(snippet))
+                    return is_valid, snippet
+
+    async def verify(self, urls: List[str]) -> List[Tuple[str, bool, str]]:
+        """Verify all URLs concurrently within the batch deadline.
+
+        Returns (url, is_valid, snippet) in input order. URLs still pending
+        when the deadline expires are reported as invalid/unverified.
+        """
+        if not urls:
+            return []
+        if self._global_limit is None:
+            self._global_limit = asyncio.Semaphore(self.max_concurrency)
+
+        unique = list(dict.fromkeys(urls))
+        start = time.perf_counter()
+        tasks = {url: asyncio.ensure_future(self._verify_one(url)) for url in unique}
+        done, pending = await asyncio.wait(tasks.values(), timeout=self.deadline)
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+
+        results: Dict[str, Tuple[bool, str]] = {}
+        for url, task in tasks.items():
+            if task in pending:
+                results[url] = (False, UNVERIFIED_SNIPPET)
+            elif task.exception() is not None:
+                results[url] = (False, str(task.exception()))
+            else:
+                results[url] = task.result()
+        logger.debug("Verified %s URLs in %.2fs (%s unverified at deadline)",
+                     len(unique), time.perf_counter() - start, len(pending))
+        return [(url, *results[url]) for url in urls]
@@ -0,0 +1,279 @@
+"""
+server.py - Long-running HTTP service that runs debates as queued jobs
+
+    POST /debates               {"topic": "...", "rounds": 1}  -> 202 {"id": ..., "events": ...}
+    GET  /debates/{id}          job status, history so far and the final answer once done
+    GET  /debates/{id}/events   server-sent events: queued, started, round (one per stage
+                                result), then result or error
+    GET  /health                queue depth and running jobs
+    GET  /metrics               Prometheus text exposition of stage timings (TRACING=1)
+
+Jobs wait in a bounded queue and a fixed number of workers run them. The
+embedder, evidence index, provider sessions and caches are created once and
+shared by every job; each job gets its own DebateEngine.
+
+    python server.py --port 8080 --concurrency 4
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+# Set before transformers is imported so TensorFlow is never loaded
+os.environ['TF_ENABLE_ONEDNN_OPTS'] = '0'
+os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'
+os.environ.setdefault('USE_TF', '0')
+
+from aiohttp import web
+from debate_engine import DebateEngine
+from evidence_index import EvidenceIndex
+from evidence_retriever import LazyEmbeddings
+from output_formatter import serialize_history, serialize_round
+from debate_history import HistoryRecord
+from llm_calls import close_provider_sessions
+from web_loader import close_http_session
+from config import (
+    SERVER_HOST, SERVER_PORT, SERVER_MAX_CONCURRENT_DEBATES, SERVER_MAX_QUEUED_JOBS,
+    SERVER_MAX_RETAINED_JOBS, SERVER_MAX_ROUNDS, EMBEDDER_BACKGROUND_WARMUP
+)
+from tracing import METRICS, get_logger
+from workers import loop_monitor, shutdown_workers
+
+logger = get_logger(__name__)
+
+class DebateJob:
+    """One queued debate plus the event log its subscribers are replayed from."""
+
+    def __init__(self, topic: str, rounds: int):
+        self.id = uuid.uuid4().hex
+        self.topic = topic
+        self.rounds = rounds
+        self.status = "queued"
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.history: List[Dict] = []
+        self.final_answer: Optional[str] = None
+        self.error: Optional[str] = None
+        self.events: List[tuple] = []
+        self._subscribers: List[asyncio.Queue] = []
+
+    @property
+    def done(self) -> bool:
+        return self.status in ("completed", "failed")
+
+    def emit(self, event: str, data: dict):
+        """Record an event and push it to every connected client."""
+        self.events.append((event, data))
+        for queue in self._subscribers:
+            queue.put_nowait((event, data))
+
+    def subscribe(self) -> asyncio.Queue:
+        """Return a queue pre-filled with past events that receives new ones."""
+        queue: asyncio.Queue = asyncio.Queue()
+        for item in self.events:
+            queue.put_nowait(item)
+        self._subscribers.append(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        if queue in self._subscribers:
+            self._subscribers.remove(queue)
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "topic": self.topic,
+            "rounds": self.rounds,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "history": self.history,
+            "final_answer": self.final_answer,
+            "error": self.error,
+        }
+
+class DebateService:
+    def __init__(self, concurrency: int = SERVER_MAX_CONCURRENT_DEBATES,
+                 max_queued: int = SERVER_MAX_QUEUED_JOBS):
+        self.concurrency = concurrency
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queued)
+        self.jobs: "OrderedDict[str, DebateJob]" = OrderedDict()
+        self.running = 0
+        self.workers: List[asyncio.Task] = []
+        self.warmup: Optional[asyncio.Task] = None
+        # Shared by every job: one model load, one index on disk
+        self.embedder = LazyEmbeddings()
+        self.evidence_index = EvidenceIndex(self.embedder)
+
+    async def start(self, app: web.Application):
+        # Lexical retrieval never embeds, so there is no model to warm up
+        if EMBEDDER_BACKGROUND_WARMUP and self.evidence_index.dense:
+            self.warmup = asyncio.create_task(asyncio.to_thread(self.embedder.load))
+            self.warmup.add_done_callback(self._warmup_done)
+        self.workers = [asyncio.create_task(self._worker(i)) for i in range(self.concurrency)]
+        loop_monitor()
+        logger.info(f"Debate service started with {self.concurrency} workers")
+
+    @staticmethod
+    def _warmup_done(task: asyncio.Task):
+        if not task.cancelled() and task.exception() is not None:
+            # load_default_embedder already logged the cause; the load is retried by the first job that embeds
+            logger.warning("Embedder warm-up failed, it will be retried on first use")
+
+    async def stop(self, app: web.Application):
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        await close_provider_sessions()
+        await close_http_session()
+        await asyncio.to_thread(shutdown_workers)
+        logger.info("Debate service stopped")
+
+    def submit(self, topic: str, rounds: int) -> DebateJob:
+        job = DebateJob(topic, rounds)
+        self.queue.put_nowait(job)  # raises QueueFull when the backlog is at its limit
+        self.jobs[job.id] = job
+        job.emit("queued", {"id": job.id, "position": self.queue.qsize()})
+        self._prune()
+        return job
+
+    def _prune(self):
+        """Drop the oldest finished jobs once more than the retention limit are kept."""
+        excess = len(self.jobs) - SERVER_MAX_RETAINED_JOBS
+        for job_id in [job_id for job_id, job in self.jobs.items() if job.done][:max(excess, 0)]:
+            del self.jobs[job_id]
+
+    async def _worker(self, worker_id: int):
+        while True:
+            job = await self.queue.get()
+            try:
+                await self._run_job(job)
+            finally:
+                self.queue.task_done()
+
+    async def _run_job(self, job: DebateJob):
+        def on_round(record: HistoryRecord):
+            entry = serialize_round(record)
+            job.history.append(entry)
+            job.emit("round", entry)
+
+        self.running += 1
+        job.status = "running"
+        job.started_at = time.time()
+        job.emit("started", {"id": job.id})
+        logger.debug("Job %s: starting '%s'", job.id, job.topic)
+        try:
+            # Jobs only live in memory, so there is nothing to resume them from
+            engine = DebateEngine(rounds=job.rounds, embedder=self.embedder,
+                                  evidence_index=self.evidence_index, round_sink=on_round, checkpoint_dir="")
+            job.final_answer, history = await engine.run_debate(job.topic)
+            job.history = serialize_history(history)
+            job.status = "completed"
+            job.emit("result", {"id": job.id, "final_answer": job.final_answer})
+        except Exception as e:
+            logger.error(f"Job {job.id} failed: {e}")
+            job.status = "failed"
+            job.error = str(e)
+            job.emit("error", {"id": job.id, "error": job.error})
+        finally:
+            job.finished_at = time.time()
+            self.running -= 1
+            logger.debug("Job %s: %s in %.1fs", job.id, job.status, job.finished_at - job.started_at)
+
+    # HTTP handlers
+
+    async def create_debate(self, request: web.Request) -> web.Response:
+        try:
+            payload = await request.json()
+        except Exception:
+            return web.json_response({"error": "Body must be a JSON object"}, status=400)
+        topic = str(payload.get("topic", "")).strip() if isinstance(payload, dict) else ""
+        if not topic:
+            return web.json_response({"error": "Missing 'topic'"}, status=400)
+        try:
+            rounds = int(payload.get("rounds", 1))
+        except (TypeError, ValueError):
+            return web.json_response({"error": "'rounds' must be an integer"}, status=400)
+        if not 1 <= rounds <= SERVER_MAX_ROUNDS:
+            return web.json_response({"error": f"'rounds' must be between 1 and {SERVER_MAX_ROUNDS}"}, status=400)
+        try:
+            job = self.submit(topic, rounds)
+        except asyncio.QueueFull:
+            return web.json_response({"error": "Too many queued debates, retry later"}, status=503,
+                                     headers={"Retry-After": "5"})
+        return web.json_response(
+            {"id": job.id, "status": job.status, "events": f"/debates/{job.id}/events"}, status=202
+        )
+
+    def _job_or_404(self, request: web.Request) -> DebateJob:
+        job = self.jobs.get(request.match_info["job_id"])
+        if job is None:
+            raise web.HTTPNotFound(text=json.dumps({"error": "Unknown debate id"}), content_type="application/json")
+        return job
+
+    async def get_debate(self, request: web.Request) -> web.Response:
+        return web.json_response(self._job_or_404(request).to_dict())
+
+    async def debate_events(self, request: web.Request) -> web.StreamResponse:
+        job = self._job_or_404(request)
+        resp = web.StreamResponse(headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"})
+        await resp.prepare(request)
+        queue = job.subscribe()
+        try:
+            while True:
+                event, data = await queue.get()
+                await resp.write(f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n".encode("utf-8"))
+                if event in ("result", "error"):
+                    break
+        except ConnectionResetError:
+            logger.debug("Job %s: event client disconnected", job.id)
+        finally:
+            job.unsubscribe(queue)
+        return resp
+
+    async def metrics(self, request: web.Request) -> web.Response:
+        return web.Response(body=METRICS.prometheus_text().encode("utf-8"),
+                            headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
+
+    async def health(self, request: web.Request) -> web.Response:
+        return web.json_response({
+            "queued": self.queue.qsize(),
+            "running": self.running,
+            "workers": self.concurrency,
+            "jobs": len(self.jobs),
+            "embedder_loaded": self.embedder.loaded,
+            "evidence_chunks": len(self.evidence_index),
+            "event_loop": loop_monitor().total.to_dict(),
+        })
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.add_routes([
+            web.post("/debates", self.create_debate),
+            web.get("/debates/{job_id}", self.get_debate),
+            web.get("/debates/{job_id}/events", self.debate_events),
+            web.get("/health", self.health),
+            web.get("/metrics", self.metrics),
+        ])
+        app.on_startup.append(self.start)
+        app.on_cleanup.append(self.stop)
+        return app
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve debates over HTTP with server-sent round updates")
+    parser.add_argument("--host", default=SERVER_HOST)
+    parser.add_argument("--port", type=int, default=SERVER_PORT)
+    parser.add_argument("--concurrency", type=int, default=SERVER_MAX_CONCURRENT_DEBATES, help="debates run at once")
+    args = parser.parse_args()
+    service = DebateService(concurrency=max(1, args.concurrency))
+    web.run_app(service.app(), host=args.host, port=args.port)
+
+if __name__ == "__main__":
+    main()
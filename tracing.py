@@ -0,0 +1,282 @@
+"""
+tracing.py - Leveled logging, per-debate span traces and Prometheus-style metrics
+
+Spans time a block and carry byte and item counts:
+
+    with span("faiss_add", items=len(splits)) as s:
+        added = index.add_documents(splits)
+        s.set(new_chunks=added)
+
+With TRACING off, span() returns a shared no-op object and nothing is recorded.
+With it on, every span feeds the process-wide metrics registry and, inside
+debate_trace(), the current debate's trace, which is written to TRACE_DIR as
+JSON together with a metrics.prom text exposition.
+"""
+
+import contextvars
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+from config import LOG_LEVEL, TRACING_ENABLED, TRACE_DIR
+
+LOG_LEVELS = {
+    "DEBUG": logging.DEBUG,
+    "INFO": logging.INFO,
+    "WARNING": logging.WARNING,
+    "ERROR": logging.ERROR,
+    "OFF": logging.CRITICAL + 10,
+}
+
+_log_root = logging.getLogger("debate")
+
+def configure_logging(level: str = LOG_LEVEL):
+    """Send the debate loggers to stdout as '[LEVEL] message' at the given level."""
+    if level not in LOG_LEVELS:
+        raise ValueError(f"LOG_LEVEL must be one of {tuple(LOG_LEVELS)}, got {level!r}")
+    _log_root.setLevel(LOG_LEVELS[level])
+    if not _log_root.handlers:
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(logging.Formatter("[%(levelname)s] %(message)s"))
+        _log_root.addHandler(handler)
+    _log_root.propagate = False
+
+def get_logger(module: str) -> logging.Logger:
+    return _log_root.getChild(module)
+
+configure_logging()
+
+_current_trace: contextvars.ContextVar[Optional["Trace"]] = contextvars.ContextVar("debate_trace", default=None)
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("debate_span", default=None)
+
+class _NullSpan:
+    """Stand-in returned by span() when tracing is off."""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+    def add(self, key: str, amount: float):
+        pass
+
+NULL_SPAN = _NullSpan()
+
+class Span:
+    __slots__ = ("name", "attrs", "id", "parent", "start", "duration", "thread", "_token")
+
+    def __init__(self, name: str, attrs: dict):
+        self.name = name
+        self.attrs = attrs
+        self.id = uuid.uuid4().hex[:12]
+        self.parent: Optional[str] = None
+        self.start = 0.0
+        self.duration = 0.0
+        self.thread = ""
+
+    def __enter__(self):
+        parent = _current_span.get()
+        self.parent = parent.id if parent is not None else None
+        self.thread = threading.current_thread().name
+        self._token = _current_span.set(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration = time.perf_counter() - self.start
+        _current_span.reset(self._token)
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        METRICS.observe(self.name, self.duration, self.attrs.get("bytes", 0), self.attrs.get("items", 0))
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.record(self)
+        return False
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def add(self, key: str, amount: float):
+        self.attrs[key] = self.attrs.get(key, 0) + amount
+
+def span(name: str, **attrs):
+    """Time a block as a named span; a no-op when tracing is disabled."""
+    if not TRACING_ENABLED:
+        return NULL_SPAN
+    return Span(name, attrs)
+
+class Trace:
+    """All spans recorded while one debate ran."""
+
+    def __init__(self, name: str, attrs: dict):
+        self.id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        self.name = name
+        self.attrs = attrs
+        self.started_at = time.time()
+        self.t0 = time.perf_counter()
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+
+    def record(self, finished: Span):
+        with self._lock:
+            self.spans.append(finished)
+
+    def summary(self) -> Dict[str, dict]:
+        """Totals per span name; concurrent spans overlap, so totals can exceed wall time."""
+        rows: Dict[str, dict] = {}
+        for s in self.spans:
+            row = rows.setdefault(s.name, {"count": 0, "total_seconds": 0.0, "max_seconds": 0.0, "bytes": 0, "items": 0})
+            row["count"] += 1
+            row["total_seconds"] += s.duration
+            row["max_seconds"] = max(row["max_seconds"], s.duration)
+            row["bytes"] += s.attrs.get("bytes", 0)
+            row["items"] += s.attrs.get("items", 0)
+        return rows
+
+    def breakdown(self) -> List[dict]:
+        """Direct children of the root span in start order, with their share of its wall time."""
+        roots = [s for s in self.spans if s.parent is None]
+        if not roots:
+            return []
+        root = max(roots, key=lambda s: s.duration)
+        children = sorted((s for s in self.spans if s.parent == root.id), key=lambda s: s.start)
+        return [
+            {
+                "name": s.name,
+                **{k: v for k, v in s.attrs.items() if k in ("stage", "round")},
+                "seconds": s.duration,
+                "percent": 100 * s.duration / root.duration if root.duration else 0.0,
+            }
+            for s in children
+        ]
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            spans = list(self.spans)
+        return {
+            "id": self.id,
+            "name": self.name,
+            "attrs": self.attrs,
+            "started_at": self.started_at,
+            "wall_seconds": time.perf_counter() - self.t0,
+            "breakdown": self.breakdown(),
+            "summary": self.summary(),
+            "spans": [
+                {
+                    "id": s.id,
+                    "parent": s.parent,
+                    "name": s.name,
+                    "start": s.start - self.t0,
+                    "duration": s.duration,
+                    "thread": s.thread,
+                    "attrs": s.attrs,
+                }
+                for s in sorted(spans, key=lambda s: s.start)
+            ],
+        }
+
+    def save(self, directory: str = TRACE_DIR) -> str:
+        """Write the trace JSON and refresh metrics.prom; returns the trace path."""
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"trace-{self.id}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, indent=2, default=str)
+        METRICS.write_textfile(os.path.join(directory, "metrics.prom"))
+        return path
+
+@contextmanager
+def debate_trace(name: str, **attrs):
+    """Collect spans into a new Trace for the duration of the block and save it after."""
+    if not TRACING_ENABLED:
+        yield None
+        return
+    trace = Trace(name, attrs)
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+        METRICS.traces += 1
+        path = trace.save()
+        get_logger("tracing").info(f"Trace written to '{os.path.abspath(path)}'")
+
+@contextmanager
+def use_trace(trace: Optional[Trace]):
+    """Attribute spans in the block to an existing trace (e.g. formatting after run_debate)."""
+    if trace is None:
+        yield
+        return
+    token = _current_trace.set(trace)
+    try:
+        yield
+    finally:
+        _current_trace.reset(token)
+
+class MetricsRegistry:
+    """Process-wide span histograms and byte/item counters."""
+
+    BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+    def __init__(self):
+        self.traces = 0
+        self._lock = threading.Lock()
+        self._counts: Dict[str, List[int]] = defaultdict(lambda: [0] * len(self.BUCKETS))
+        self._sums: Dict[str, float] = defaultdict(float)
+        self._totals: Dict[str, int] = defaultdict(int)
+        self._bytes: Dict[str, int] = defaultdict(int)
+        self._items: Dict[str, int] = defaultdict(int)
+
+    def observe(self, name: str, seconds: float, nbytes: int = 0, items: int = 0):
+        with self._lock:
+            buckets = self._counts[name]
+            for i, bound in enumerate(self.BUCKETS):
+                if seconds <= bound:
+                    buckets[i] += 1
+            self._sums[name] += seconds
+            self._totals[name] += 1
+            self._bytes[name] += nbytes
+            self._items[name] += items
+
+    def prometheus_text(self) -> str:
+        """Render the registry in the Prometheus text exposition format."""
+        lines = [
+            "# HELP debate_span_duration_seconds Duration of traced debate stages.",
+            "# TYPE debate_span_duration_seconds histogram",
+        ]
+        with self._lock:
+            for name in sorted(self._totals):
+                label = f'span="{name}"'
+                for bound, count in zip(self.BUCKETS, self._counts[name]):
+                    lines.append(f'debate_span_duration_seconds_bucket{{{label},le="{bound}"}} {count}')
+                lines.append(f'debate_span_duration_seconds_bucket{{{label},le="+Inf"}} {self._totals[name]}')
+                lines.append(f"debate_span_duration_seconds_sum{{{label}}} {self._sums[name]:.6f}")
+                lines.append(f"debate_span_duration_seconds_count{{{label}}} {self._totals[name]}")
+            lines += ["# HELP debate_span_bytes_total Bytes processed by traced stages.",
+                      "# TYPE debate_span_bytes_total counter"]
+            lines += [f'debate_span_bytes_total{{span="{name}"}} {self._bytes[name]}' for name in sorted(self._totals)]
+            lines += ["# HELP debate_span_items_total Items processed by traced stages.",
+                      "# TYPE debate_span_items_total counter"]
+            lines += [f'debate_span_items_total{{span="{name}"}} {self._items[name]}' for name in sorted(self._totals)]
+            lines += ["# HELP debate_traces_total Debates traced by this process.",
+                      "# TYPE debate_traces_total counter",
+                      f"debate_traces_total {self.traces}"]
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path: str):
+        """Write the exposition atomically, e.g. for the node_exporter textfile collector."""
+        with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+            f.write(self.prometheus_text())
+        os.replace(f"{path}.tmp", path)
+
+METRICS = MetricsRegistry()
@@ -5,54 +5,196 @@ utils.py - Utility functions for the debate system
 import time
 import json
 import re
-import tldextract
+import threading
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Dict, List, Tuple
 from urllib.parse import urlparse
-from config import HIGH_AUTHORITY_DOMAINS
-
-def domain_from_url(url: str) -> str:
-    """Extract domain from a URL."""
-    try:
-        ext = tldextract.extract(url)
-        if ext.domain and ext.suffix:
-            return f"{ext.domain}.{ext.suffix}".lower()
-        return ext.domain.lower() if ext.domain else ""
-    except Exception:
-        return ""
+from config import JSON_PARSE_CACHE_SIZE
+from tracing import get_logger
+
+logger = get_logger(__name__)
+
+# Keys a stage's JSON object must carry; each entry lists alternatives, any one of which is enough.
+# "response" is the model's trailing block as read by llm_calls, before the stage is known, and the
+# *_response stages are the provider envelopes around it.
+STAGE_SCHEMAS: Dict[str, Tuple[frozenset, ...]] = {
+    "initial_suggestion": (frozenset({"answer"}),),
+    "refinement": (frozenset({"answer"}),),
+    "critique": (frozenset({"critique"}),),
+    "finalization": (frozenset({"final_answer"}),),
+    "response": (frozenset({"answer"}), frozenset({"critique"}), frozenset({"final_answer"})),
+    "gemini_response": (frozenset({"candidates"}),),
+    "deepseek_response": (frozenset({"choices"}),),
+}
+FIELD_TYPES = {
+    "answer": str,
+    "critique": str,
+    "final_answer": str,
+    "references": list,
+    "candidates": list,
+    "choices": list,
+}
+
+def matches_schema(obj, stage: str) -> bool:
+    """Check a decoded object against its stage's required keys and field types."""
+    if not isinstance(obj, dict):
+        return False
+    schema = STAGE_SCHEMAS.get(stage, STAGE_SCHEMAS["response"])
+    if not any(keys <= obj.keys() for keys in schema):
+        return False
+    return all(isinstance(obj[key], kind) for key, kind in FIELD_TYPES.items() if key in obj)
 
 def safe_json_parse(s: str, stage: str = "unknown") -> dict | None:
-    """Safely parse JSON string, return None on failure."""
-    try:
-        # Look for a complete JSON object
-        json_match = re.search(r'\{[\s\S]*\}', s)
-        if not json_match:
-            print(f"[DEBUG] No JSON block found in {stage} response: {s[:100]}...")
-            return None
-        json_str = json_match.group(0)
-        parsed = json.loads(json_str)
-        if not isinstance(parsed, dict):
-            print(f"[DEBUG] Parsed {stage} response is not a dict: {json_str[:100]}...")
-            return None
-        # Validate required keys based on stage
-        required_keys = {"answer"} if stage in ["initial_suggestion", "refinement"] else {"critique"} if stage == "critique" else {"final_answer"}
-        if not required_keys.issubset(parsed.keys()):
-            print(f"[DEBUG] Missing required keys in {stage} JSON: {json_str[:100]}...")
-            return None
-        return parsed
-    except json.JSONDecodeError as e:
-        print(f"[DEBUG] JSON decode error in {stage} response: {e}, input: {s[:100]}...")
+    """Return the last JSON object in s that fits the stage schema, or None.
+
+    Results are memoized per (text, stage), so the same payload is only scanned
+    and decoded once; callers must treat the returned dict as read-only.
+    """
+    if not isinstance(s, str):
+        return None
+    return _parse_cached(s, stage)
+
+@lru_cache(maxsize=JSON_PARSE_CACHE_SIZE)
+def _parse_cached(s: str, stage: str) -> dict | None:
+    scanner = IncrementalJSONScanner()
+    scanner.feed(s)
+    if not scanner.spans:
+        logger.debug("No JSON block found in %s response: %s...", stage, s[:100])
         return None
-    except Exception as e:
-        print(f"[DEBUG] Unexpected error parsing JSON in {stage}: {e}, input: {s[:100]}...")
+    parsed = scanner.last_object(stage)
+    if parsed is None:
+        logger.debug("No valid %s JSON among %s candidates: %s...", stage, len(scanner.spans), s[:100])
+    return parsed
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token) for metrics and budgets."""
+    return (len(text) + 3) // 4
+
+_STRUCTURAL = re.compile(r'[{}"\\\n]')
+_OBJECT_START = re.compile(r'\{\s*["}]')
+
+def _find_schema(obj, stage: str):
+    """obj itself if it fits the stage schema, else the last nested object that does (already decoded)."""
+    stack = [obj]
+    while stack:
+        node = stack.pop()
+        if matches_schema(node, stage):
+            return node
+        if isinstance(node, dict):
+            stack.extend(node.values())
+        elif isinstance(node, list):
+            stack.extend(node)
+    return None
+
+class IncrementalJSONScanner:
+    """Find balanced JSON objects in text that may arrive in chunks.
+
+    feed() visits each brace, quote, backslash and newline once (a regex skips
+    everything else) and records the span of every object that closes, nested
+    ones included; nothing is decoded while scanning. A JSON string cannot hold
+    a raw newline, so one ends any string a stray prose quote opened.
+
+    last_object() decodes the outermost candidates from the latest closing
+    brace backwards and returns the first that fits the stage schema, so prose
+    after the JSON block does not hide it. Spans that cannot start an object
+    (a prose brace not followed by a key) are skipped in favour of the objects
+    inside them; objects nested in a candidate are never decoded on their own,
+    so each character is decoded at most once.
+    """
+
+    def __init__(self):
+        self.buffer: List[str] = []
+        self.length = 0
+        self.opens: List[int] = []
+        self.in_string = False
+        self.escape = False
+        self.spans: List[Tuple[int, int]] = []
+
+    def feed(self, chunk: str):
+        self.buffer.append(chunk)
+        base = self.length
+        self.length += len(chunk)
+        skip = base
+        if self.escape:
+            # A backslash ended the previous chunk; this chunk's first character is escaped
+            skip = base + 1
+            self.escape = False
+        for match in _STRUCTURAL.finditer(chunk):
+            pos = base + match.start()
+            if pos < skip:
+                continue
+            ch = match.group()
+            if ch == "\n":
+                self.in_string = False
+            elif self.in_string:
+                if ch == "\\":
+                    skip = pos + 2
+                    self.escape = skip > self.length
+                elif ch == '"':
+                    self.in_string = False
+            elif ch == '"':
+                # Quotes in prose outside any object are not JSON strings
+                if self.opens:
+                    self.in_string = True
+            elif ch == "{":
+                self.opens.append(pos)
+            elif ch == "}" and self.opens:
+                self.spans.append((self.opens.pop(), pos + 1))
+
+    def last_object(self, stage: str = "response") -> dict | None:
+        text = self.text
+        limit = len(text)  # start of the last candidate tried; spans ending after it are nested in it
+        for start, end in reversed(self.spans):
+            if end > limit or not _OBJECT_START.match(text, start):
+                continue
+            limit = start
+            try:
+                parsed = json.loads(text[start:end])
+            except (json.JSONDecodeError, RecursionError):
+                continue
+            found = _find_schema(parsed, stage)
+            if found is not None:
+                return found
         return None
 
+    @property
+    def text(self) -> str:
+        if len(self.buffer) > 1:
+            self.buffer = ["".join(self.buffer)]
+        return self.buffer[0] if self.buffer else ""
+
 def now_ts() -> float:
     """Return current timestamp."""
     return time.time()
 
-def calculate_authority_score(domain: str) -> int:
-    """Calculate authority score for a domain."""
-    if domain in HIGH_AUTHORITY_DOMAINS:
-        return 3
-    elif any(auth_domain in domain for auth_domain in HIGH_AUTHORITY_DOMAINS):
-        return 2
-    return 1
\ No newline at end of file
+class PhaseTimer:
+    """Collect named wall-clock phases (imports, initialization) for a startup report."""
+
+    def __init__(self):
+        self.phases: List[Tuple[str, float, str]] = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.phases.append((name, elapsed, threading.current_thread().name))
+
+    def report(self) -> str:
+        """Format the recorded phases, flagging those run off the main thread."""
+        with self._lock:
+            phases = list(self.phases)
+        lines = ["Startup report:"]
+        for name, elapsed, thread in phases:
+            where = "" if thread == "MainThread" else " (background)"
+            lines.append(f"  {name:<36}{elapsed:>8.2f}s{where}")
+        main_total = sum(elapsed for _, elapsed, thread in phases if thread == "MainThread")
+        lines.append(f"  {'total on main thread':<36}{main_total:>8.2f}s")
+        return "\n".join(lines)
+
+STARTUP_TIMER = PhaseTimer()
@@ -3,56 +3,176 @@ web_loader.py - Web content loader for RAG system
 """
 
 import asyncio
-import requests
+import ssl
+import time
+import aiohttp
 import certifi
-from bs4 import BeautifulSoup
 from langchain.schema import Document
-from config import HTTP_TIMEOUT
+from typing import Dict, List
+from config import HTTP_TIMEOUT, LOADER_MAX_BYTES, LOADER_MAX_CONCURRENCY, LOADER_PER_HOST_LIMIT, LOADER_ALLOWED_CONTENT_TYPES
 from urllib.parse import urlparse
+from reference_cache import get_reference_cache
+from html_extract import extract_text
+from workers import run_cpu
+from tracing import get_logger, span
 
-def validate_reference(url: str) -> tuple[bool, str]:
-    """Validate a reference URL and return a snippet."""
+logger = get_logger(__name__)
+
+SNIPPET_CHARS = 1500
+
+_session: aiohttp.ClientSession | None = None
+_session_loop: asyncio.AbstractEventLoop | None = None
+
+def _new_session() -> aiohttp.ClientSession:
+    connector = aiohttp.TCPConnector(ssl=ssl.create_default_context(cafile=certifi.where()))
+    return aiohttp.ClientSession(
+        connector=connector,
+        timeout=aiohttp.ClientTimeout(total=HTTP_TIMEOUT)
+    )
+
+def get_http_session() -> aiohttp.ClientSession:
+    """Return the shared aiohttp session for web fetches on the running loop."""
+    global _session, _session_loop
+    loop = asyncio.get_running_loop()
+    if _session is None or _session.closed or _session_loop is not loop:
+        _session = _new_session()
+        _session_loop = loop
+    return _session
+
+async def close_http_session():
+    """Close the shared web session if one is open."""
+    global _session, _session_loop
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
+    _session_loop = None
+
+async def _fetch_reference(url: str, session: aiohttp.ClientSession) -> tuple[bool, str, str, int]:
+    """Check a reference over the network: (valid, snippet, content type, status)."""
     try:
-        if not urlparse(url).scheme:
-            return (False, "Invalid URL (no scheme)")
-        
-        resp = requests.head(url, allow_redirects=True, timeout=HTTP_TIMEOUT, verify=certifi.where())
-        if 200 <= resp.status_code < 400:
+        async with session.head(url, allow_redirects=True) as resp:
+            status = resp.status
+        if 200 <= status < 400:
             try:
-                g = requests.get(url, stream=True, timeout=HTTP_TIMEOUT, verify=certifi.where())
-                ctype = g.headers.get("Content-Type", "")
-                snippet = ""
-                if "text" in ctype or "html" in ctype or ctype == "":
-                    snippet = g.text[:1500]
-                else:
-                    snippet = f"Content-Type: {ctype}"
-                return (True, snippet)
+                async with session.get(url) as g:
+                    ctype = g.headers.get("Content-Type", "")
+                    snippet = ""
+                    if "text" in ctype or "html" in ctype or ctype == "":
+                        raw = await g.content.read(SNIPPET_CHARS * 4)
+                        snippet = raw.decode(g.charset or "utf-8", errors="ignore")[:SNIPPET_CHARS]
+                    else:
+                        snippet = f"Content-Type: {ctype}"
+                    return (True, snippet, ctype, g.status)
             except Exception as e:
-                return (True, f"Reachable (HEAD OK) but GET failed: {e}")
+                return (True, f"Reachable (HEAD OK) but GET failed: {e}", "", status)
         else:
-            return (False, f"HEAD returned status {resp.status_code}")
+            return (False, f"HEAD returned status {status}", "", status)
+    except asyncio.TimeoutError:
+        return (False, "Timed out", "", 0)
     except Exception as e:
-        return (False, str(e))
+        return (False, str(e), "", 0)
+
+async def _validate_reference(url: str, session: aiohttp.ClientSession) -> tuple[bool, str]:
+    if not urlparse(url).scheme:
+        return (False, "Invalid URL (no scheme)")
+    cache = get_reference_cache()
+    # sqlite reads and commits run off the event loop
+    if cache is not None:
+        hit = await asyncio.to_thread(cache.get, url)
+        if hit is not None:
+            return (hit.valid, hit.snippet)
+    is_valid, snippet, ctype, status = await _fetch_reference(url, session)
+    if cache is not None:
+        await asyncio.to_thread(cache.put, url, is_valid, snippet, ctype, status)
+    return (is_valid, snippet)
+
+async def avalidate_reference(url: str) -> tuple[bool, str]:
+    """Validate a reference URL and return a snippet, using the shared web session."""
+    return await _validate_reference(url, get_http_session())
+
+def validate_reference(url: str) -> tuple[bool, str]:
+    """Blocking counterpart of avalidate_reference for callers without an event loop."""
+    async def run():
+        async with _new_session() as session:
+            return await _validate_reference(url, session)
+    return asyncio.run(run())
 
 class SimpleWebLoader:
-    def __init__(self, urls):
+    def __init__(self, urls, max_bytes: int = LOADER_MAX_BYTES,
+                 max_concurrency: int = LOADER_MAX_CONCURRENCY,
+                 per_host_limit: int = LOADER_PER_HOST_LIMIT):
         self.urls = urls
+        self.max_bytes = max_bytes
+        self.max_concurrency = max_concurrency
+        self.per_host_limit = per_host_limit
+        self.stats: List[dict] = []
         
+    async def _read_capped(self, resp: aiohttp.ClientResponse) -> tuple[bytes, bool]:
+        """Stream the body until the byte budget is reached."""
+        chunks = []
+        size = 0
+        async for chunk in resp.content.iter_chunked(64 * 1024):
+            chunks.append(chunk)
+            size += len(chunk)
+            if size >= self.max_bytes:
+                return b"".join(chunks)[:self.max_bytes], True
+        return b"".join(chunks), False
+    
+    async def _load_one(self, url: str, global_limit: asyncio.Semaphore,
+                        host_limits: Dict[str, asyncio.Semaphore]) -> Document | None:
+        """Fetch and parse a single URL, recording its timing stats."""
+        host = (urlparse(url).hostname or "").lower()
+        host_limit = host_limits.setdefault(host, asyncio.Semaphore(self.per_host_limit))
+        stat = {"url": url, "status": 0, "bytes": 0, "truncated": False, "skipped": "", "elapsed": 0.0,
+                "chars": 0, "extract_seconds": 0.0}
+        start = time.perf_counter()
+        try:
+            async with global_limit, host_limit:
+                with span("page_fetch", host=host, items=1) as fetch_span:
+                    logger.debug("Loading URL: %s", url)
+                    async with get_http_session().get(url) as resp:
+                        stat["status"] = resp.status
+                        fetch_span.set(status=resp.status)
+                        ctype = resp.headers.get("Content-Type", "").split(";")[0].strip().lower()
+                        if resp.status >= 400:
+                            stat["skipped"] = f"status {resp.status}"
+                            return None
+                        if ctype and ctype not in LOADER_ALLOWED_CONTENT_TYPES:
+                            stat["skipped"] = f"content-type {ctype}"
+                            return None
+                        body, truncated = await self._read_capped(resp)
+                        encoding = resp.charset or "utf-8"
+                    fetch_span.set(bytes=len(body))
+            stat["bytes"] = len(body)
+            stat["truncated"] = truncated
+            with span("html_parse", bytes=len(body), items=1) as parse_span:
+                text, extract_stats = await run_cpu("parse", extract_text, body, encoding, ctype or "text/html")
+                parse_span.set(chars=extract_stats["chars"], backend=extract_stats["backend"])
+            stat.update(extract_stats)
+            if not text:
+                stat["skipped"] = "no text"
+                return None
+            return Document(
+                page_content=text,
+                metadata={"source": url}
+            )
+        except Exception as e:
+            stat["skipped"] = f"error: {e}"
+            logger.warning(f"Error loading {url}: {e}")
+            return None
+        finally:
+            stat["elapsed"] = time.perf_counter() - start
+            self.stats.append(stat)
+    
     async def aload(self):
         """Asynchronously load web content from URLs."""
-        docs = []
-        for url in self.urls:
-            try:
-                print(f"[DEBUG] Loading URL: {url}")
-                response = await asyncio.get_event_loop().run_in_executor(
-                    None, 
-                    lambda: requests.get(url, timeout=HTTP_TIMEOUT, verify=certifi.where())
-                )
-                soup = BeautifulSoup(response.text, 'html.parser')
-                docs.append(Document(
-                    page_content=soup.get_text(),
-                    metadata={"source": url}
-                ))
-            except Exception as e:
-                print(f"[DEBUG] Error loading {url}: {e}")
-        return docs
\ No newline at end of file
+        global_limit = asyncio.Semaphore(self.max_concurrency)
+        host_limits: Dict[str, asyncio.Semaphore] = {}
+        self.stats = []
+        results = await asyncio.gather(*(self._load_one(url, global_limit, host_limits) for url in self.urls))
+        for stat in self.stats:
+            logger.debug("Loaded %s in %.2fs (%s bytes%s -> %s chars extracted in %.1fms%s)",
+                         stat["url"], stat["elapsed"], stat["bytes"], ", truncated" if stat["truncated"] else "",
+                         stat["chars"], stat["extract_seconds"] * 1000,
+                         ", skipped: " + stat["skipped"] if stat["skipped"] else "")
+        return [doc for doc in results if doc is not None]
@@ -0,0 +1,152 @@
+"""
+workers.py - Worker pools for CPU-bound evidence ingestion and an event-loop stall monitor
+
+    text, stats = await run_cpu("parse", extract_text, body, encoding)
+
+Work is routed by kind:
+
+    parse, split  WORKER_POOL: a thread pool, a process pool (sidesteps the GIL
+                  for the pure-Python HTML walk and text splitting; arguments
+                  and results must pickle) or inline on the loop
+    embed         a thread pool of EMBED_WORKERS; the model cannot be sent to
+                  other processes and releases the GIL while it computes
+    index         one thread, so index mutations and saves run one at a time
+                  in submission order
+
+LoopMonitor wakes up every LOOP_MONITOR_INTERVAL seconds; any lateness beyond
+LOOP_BLOCK_THRESHOLD is counted as time the event loop was blocked.
+"""
+
+import asyncio
+import contextvars
+import functools
+import os
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional, Set
+from config import WORKER_POOL, WORKER_MAX_WORKERS, EMBED_WORKERS, LOOP_MONITOR_INTERVAL, LOOP_BLOCK_THRESHOLD
+from tracing import METRICS, get_logger, span
+
+logger = get_logger(__name__)
+
+WORKER_POOLS = ("thread", "process", "inline")
+WORK_KINDS = ("parse", "split", "embed", "index")
+
+_executors: Dict[str, Executor] = {}
+_executors_lock = threading.Lock()
+
+def _max_workers() -> int:
+    return WORKER_MAX_WORKERS or min(4, os.cpu_count() or 1)
+
+def _executor(kind: str) -> Optional[Executor]:
+    """The pool for a kind of work, created on first use; None runs it inline."""
+    if kind not in WORK_KINDS:
+        raise ValueError(f"Unknown work kind '{kind}', expected one of {', '.join(WORK_KINDS)}")
+    if WORKER_POOL not in WORKER_POOLS:
+        raise ValueError(f"WORKER_POOL must be one of {', '.join(WORKER_POOLS)}, got '{WORKER_POOL}'")
+    if WORKER_POOL == "inline":
+        return None
+    name = kind if kind in ("embed", "index") else "cpu"
+    with _executors_lock:
+        if name not in _executors:
+            if name == "index":
+                _executors[name] = ThreadPoolExecutor(1, thread_name_prefix="index")
+            elif name == "embed":
+                _executors[name] = ThreadPoolExecutor(EMBED_WORKERS, thread_name_prefix="embed")
+            elif WORKER_POOL == "process":
+                _executors[name] = ProcessPoolExecutor(_max_workers())
+            else:
+                _executors[name] = ThreadPoolExecutor(_max_workers(), thread_name_prefix="cpu")
+            logger.debug("Started '%s' worker pool (%s)", name, type(_executors[name]).__name__)
+        return _executors[name]
+
+async def run_cpu(kind: str, func: Callable, *args):
+    """Run func(*args) in the pool for kind and await the result without blocking the loop."""
+    executor = _executor(kind)
+    with span("worker", kind=kind):
+        if executor is None:
+            return func(*args)
+        if not isinstance(executor, ProcessPoolExecutor):
+            # Spans opened in the worker thread belong to the caller's trace
+            func = functools.partial(contextvars.copy_context().run, func)
+        return await asyncio.get_running_loop().run_in_executor(executor, func, *args)
+
+def shutdown_workers():
+    """Stop the pools; pending work finishes first."""
+    with _executors_lock:
+        for executor in _executors.values():
+            executor.shutdown(wait=True)
+        _executors.clear()
+
+class StallStats:
+    """Event-loop stalls seen while a window was open."""
+    __slots__ = ("blocked_seconds", "stalls", "max_stall")
+
+    def __init__(self):
+        self.blocked_seconds = 0.0
+        self.stalls = 0
+        self.max_stall = 0.0
+
+    def add(self, lag: float):
+        self.blocked_seconds += lag
+        self.stalls += 1
+        self.max_stall = max(self.max_stall, lag)
+
+    def to_dict(self) -> dict:
+        return {"blocked_seconds": self.blocked_seconds, "stalls": self.stalls, "max_stall_seconds": self.max_stall}
+
+class LoopMonitor:
+    """Measures how long the event loop it runs on is blocked."""
+
+    def __init__(self, interval: float = LOOP_MONITOR_INTERVAL, threshold: float = LOOP_BLOCK_THRESHOLD):
+        self.interval = interval
+        self.threshold = threshold
+        self.total = StallStats()
+        self.windows: Set[StallStats] = set()
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        if not self.running:
+            self.loop = asyncio.get_running_loop()
+            self._task = self.loop.create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        while True:
+            expected = self.loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = self.loop.time() - expected
+            if lag > self.threshold:
+                for stats in (self.total, *self.windows):
+                    stats.add(lag)
+                METRICS.observe("event_loop_stall", lag)
+
+_monitor = LoopMonitor()
+
+def loop_monitor() -> LoopMonitor:
+    """The process-wide monitor, (re)started on the running loop."""
+    if _monitor.loop is not asyncio.get_running_loop():
+        _monitor.stop()
+    _monitor.start()
+    return _monitor
+
+@contextmanager
+def watch_loop():
+    """Collect the event-loop stalls that happen inside the block (from any task on the loop)."""
+    monitor = loop_monitor()
+    stats = StallStats()
+    monitor.windows.add(stats)
+    try:
+        yield stats
+    finally:
+        monitor.windows.discard(stats)